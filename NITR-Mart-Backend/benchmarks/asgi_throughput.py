@@ -0,0 +1,213 @@
+"""
+Concurrent-request throughput of the sync WSGI and async ASGI deployments.
+
+Seeds a throwaway SQLite database with --products listings of one seller,
+then serves it twice with the same number of worker processes:
+
+- WSGI: gunicorn's sync workers with the regular views (ASYNC_VIEWS off).
+  Each worker handles one request at a time.
+- ASGI: uvicorn with the async views of nitrmart/asgi.py. Each worker
+  handles many requests at once and waits on the database in threads.
+
+For each, --concurrency clients request the product list, a product and
+/users/me/ in turn for --seconds, and the benchmark reports requests/s and
+latency percentiles. Response caching is turned off so every request reads
+the database. A local SQLite file answers in microseconds; --db-latency-ms
+adds a delay to every query to stand in for a database across the network,
+which is where the two deployments differ most.
+
+    python benchmarks/asgi_throughput.py --workers 2 --concurrency 64 --db-latency-ms 5
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = tempfile.mkdtemp(prefix='nitrmart-asgi-bench-')
+
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+os.environ['DATABASE_URL'] = f'sqlite:///{WORKDIR}/db.sqlite3'
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from users.authentication import add_user_claims  # noqa: E402
+
+# Settings for the servers when --db-latency-ms is given: every query
+# sleeps first, in whichever thread runs it.
+LATENCY_SETTINGS = '''
+import time
+
+from django.db.backends.signals import connection_created
+
+from nitrmart.settings import *  # noqa: F401,F403
+
+DB_LATENCY = {latency}
+
+
+def _delay(execute, sql, params, many, context):
+    time.sleep(DB_LATENCY)
+    return execute(sql, params, many, context)
+
+
+def _add_delay(sender, connection, **kwargs):
+    if _delay not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_delay)
+
+
+connection_created.connect(_add_delay)
+'''
+
+
+def seed(count):
+    call_command('migrate', verbosity=0)
+    seller = get_user_model().objects.create_user(
+        'bench@nitrkl.ac.in', 'securepassword123', wp_number='9000000000', year='3rd', branch='CSE'
+    )
+    products = Product.objects.bulk_create([
+        Product(title=f'Listing {i}', description='x' * 200, price=100 + i, seller=seller) for i in range(count)
+    ], batch_size=2000)
+    token = str(add_user_claims(AccessToken.for_user(seller), seller))
+    return [product.pk for product in products], token
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, workers, port, latency_ms):
+    env = dict(
+        os.environ,
+        ALLOWED_HOSTS='127.0.0.1',
+        DEBUG='False',
+        PRODUCT_CACHE_TIMEOUT='0',
+        AUTH_USER_CACHE_SECONDS='0',
+        ASYNC_VIEWS='True' if kind == 'asgi' else 'False',
+        PYTHONPATH=os.pathsep.join([WORKDIR, str(ROOT)]),
+    )
+    if latency_ms:
+        Path(WORKDIR, 'bench_settings.py').write_text(LATENCY_SETTINGS.format(latency=latency_ms / 1000))
+        env['DJANGO_SETTINGS_MODULE'] = 'bench_settings'
+    if kind == 'asgi':
+        command = [
+            sys.executable, '-m', 'uvicorn', 'nitrmart.asgi:application', '--host', '127.0.0.1',
+            '--port', str(port), '--workers', str(workers), '--no-access-log', '--log-level', 'warning',
+        ]
+    else:
+        command = [
+            sys.executable, '-m', 'gunicorn', 'nitrmart.wsgi:application', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--log-level', 'warning',
+        ]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+async def request(port, path, token):
+    """One GET on a fresh connection (gunicorn's sync workers close each one); returns the status"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n'
+        f'Connection: close\r\n\r\n'.encode()
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return status
+
+
+async def wait_until_up(port, token, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if await request(port, '/users/me/', token) == 200:
+                return
+        except (OSError, IndexError, ValueError):
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'server on port {port} did not come up')
+        await asyncio.sleep(0.2)
+
+
+async def client(port, token, paths, offset, deadline, latencies, errors):
+    i = offset
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            status = await request(port, paths[i % len(paths)], token)
+        except (OSError, IndexError, ValueError):
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(status)
+        i += 1
+
+
+async def load(port, token, paths, concurrency, seconds):
+    await wait_until_up(port, token)
+    latencies, errors = [], []
+    deadline = time.monotonic() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(port, token, paths, offset, deadline, latencies, errors) for offset in range(concurrency)
+    ])
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes for both servers')
+    parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--db-latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    try:
+        ids, token = seed(args.products)
+        paths = []
+        for i in range(0, len(ids), len(ids) // 50 or 1):
+            paths += ['/products/', f'/products/{ids[i]}/', '/users/me/']
+
+        print(f'{args.workers} workers, {args.concurrency} concurrent requests, '
+              f'{args.db_latency_ms:g}ms added per query')
+        for kind, label in (('wsgi', 'gunicorn sync (WSGI)'), ('asgi', 'uvicorn async (ASGI)')):
+            port = free_port()
+            server = start_server(kind, args.workers, port, args.db_latency_ms)
+            try:
+                latencies, errors, elapsed = asyncio.run(load(port, token, paths, args.concurrency, args.seconds))
+            finally:
+                server.terminate()
+                server.wait(10)
+            print(
+                f'{label:<22} {len(latencies) / elapsed:8.1f} req/s  p50 {percentile(latencies, 0.5) * 1000:7.1f}ms'
+                f'  p99 {percentile(latencies, 0.99) * 1000:7.1f}ms  errors {len(errors)}'
+            )
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
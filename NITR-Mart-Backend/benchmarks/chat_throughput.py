@@ -0,0 +1,142 @@
+"""
+Chat throughput with thousands of sockets in one process.
+
+Creates a throwaway test database with --pairs conversations, then:
+
+1. Stores --messages messages sent at once from every conversation through
+   the message writer, with batched writes and with one INSERT per message
+   (CHAT_WRITE_BATCH_SIZE=1), and reports messages/s for each.
+2. Opens a socket for both sides of each conversation (2 x --pairs sockets,
+   through the JWT middleware) and reports the memory they take, then has
+   every buyer send one message and times delivery to both sides.
+
+The sockets use the in-memory channel layer, which scans every channel on
+each send, so step 2 understates what a process behind Redis handles. The
+database is dropped afterwards.
+
+    python benchmarks/chat_throughput.py --pairs 1000 --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from asgiref.testing import ApplicationCommunicator  # noqa: E402
+from channels.routing import URLRouter  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from chat.models import Conversation, Message  # noqa: E402
+from chat.routing import websocket_urlpatterns  # noqa: E402
+from chat.writer import writer  # noqa: E402
+from products.models import Product  # noqa: E402
+from users.authentication import JWTAuthMiddleware, add_user_claims  # noqa: E402
+
+application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+def seed(pairs):
+    User = get_user_model()
+    users = User.objects.bulk_create([
+        User(email=f'bench{i}@nitrkl.ac.in', password='!', wp_number=f'8{i:09d}', year='2nd', branch='CSE')
+        for i in range(2 * pairs)
+    ])
+    products = Product.objects.bulk_create(
+        [Product(title=f'Listing {i}', description='x', price=100, seller=users[2 * i + 1]) for i in range(pairs)],
+        batch_size=2000,
+    )
+    conversations = Conversation.objects.bulk_create([
+        Conversation(product=product, buyer=users[2 * i], seller=users[2 * i + 1])
+        for i, product in enumerate(products)
+    ], batch_size=2000)
+    tokens = {user.pk: str(add_user_claims(AccessToken.for_user(user), user)) for user in users}
+    return conversations, tokens
+
+
+async def open_socket(token):
+    socket = ApplicationCommunicator(application, {
+        'type': 'websocket', 'path': '/ws/chat/', 'query_string': f'token={token}'.encode(),
+        'headers': [], 'subprotocols': [],
+    })
+    await socket.send_input({'type': 'websocket.connect'})
+    assert (await socket.receive_output(5))['type'] == 'websocket.accept'
+    await socket.receive_output(5)  # ready
+    return socket
+
+
+async def receive(socket, count):
+    for _ in range(count):
+        frame = json.loads((await socket.receive_output(60))['text'])
+        assert frame['type'] == 'message', frame
+
+
+async def write(conversations, messages):
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        writer.submit(conversations[i % len(conversations)], conversations[i % len(conversations)].buyer_id, f'message {i}')
+        for i in range(messages)
+    ])
+    elapsed = time.perf_counter() - start
+    print(f'  stored {messages} messages in {elapsed:.2f}s ({messages / elapsed:.0f} messages/s)')
+
+
+async def chat(conversations, tokens):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    sockets = {}
+    for conversation in conversations:
+        for user_id in (conversation.buyer_id, conversation.seller_id):
+            sockets[user_id] = await open_socket(tokens[user_id])
+    grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024
+    print(f'opened {len(sockets)} sockets in {time.perf_counter() - start:.1f}s, peak RSS +{grown:.0f} MB')
+
+    start = time.perf_counter()
+    for conversation in conversations:
+        await sockets[conversation.buyer_id].send_input({'type': 'websocket.receive', 'text': json.dumps({
+            'type': 'send', 'conversation': conversation.pk, 'body': 'Is it still available?',
+        })})
+    await asyncio.gather(*[receive(socket, 1) for socket in sockets.values()])
+    print(f'delivered {len(conversations)} messages to both sides in {time.perf_counter() - start:.2f}s')
+
+    for socket in sockets.values():
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await socket.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        conversations, tokens = seed(args.pairs)
+        for label, batch_size, delay in (('batched writes', 500, 5), ('one INSERT per message', 1, 0)):
+            print(f'{label}:')
+            with override_settings(CHAT_WRITE_BATCH_SIZE=batch_size, CHAT_WRITE_DELAY_MS=delay):
+                asyncio.run(write(conversations, args.messages))
+            Message.objects.all().delete()
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        with override_settings(CHANNEL_LAYERS=layers):
+            asyncio.run(chat(conversations, tokens))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Near-duplicate lookup latency: multi-index hashing versus a linear scan.
+
+Builds the in-memory duplicate index over --size random 64-bit image hashes
+(plus a few planted near neighbours) and times radius queries at the
+configured Hamming distance. A linear scan over the same hashes is timed
+for comparison; the index should stay well under a millisecond per lookup
+at catalog sizes where the scan does not.
+
+    python benchmarks/duplicate_lookup.py --size 100000 --lookups 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from products.duplicates import MultiIndexHash, get_max_distance, hamming  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000, help='Hashes in the index')
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--max-distance', type=int, default=get_max_distance())
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hashes = [rng.getrandbits(64) for _ in range(args.size)]
+    # Some reposts: copies of existing hashes with a couple of bits flipped.
+    for value in rng.sample(hashes, min(len(hashes), args.size // 100)):
+        hashes.append(value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)))
+
+    start = time.perf_counter()
+    index = MultiIndexHash(args.max_distance)
+    for pk, value in enumerate(hashes):
+        index.add(value, pk)
+    print(f'built index of {len(hashes)} hashes in {time.perf_counter() - start:.2f}s')
+
+    queries = [rng.choice(hashes) ^ (1 << rng.randrange(64)) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    found = sum(len(index.search(query, args.max_distance)) for query in queries)
+    per_lookup = (time.perf_counter() - start) / args.lookups
+    print(f'multi-index  {per_lookup * 1e6:9.1f}us per lookup  ({found} matches)')
+
+    scan_queries = queries[:max(1, args.lookups // 20)]
+    start = time.perf_counter()
+    for query in scan_queries:
+        [pk for pk, value in enumerate(hashes) if hamming(query, value) <= args.max_distance]
+    per_scan = (time.perf_counter() - start) / len(scan_queries)
+    print(f'linear scan  {per_scan * 1e6:9.1f}us per lookup  ({per_scan / per_lookup:.0f}x slower)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Login throughput per core for each password hasher.
+
+A login is one password check plus minting the JWT pair, and the hash check
+dominates. For each available hasher this times both on one core, then runs
+the same loop in --processes worker processes to show how throughput scales
+across cores. Use the per-core figure to size gunicorn workers for a login
+spike: logins/s needed / logins/s per core = cores.
+
+    python benchmarks/login_throughput.py --logins 50 --processes 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.utils.module_loading import import_string  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+PASSWORD = 'securepassword123'
+
+
+def load_hasher(path):
+    return import_string(path)()
+
+
+def available_hashers():
+    """Hasher paths from PASSWORD_HASHERS whose libraries are installed"""
+    paths = []
+    for path in settings.PASSWORD_HASHERS:
+        hasher = load_hasher(path)
+        try:
+            hasher.encode('probe', hasher.salt())
+        except (ImportError, ValueError):
+            continue
+        paths.append(path)
+    return paths
+
+
+def run_logins(path, count):
+    """Check ``count`` passwords and mint tokens; returns (hash seconds, token seconds)"""
+    hasher = load_hasher(path)
+    encoded = hasher.encode(PASSWORD, hasher.salt())
+    user = get_user_model()(id=1, email='bench@nitrkl.ac.in')
+
+    start = time.perf_counter()
+    for _ in range(count):
+        assert hasher.verify(PASSWORD, encoded)
+    hashing = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        refresh = RefreshToken.for_user(user)
+        str(refresh.access_token)
+    tokens = time.perf_counter() - start
+    return hashing, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=50, help='Logins per process')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f'preferred hasher: {settings.PASSWORD_HASHERS[0]}')
+    for path in available_hashers():
+        hashing, tokens = run_logins(path, args.logins)
+        per_login = (hashing + tokens) / args.logins
+        line = (
+            f'{path.rsplit(".", 1)[1]:<30} check {hashing / args.logins * 1000:7.1f}ms'
+            f'  token {tokens / args.logins * 1000:5.2f}ms  {1 / per_login:7.1f} logins/s/core'
+        )
+        if args.processes > 1:
+            start = time.perf_counter()
+            with ProcessPoolExecutor(args.processes) as pool:
+                list(pool.map(run_logins, [path] * args.processes, [args.logins] * args.processes))
+            elapsed = time.perf_counter() - start
+            line += f'  {args.processes * args.logins / elapsed:7.1f} logins/s on {args.processes} processes'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Moderation queue latency during a spam wave.
+
+Creates a throwaway test database with --listings products and --reports
+open reports spread over them (a few listings get most of the reports, as
+in a coordinated wave), then times a queue page read off the counters and
+their index against grouping the reports per listing on every request. It
+also times filing a report on the most reported listing. The database is
+dropped afterwards.
+
+    python benchmarks/moderation_queue.py --listings 20000 --reports 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Max  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from reports.models import ListingReport, ModerationItem  # noqa: E402
+from reports.moderation import file_report  # noqa: E402
+
+REASONS = [value for value, _ in ListingReport.REASON_CHOICES]
+
+
+def seed(rng, listings, reports, users):
+    User = get_user_model()
+    reporters = User.objects.bulk_create([
+        User(email=f'bench{i}@nitrkl.ac.in', password='!', first_name='Bench', last_name=str(i),
+             wp_number=f'8{i:09d}', roll_no=f'9{i:08d}', year='2nd', branch='CSE')
+        for i in range(users)
+    ])
+    products = Product.objects.bulk_create(
+        [Product(title=f'Listing {i}', description='x', price=100, seller=reporters[0]) for i in range(listings)],
+        batch_size=2000,
+    )
+    now = timezone.now()
+    # Skewed like a wave: low product indexes draw most of the reports.
+    pairs = set()
+    while len(pairs) < reports:
+        pairs.add((products[int(rng.paretovariate(1.2)) % listings].pk, rng.randrange(1, users)))
+    ListingReport.objects.bulk_create(
+        [ListingReport(product_id=product_id, reporter=reporters[user], reason=rng.choice(REASONS))
+         for product_id, user in pairs],
+        batch_size=2000,
+    )
+    items = {}
+    for product_id, reason in ListingReport.objects.values_list('product_id', 'reason'):
+        item = items.setdefault(product_id, ModerationItem(
+            product_id=product_id, reasons={}, first_report_at=now, latest_report_at=now
+        ))
+        item.report_count += 1
+        item.reasons[reason] = item.reasons.get(reason, 0) + 1
+    ModerationItem.objects.bulk_create(items.values(), batch_size=2000)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', type=int, default=20000)
+    parser.add_argument('--reports', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        start = time.perf_counter()
+        seed(random.Random(args.seed), args.listings, args.reports, args.users)
+        print(f'seeded {args.reports} reports on {ModerationItem.objects.count()} listings '
+              f'in {time.perf_counter() - start:.1f}s')
+
+        def indexed_page():
+            list(ModerationItem.objects.order_by('-report_count', '-latest_report_at', '-product_id')
+                 .values_list('product_id', 'report_count', 'reasons')[:args.page_size])
+
+        def grouped_page():
+            page = list(
+                ListingReport.objects.filter(status=ListingReport.STATUS_OPEN).values('product_id')
+                .annotate(count=Count('id'), latest=Max('created_at')).order_by('-count', '-latest')[:args.page_size]
+            )
+            list(ListingReport.objects.filter(product_id__in=[row['product_id'] for row in page])
+                 .values('product_id', 'reason').annotate(count=Count('id')).order_by())
+
+        print(f'queue page from counters  {timed(indexed_page, args.repeat):8.2f}ms')
+        print(f'queue page by GROUP BY    {timed(grouped_page, args.repeat):8.2f}ms')
+
+        hottest = ModerationItem.objects.order_by('-report_count').first().product
+        User = get_user_model()
+        fresh = iter(User.objects.bulk_create([
+            User(email=f'late{i}@nitrkl.ac.in', password='!', wp_number=f'7{i:09d}', year='2nd', branch='CSE')
+            for i in range(args.repeat)
+        ]))
+
+        def report():
+            file_report(next(fresh), hottest, 'spam')
+
+        print(f'file a report (hot item)  {timed(report, args.repeat):8.2f}ms')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
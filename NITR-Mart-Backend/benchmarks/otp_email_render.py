@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for OTP email rendering.
+
+Compares the old path (render_to_string plus strip_tags for every message)
+with the compiled templates in users.otp_email.
+
+    python benchmarks/otp_email_render.py --count 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.template.loader import render_to_string  # noqa: E402
+from django.utils.html import strip_tags  # noqa: E402
+
+from users.otp_email import get_otp_templates, render_otp_email  # noqa: E402
+
+
+def render_legacy(otp, expiry_minutes):
+    html_message = render_to_string('otp_email.html', {'otp': otp, 'expiry_minutes': expiry_minutes})
+    return strip_tags(html_message), html_message
+
+
+def render_compiled(otp, expiry_minutes):
+    _, plain_message, html_message = render_otp_email(otp, expiry_minutes)
+    return plain_message, html_message
+
+
+def timed(render, otps):
+    start = time.perf_counter()
+    for otp in otps:
+        render(otp, 30)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000, help='Messages per batch')
+    parser.add_argument('--repeat', type=int, default=3, help='Batches per renderer; the best is reported')
+    args = parser.parse_args()
+
+    otps = [f'{random.randint(0, 999999):06d}' for _ in range(args.count)]
+    # Warm both paths so template loading and compilation are not timed.
+    render_legacy(otps[0], 30)
+    get_otp_templates()
+
+    results = {}
+    for name, render in (('render_to_string + strip_tags', render_legacy), ('compiled', render_compiled)):
+        best = min(timed(render, otps) for _ in range(args.repeat))
+        results[name] = best
+        print(f'{name:<30} {best:8.3f}s total  {best / args.count * 1e6:8.2f}us/message')
+
+    legacy, compiled = results.values()
+    print(f'speedup: {legacy / compiled:.1f}x over {args.count} messages')
+
+
+if __name__ == '__main__':
+    main()
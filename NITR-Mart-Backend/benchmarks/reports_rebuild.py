@@ -0,0 +1,94 @@
+"""
+Time to rebuild a year of reports rollups from scratch.
+
+Creates a throwaway test database, fills it with --listings products spread
+over the last 365 days (by --sellers sellers across a handful of branches),
+then times a full rebuild and a one-day refresh, like the one a product
+save triggers. The database is dropped afterwards.
+
+    python benchmarks/reports_rebuild.py --listings 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from products.models import CATEGORIES, Product  # noqa: E402
+from reports.rollups import rebuild, refresh_days  # noqa: E402
+
+BRANCHES = ['CSE', 'ECE', 'EE', 'MECH', 'CIVIL', 'CHEM', 'META', 'BIOTECH']
+YEARS = ['1st', '2nd', '3rd', '4th']
+
+
+def seed(rng, listings, sellers):
+    User = get_user_model()
+    password = make_password('securepassword123')
+    users = User.objects.bulk_create([
+        User(
+            email=f'bench{i}@nitrkl.ac.in', password=password, first_name='Bench', last_name=str(i),
+            year=rng.choice(YEARS), branch=rng.choice(BRANCHES), roll_no=f'9{i:08d}', wp_number=f'8{i:09d}',
+        )
+        for i in range(sellers)
+    ])
+    now = timezone.now()
+    categories = [value for value, _ in CATEGORIES]
+    products = [
+        Product(
+            title=f'Listing {i}', description='x', seller=rng.choice(users), category=rng.choice(categories),
+            price=Decimal(round(rng.lognormvariate(6, 1.2), 2)), is_sold=rng.random() < 0.4,
+        )
+        for i in range(listings)
+    ]
+    Product.objects.bulk_create(products, batch_size=2000)
+    # posted_at is auto_now_add, so spread the listings over the year afterwards.
+    for product in products:
+        product.posted_at = now - timedelta(seconds=rng.randrange(365 * 86400))
+    Product.objects.bulk_update(products, ['posted_at'], batch_size=2000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--sellers', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        start = time.perf_counter()
+        seed(random.Random(args.seed), args.listings, args.sellers)
+        print(f'seeded {args.listings} listings in {time.perf_counter() - start:.1f}s')
+
+        today = timezone.localdate()
+        start = time.perf_counter()
+        daily, monthly = rebuild(today - timedelta(days=365), today)
+        elapsed = time.perf_counter() - start
+        print(f'rebuilt a year: {daily} daily and {monthly} monthly rows in {elapsed:.2f}s '
+              f'({args.listings / elapsed:.0f} listings/s)')
+
+        start = time.perf_counter()
+        refresh_days({today - timedelta(days=30)})
+        print(f'refreshed one day in {(time.perf_counter() - start) * 1000:.1f}ms')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Load test: legitimate traffic latency during an OTP abuse burst.
+
+Runs two phases against a live server. First only the legitimate users
+browse (GET --legit-path), then attackers hammer POST /users/send-otp/ from a
+few addresses while the same users keep browsing. With throttling on, the
+attackers mostly get cheap 429s and the legitimate p99 should barely move.
+
+    python manage.py runserver --noreload   # or gunicorn, in another shell
+    python benchmarks/throttle_load.py --base-url http://localhost:8000
+
+Client addresses are sent as X-Forwarded-For, so run the server without
+NUM_PROXIES (or with NUM_PROXIES=1) for the per-IP buckets to see them.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def request(url, ip, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, method='POST' if body else 'GET')
+    req.add_header('X-Forwarded-For', ip)
+    if body:
+        req.add_header('Content-Type', 'application/json')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        status = exc.code
+    except OSError:
+        status = 'error'
+    return time.perf_counter() - start, status
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def legit_user(index, args, stop, latencies):
+    url = args.base_url.rstrip('/') + args.legit_path
+    ip = f'10.1.{index // 250}.{index % 250 + 1}'
+    while not stop.is_set():
+        elapsed, status = request(url, ip)
+        latencies.append(elapsed)
+        time.sleep(random.uniform(0, 2 * args.think_time))
+
+
+def attacker(index, args, stop, statuses):
+    url = args.base_url.rstrip('/') + '/users/send-otp/'
+    ip = f'10.66.0.{index % args.attacker_ips + 1}'
+    while not stop.is_set():
+        email = f'victim{random.randint(0, 10 ** 6)}@nitrkl.ac.in'
+        _, status = request(url, ip, {'email': email})
+        statuses[status] += 1
+
+
+def run_phase(args, attackers):
+    stop = threading.Event()
+    latencies = []
+    statuses = Counter()
+    threads = [
+        threading.Thread(target=legit_user, args=(i, args, stop, latencies), daemon=True)
+        for i in range(args.users)
+    ]
+    threads += [
+        threading.Thread(target=attacker, args=(i, args, stop, statuses), daemon=True)
+        for i in range(attackers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return latencies, statuses
+
+
+def report(name, latencies, statuses):
+    print(f'{name}: {len(latencies)} legitimate requests')
+    if latencies:
+        print(
+            f'  p50 {statistics.median(latencies) * 1000:7.1f}ms'
+            f'  p95 {percentile(latencies, 95) * 1000:7.1f}ms'
+            f'  p99 {percentile(latencies, 99) * 1000:7.1f}ms'
+        )
+    if statuses:
+        total = sum(statuses.values())
+        summary = ', '.join(f'{status}: {count}' for status, count in statuses.most_common())
+        print(f'  abuse requests: {total} ({summary})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--legit-path', default='/products/')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent legitimate users')
+    parser.add_argument('--think-time', type=float, default=0.2, help='Mean pause between their requests')
+    parser.add_argument('--attackers', type=int, default=50, help='Concurrent abusive clients')
+    parser.add_argument('--attacker-ips', type=int, default=3, help='Addresses the attackers share')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per phase')
+    args = parser.parse_args()
+
+    baseline, _ = run_phase(args, attackers=0)
+    report('baseline', baseline, None)
+    burst, statuses = run_phase(args, attackers=args.attackers)
+    report('during abuse burst', burst, statuses)
+
+    if baseline and burst:
+        ratio = percentile(burst, 99) / percentile(baseline, 99)
+        print(f'p99 during burst is {ratio:.2f}x baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Conversation, Message
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'buyer', 'seller', 'last_message_at', 'buyer_unread', 'seller_unread')
+    list_select_related = ('product', 'buyer', 'seller')
+    search_fields = ('product__title', 'buyer__email', 'seller__email')
+    raw_id_fields = ('product', 'buyer', 'seller')
+    readonly_fields = ('created_at', 'last_message_at', 'buyer_unread', 'seller_unread')
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'conversation', 'sender', 'created_at')
+    raw_id_fields = ('conversation', 'sender')
+    readonly_fields = ('created_at',)
@@ -0,0 +1,122 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Conversation
+from .writer import writer
+
+# Close code for a handshake without a valid access token.
+UNAUTHORIZED = 4401
+
+
+def user_group(user_id):
+    return f'chat.user.{user_id}'
+
+
+def get_max_length():
+    return getattr(settings, 'CHAT_MESSAGE_MAX_LENGTH', 2000)
+
+
+def message_data(message):
+    return {
+        'id': message.pk,
+        'conversation': message.conversation_id,
+        'sender': message.sender_id,
+        'body': message.body,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    A signed-in user's socket for all of their conversations. Connect to
+    ``ws/chat/?token=<access token>``; the server answers ``{"type":
+    "ready", "unread": n}``.
+
+    Send ``{"type": "send", "conversation": id, "body": "...",
+    "client_id": "..."}`` to post a message. Once it is stored, every socket
+    of both participants gets ``{"type": "message", "message": {...},
+    "client_id": ...}``; the client_id lets the sender match it to what it
+    sent. Send ``{"type": "read", "conversation": id}`` to clear the unread
+    count; the user's other sockets get ``{"type": "read", ...}``.
+
+    A socket holds one channel group and a few cached conversation rows, so
+    idle sockets cost next to nothing. Messages are stored in batches
+    (chat/writer.py).
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=UNAUTHORIZED)
+            return
+        self.user_id = user.pk
+        self.conversations = {}
+        self.group = user_group(self.user_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        unread = await sync_to_async(Conversation.objects.unread_total)(self.user_id)
+        await self.send_json({'type': 'ready', 'unread': unread})
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get('type') if isinstance(content, dict) else None
+        if kind == 'send':
+            await self.post_message(content)
+        elif kind == 'read':
+            await self.mark_read(content)
+        else:
+            await self.send_error('Send {"type": "send", ...} or {"type": "read", ...}.', content)
+
+    async def send_error(self, detail, content):
+        client_id = content.get('client_id') if isinstance(content, dict) else None
+        await self.send_json({'type': 'error', 'detail': detail, 'client_id': client_id})
+
+    async def get_conversation(self, pk):
+        """The conversation if this user takes part in it, else None"""
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            return None
+        if pk not in self.conversations:
+            conversation = await Conversation.objects.only('id', 'buyer_id', 'seller_id').filter(pk=pk).afirst()
+            if conversation is None or not conversation.has_participant(self.user_id):
+                return None
+            self.conversations[pk] = conversation
+        return self.conversations[pk]
+
+    async def post_message(self, content):
+        conversation = await self.get_conversation(content.get('conversation'))
+        if conversation is None:
+            await self.send_error('Conversation not found.', content)
+            return
+        body = content.get('body')
+        if not isinstance(body, str) or not body.strip():
+            await self.send_error('Message body is required.', content)
+            return
+        if len(body) > get_max_length():
+            await self.send_error(f'Messages are at most {get_max_length()} characters.', content)
+            return
+        try:
+            message = await writer.submit(conversation, self.user_id, body)
+        except Exception:
+            await self.send_error('Message could not be sent, try again.', content)
+            return
+        event = {'type': 'chat.message', 'message': message_data(message), 'client_id': content.get('client_id')}
+        for user_id in (conversation.buyer_id, conversation.seller_id):
+            await self.channel_layer.group_send(user_group(user_id), event)
+
+    async def mark_read(self, content):
+        conversation = await self.get_conversation(content.get('conversation'))
+        if conversation is None:
+            await self.send_error('Conversation not found.', content)
+            return
+        await Conversation.objects.filter(pk=conversation.pk).aupdate(**{conversation.unread_field(self.user_id): 0})
+        await self.channel_layer.group_send(self.group, {'type': 'chat.read', 'conversation': conversation.pk})
+
+    async def chat_message(self, event):
+        await self.send_json({'type': 'message', 'message': event['message'], 'client_id': event['client_id']})
+
+    async def chat_read(self, event):
+        await self.send_json({'type': 'read', 'conversation': event['conversation']})
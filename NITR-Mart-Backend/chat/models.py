@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from products.models import Product
+
+
+class ConversationQuerySet(models.QuerySet):
+    def for_user(self, user_id):
+        return self.filter(Q(buyer_id=user_id) | Q(seller_id=user_id))
+
+    def unread_total(self, user_id):
+        """Unread messages across all of a user's conversations, from the counters"""
+        totals = self.for_user(user_id).aggregate(
+            buying=Sum('buyer_unread', filter=Q(buyer_id=user_id)),
+            selling=Sum('seller_unread', filter=Q(seller_id=user_id)),
+        )
+        return (totals['buying'] or 0) + (totals['selling'] or 0)
+
+
+class Conversation(models.Model):
+    """
+    A buyer's conversation with a seller about one listing. The unread
+    counters and last_message_at are kept up to date by chat/writer.py as
+    messages are stored, so inboxes and badges never count messages.
+    """
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='conversations')
+    # Both covered by the inbox indexes below.
+    buyer = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='buying_conversations', db_index=False
+    )
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='selling_conversations', db_index=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_message_at = models.DateTimeField(default=timezone.now)
+    buyer_unread = models.PositiveIntegerField(default=0)
+    seller_unread = models.PositiveIntegerField(default=0)
+
+    objects = ConversationQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-last_message_at', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'buyer'], name='chat_conversation_once'),
+        ]
+        indexes = [
+            models.Index(fields=['buyer', '-last_message_at', '-id'], name='chat_buyer_inbox_idx'),
+            models.Index(fields=['seller', '-last_message_at', '-id'], name='chat_seller_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conversation {self.pk} about product {self.product_id}"
+
+    def unread_field(self, user_id):
+        """Name of the counter holding ``user_id``'s unread messages"""
+        return 'buyer_unread' if user_id == self.buyer_id else 'seller_unread'
+
+    def has_participant(self, user_id):
+        return user_id in (self.buyer_id, self.seller_id)
+
+
+class Message(models.Model):
+    # Covered by the history index below, which leads with the conversation.
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages', db_index=False)
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    body = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['conversation', '-id'], name='chat_message_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Message {self.pk} in conversation {self.conversation_id}"
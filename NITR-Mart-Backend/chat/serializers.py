@@ -0,0 +1,50 @@
+from rest_framework import serializers
+
+from products.models import Product
+from .models import Conversation, Message
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """A conversation as seen by the signed-in user, who may be either side of it"""
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.only('id', 'title', 'seller_id', 'is_sold'))
+    product_title = serializers.CharField(source='product.title', read_only=True, default=None)
+    other_party = serializers.SerializerMethodField()
+    last_message = serializers.CharField(read_only=True, default=None)
+    unread = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'product', 'product_title', 'buyer', 'seller', 'other_party',
+            'last_message', 'last_message_at', 'unread', 'created_at',
+        ]
+        read_only_fields = ['buyer', 'seller', 'last_message_at', 'created_at']
+
+    def get_other_party(self, obj):
+        user_id = self.context['request'].user.pk
+        other = obj.seller if user_id == obj.buyer_id else obj.buyer
+        return {'id': other.pk, 'first_name': other.first_name, 'last_name': other.last_name}
+
+    def get_unread(self, obj):
+        return getattr(obj, obj.unread_field(self.context['request'].user.pk))
+
+    def validate_product(self, value):
+        if value.seller_id == self.context['request'].user.pk:
+            raise serializers.ValidationError('You cannot start a conversation about your own listing.')
+        if value.is_sold:
+            raise serializers.ValidationError('This listing has been sold.')
+        return value
+
+    def create(self, validated_data):
+        """Start a conversation, or return the one the buyer already has about this listing"""
+        product = validated_data['product']
+        conversation, self.created = Conversation.objects.get_or_create(
+            product=product, buyer_id=self.context['request'].user.pk, defaults={'seller_id': product.seller_id}
+        )
+        return conversation
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'conversation', 'sender', 'body', 'created_at']
@@ -0,0 +1,186 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from products.tests import ProductTestCase, TestSocket, make_products, make_user
+from users.authentication import add_user_claims
+from .models import Conversation, Message
+from .writer import writer
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def access_token(user):
+    return str(add_user_claims(AccessToken.for_user(user), user))
+
+
+class ChatTestCase(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.buyer = make_user(1)
+        self.product = make_products(self.seller, 1)[0]
+        self.conversation = Conversation.objects.create(product=self.product, buyer=self.buyer, seller=self.seller)
+
+
+class ConversationApiTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.buyer)
+        self.url = reverse('chat:conversation-list-create')
+
+    def test_start_conversation_once_per_listing(self):
+        other = make_products(self.seller, 1)[0]
+        response = self.client.post(self.url, {'product': other.pk}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['seller'], self.seller.pk)
+        self.assertEqual(response.data['other_party']['id'], self.seller.pk)
+        again = self.client.post(self.url, {'product': other.pk}, format='json')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], response.data['id'])
+
+    def test_cannot_start_about_own_or_sold_listing(self):
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.post(self.url, {'product': self.product.pk}, format='json').status_code, 400)
+        sold = make_products(self.buyer, 1, is_sold=True)[0]
+        self.assertEqual(self.client.post(self.url, {'product': sold.pk}, format='json').status_code, 400)
+
+    def test_inbox_shows_each_side_its_unread_count(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(buyer_unread=2, seller_unread=5)
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.buyer, body='first'),
+            Message(conversation=self.conversation, sender=self.seller, body='x' * 300),
+        ])
+        with self.assertNumQueries(1):
+            results = self.client.get(self.url).data['results']
+        self.assertEqual([(item['id'], item['unread']) for item in results], [(self.conversation.pk, 2)])
+        self.assertEqual(results[0]['last_message'], 'x' * 200)
+        self.assertEqual(self.client.get(reverse('chat:unread')).data, {'unread': 2})
+
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread'], 5)
+        self.client.force_authenticate(make_user(2))
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+
+    def test_history_pages_back_by_id(self):
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.buyer, body=f'message {i}') for i in range(120)
+        ])
+        url = reverse('chat:conversation-messages', args=[self.conversation.pk])
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['body'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [f'message {i}' for i in reversed(range(120))])
+
+        self.client.force_authenticate(make_user(2))
+        self.assertEqual(self.client.get(reverse('chat:conversation-messages', args=[self.conversation.pk])).status_code, 404)
+
+    def test_read_clears_only_own_counter(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(buyer_unread=2, seller_unread=5)
+        response = self.client.post(reverse('chat:conversation-read', args=[self.conversation.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            Conversation.objects.values_list('buyer_unread', 'seller_unread').get(pk=self.conversation.pk), (0, 5)
+        )
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ChatSocketTests(ChatTestCase):
+    async def connect(self, user):
+        socket = TestSocket('/ws/chat/', f'token={access_token(user)}')
+        self.assertTrue(await socket.connect())
+        ready = await socket.receive_json_from()
+        self.assertEqual(ready['type'], 'ready')
+        return socket, ready
+
+    async def test_rejects_missing_or_bad_tokens(self):
+        for query in ('', 'token=nonsense'):
+            socket = TestSocket('/ws/chat/', query)
+            self.assertFalse(await socket.connect())
+
+    async def test_message_reaches_both_sides_once_stored(self):
+        buyer, _ = await self.connect(self.buyer)
+        seller, ready = await self.connect(self.seller)
+        self.assertEqual(ready['unread'], 0)
+
+        await buyer.send_json_to({
+            'type': 'send', 'conversation': self.conversation.pk, 'body': 'Is it still available?', 'client_id': 'a1',
+        })
+        sent = await buyer.receive_json_from()
+        received = await seller.receive_json_from()
+        self.assertEqual(sent, received)
+        self.assertEqual(sent['client_id'], 'a1')
+        stored = await Message.objects.aget(pk=sent['message']['id'])
+        self.assertEqual(stored.body, 'Is it still available?')
+
+        conversation = await Conversation.objects.aget(pk=self.conversation.pk)
+        self.assertEqual((conversation.buyer_unread, conversation.seller_unread), (0, 1))
+        self.assertEqual(conversation.last_message_at, stored.created_at)
+
+        await seller.send_json_to({'type': 'read', 'conversation': self.conversation.pk})
+        self.assertEqual(await seller.receive_json_from(), {'type': 'read', 'conversation': self.conversation.pk})
+        self.assertEqual(await sync_to_async(Conversation.objects.unread_total)(self.seller.pk), 0)
+        self.assertTrue(await buyer.receive_nothing(timeout=0.1))
+        await buyer.disconnect()
+        await seller.disconnect()
+
+    async def test_outsiders_and_bad_messages_are_refused(self):
+        outsider = await sync_to_async(make_user)(2)
+        socket, _ = await self.connect(outsider)
+        await socket.send_json_to({'type': 'send', 'conversation': self.conversation.pk, 'body': 'hi'})
+        self.assertEqual((await socket.receive_json_from())['detail'], 'Conversation not found.')
+        await socket.disconnect()
+
+        socket, _ = await self.connect(self.buyer)
+        with override_settings(CHAT_MESSAGE_MAX_LENGTH=5):
+            await socket.send_json_to({'type': 'send', 'conversation': self.conversation.pk, 'body': 'too long'})
+            self.assertEqual((await socket.receive_json_from())['type'], 'error')
+        await socket.send_json_to({'type': 'send', 'conversation': self.conversation.pk, 'body': '   '})
+        self.assertEqual((await socket.receive_json_from())['type'], 'error')
+        self.assertFalse(await Message.objects.aexists())
+        await socket.disconnect()
+
+    async def test_failed_write_delivers_nothing(self):
+        buyer, _ = await self.connect(self.buyer)
+        seller, _ = await self.connect(self.seller)
+        with mock.patch('chat.writer.store', side_effect=DatabaseError), self.assertLogs('chat.writer', 'ERROR'):
+            await buyer.send_json_to({'type': 'send', 'conversation': self.conversation.pk, 'body': 'hello'})
+            self.assertEqual((await buyer.receive_json_from())['type'], 'error')
+        self.assertTrue(await seller.receive_nothing(timeout=0.1))
+        await buyer.disconnect()
+        await seller.disconnect()
+
+
+class MessageWriterTests(ChatTestCase):
+    async def submit_many(self, count):
+        return await asyncio.gather(*[
+            writer.submit(self.conversation, self.buyer.pk if i % 3 else self.seller.pk, f'message {i}')
+            for i in range(count)
+        ])
+
+    async def test_concurrent_messages_share_one_insert(self):
+        with mock.patch.object(Message.objects, 'bulk_create', wraps=Message.objects.bulk_create) as bulk_create:
+            messages = await self.submit_many(30)
+        self.assertEqual(bulk_create.call_count, 1)
+        self.assertEqual([message.body for message in messages], [f'message {i}' for i in range(30)])
+        self.assertEqual(len({message.pk for message in messages}), 30)
+
+        conversation = await Conversation.objects.aget(pk=self.conversation.pk)
+        # Every third message is the seller's.
+        self.assertEqual((conversation.buyer_unread, conversation.seller_unread), (10, 20))
+        self.assertEqual(conversation.last_message_at, messages[-1].created_at)
+
+    @override_settings(CHAT_WRITE_BATCH_SIZE=8)
+    async def test_batches_are_capped(self):
+        with mock.patch.object(Message.objects, 'bulk_create', wraps=Message.objects.bulk_create) as bulk_create:
+            await self.submit_many(20)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [8, 8, 4])
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 20)
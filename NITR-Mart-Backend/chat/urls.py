@@ -0,0 +1,11 @@
+from django.urls import path
+from .views import ConversationListCreateView, ConversationReadView, MessageListView, UnreadView
+
+app_name = 'chat'
+
+urlpatterns = [
+    path('conversations/', ConversationListCreateView.as_view(), name='conversation-list-create'),
+    path('conversations/<int:pk>/messages/', MessageListView.as_view(), name='conversation-messages'),
+    path('conversations/<int:pk>/read/', ConversationReadView.as_view(), name='conversation-read'),
+    path('unread/', UnreadView.as_view(), name='unread'),
+]
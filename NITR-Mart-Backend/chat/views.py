@@ -0,0 +1,96 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Left
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from products.pagination import KeysetPagination
+from .consumers import user_group
+from .models import Conversation, Message
+from .serializers import ConversationSerializer, MessageSerializer
+
+PARTICIPANT_FIELDS = ('first_name', 'last_name')
+PREVIEW_LENGTH = 200
+
+
+class ConversationPagination(KeysetPagination):
+    ordering = ('-last_message_at', '-id')
+
+
+class MessagePagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-id',)
+
+
+class ConversationListCreateView(generics.ListCreateAPIView):
+    """
+    GET: the signed-in user's conversations, most recently active first.
+    POST: start a conversation about a listing as its buyer. Starting one
+    that already exists returns it with 200.
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ConversationPagination
+
+    def get_queryset(self):
+        fields = [field.attname for field in Conversation._meta.concrete_fields]
+        participants = [f'{side}__{name}' for side in ('buyer', 'seller') for name in PARTICIPANT_FIELDS]
+        # The latest message of each row is one step along the history index.
+        latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+        return (
+            Conversation.objects.for_user(self.request.user.pk)
+            .select_related('product', 'buyer', 'seller')
+            .only(*fields, 'product__title', *participants)
+            .annotate(last_message=Subquery(latest.values(preview=Left('body', PREVIEW_LENGTH))[:1]))
+        )
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
+
+
+class ConversationMixin:
+    def get_conversation(self):
+        return get_object_or_404(
+            Conversation.objects.for_user(self.request.user.pk).only('id', 'buyer_id', 'seller_id'),
+            pk=self.kwargs['pk'],
+        )
+
+
+class MessageListView(ConversationMixin, generics.ListAPIView):
+    """A conversation's messages, newest first; follow ``next`` for older ones"""
+    serializer_class = MessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessagePagination
+
+    def get_queryset(self):
+        return Message.objects.filter(conversation=self.get_conversation())
+
+
+class ConversationReadView(ConversationMixin, APIView):
+    """Mark a conversation read for the signed-in user; their sockets are told too"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        conversation = self.get_conversation()
+        Conversation.objects.filter(pk=conversation.pk).update(**{conversation.unread_field(request.user.pk): 0})
+        layer = get_channel_layer()
+        if layer is not None:
+            async_to_sync(layer.group_send)(
+                user_group(request.user.pk), {'type': 'chat.read', 'conversation': conversation.pk}
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UnreadView(APIView):
+    """Unread messages across the signed-in user's conversations"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': Conversation.objects.unread_total(request.user.pk)})
@@ -0,0 +1,117 @@
+"""
+Store chat messages in batches.
+
+Sockets hand their messages to the process-wide ``writer`` and wait. The
+writer waits ``CHAT_WRITE_DELAY_MS`` for more to arrive, then stores up to
+``CHAT_WRITE_BATCH_SIZE`` of them in one transaction: one INSERT for the
+messages and a few UPDATEs for the unread counters of their
+conversations. Messages that arrive while a batch is being written make up
+the next one, so batches grow with load instead of the number of queries.
+
+Inbox order only needs to be right to within a batch, so a batch's
+conversations all get its last message time; the counters are bumped with
+one UPDATE per distinct increment, which is one or two per batch.
+
+A sender is answered once its message has committed, with the id and time
+it was stored under, and only then is the message delivered. A failed
+batch fails every send in it; nothing is delivered that was not stored.
+"""
+import asyncio
+import logging
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    return getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 500)
+
+
+def get_delay():
+    return getattr(settings, 'CHAT_WRITE_DELAY_MS', 5) / 1000
+
+
+def store(batch):
+    """Insert ``(message, conversation)`` pairs and bump their conversations, in one transaction"""
+    # The writer outlives requests, so recycle its connection the way a
+    # request would. Inside an outer transaction it must stay as it is.
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+    increments = {}
+    for message, conversation in batch:
+        # The recipient's counter goes up.
+        recipient = conversation.seller_id if message.sender_id == conversation.buyer_id else conversation.buyer_id
+        counts = increments.setdefault(conversation.pk, {'buyer_unread': 0, 'seller_unread': 0})
+        counts[conversation.unread_field(recipient)] += 1
+    groups = {}
+    for pk, counts in increments.items():
+        groups.setdefault((counts['buyer_unread'], counts['seller_unread']), []).append(pk)
+    last_message_at = max(message.created_at for message, _ in batch)
+
+    with transaction.atomic():
+        Message.objects.bulk_create([message for message, _ in batch])
+        for (buyer_unread, seller_unread), pks in groups.items():
+            Conversation.objects.filter(pk__in=pks).update(
+                buyer_unread=F('buyer_unread') + buyer_unread,
+                seller_unread=F('seller_unread') + seller_unread,
+                last_message_at=last_message_at,
+            )
+
+
+class MessageWriter:
+    """Queues messages from the sockets of one event loop and stores them in batches"""
+
+    def __init__(self):
+        self._loop = None
+        self._pending = deque()
+        self._task = None
+
+    async def submit(self, conversation, sender_id, body):
+        """Store a message in ``conversation``; returns the saved Message once committed"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new event loop (a server restart in the same process, or a test).
+            self._loop = loop
+            self._pending = deque()
+            self._task = None
+        message = Message(
+            conversation_id=conversation.pk, sender_id=sender_id, body=body, created_at=timezone.now()
+        )
+        future = loop.create_future()
+        self._pending.append((message, conversation, future))
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return await future
+
+    async def _run(self):
+        # Runs while messages are waiting and ends when the queue is empty;
+        # the next submit starts it again.
+        while self._pending:
+            delay = get_delay()
+            if delay:
+                await asyncio.sleep(delay)
+            size = min(len(self._pending), get_batch_size())
+            batch = [self._pending.popleft() for _ in range(size)]
+            try:
+                await sync_to_async(store)([(message, conversation) for message, conversation, _ in batch])
+            except Exception as error:
+                logger.exception('Could not store %d chat messages', len(batch))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for message, _, future in batch:
+                    if not future.done():
+                        future.set_result(message)
+
+
+writer = MessageWriter()
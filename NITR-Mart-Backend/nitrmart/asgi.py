@@ -2,6 +2,9 @@
 ASGI config for nitrmart project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django, with the async views switched on (see
+ASYNC_VIEWS in settings); WebSocket connections go to the Channels
+consumers listed in each app's routing module.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +15,22 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitrmart.settings')
+# Under an ASGI server the read-heavy endpoints run as async views.
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+# Set up Django before importing consumers, which import models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from chat.routing import websocket_urlpatterns as chat_websockets  # noqa: E402
+from products.routing import websocket_urlpatterns as product_websockets  # noqa: E402
+from users.authentication import JWTAuthMiddleware  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        JWTAuthMiddleware(URLRouter(product_websockets + chat_websockets))
+    ),
+})
@@ -0,0 +1,73 @@
+"""
+DRF views with coroutine handlers, for the read-heavy endpoints under ASGI.
+
+DRF runs every handler synchronously, so under an ASGI server each request
+to a regular APIView takes a thread for its whole life. ``AsyncAPIView``
+runs the same request pipeline (authentication, permissions, exception
+handling, rendering) on the event loop and awaits its handlers, which read
+with the async ORM. A request waiting on the database then costs a
+coroutine, not a thread or a worker.
+
+Async views subclass the regular view for the same URL and override only
+the handlers that read. The others wrap the regular handler with
+``run_sync``, which runs it in a thread as before. The URL confs pick the
+async views when ``ASYNC_VIEWS`` is set, as nitrmart/asgi.py does.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import SynchronousOnlyOperation
+from rest_framework.views import APIView
+
+
+def run_sync(handler):
+    """An async handler that runs the regular view's ``handler`` in a thread"""
+    async def run(self, request, *args, **kwargs):
+        return await sync_to_async(handler)(self, request, *args, **kwargs)
+    run.__name__ = handler.__name__
+    run.__doc__ = handler.__doc__
+    return run
+
+
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        """APIView.dispatch, awaiting the initial checks and the handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by APIView's own, synchronous handler.
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """APIView.initial, without blocking the event loop on a user lookup"""
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        # Tokens with user claims authenticate without a query. Older ones
+        # look the user up; Django refuses that on the event loop before
+        # touching the database, so the lookup is retried in a thread.
+        try:
+            request.user
+        except SynchronousOnlyOperation:
+            await sync_to_async(lambda: request.user)()
@@ -0,0 +1,33 @@
+"""
+Conditional GET helpers shared by the API views.
+
+Views compute an ETag and a Last-Modified timestamp from cheap version data
+(cache generations, ``updated_at`` columns) and call ``not_modified`` before
+running any serializer. When it returns a response, that 304 is sent as is;
+otherwise the view builds its body and stamps it with ``add_validators``.
+"""
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """Return a 304 response if the client's copy is current, else None"""
+    return get_conditional_response(
+        request,
+        etag=quote_etag(etag) if etag else None,
+        last_modified=int(last_modified) if last_modified else None,
+    )
+
+
+def add_validators(response, etag=None, last_modified=None, private=False):
+    """Attach ETag/Last-Modified and ask clients to revalidate before reuse"""
+    if etag:
+        response.headers['ETag'] = quote_etag(etag)
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(int(last_modified))
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+        patch_vary_headers(response, ['Authorization'])
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,106 @@
+"""
+Streaming CSV and JSON Lines for the import and export commands.
+
+Rows are read and written one at a time through generators, so memory use
+depends on the batch size, not on the size of the file or table.
+"""
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path, format=None):
+    if format:
+        return format
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise CommandError(f'Cannot tell the format of {path}; pass --format csv or --format jsonl.')
+
+
+@contextmanager
+def open_text(path, mode):
+    """The named file, or stdin/stdout for '-'"""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    with open(path, mode, newline='', encoding='utf-8') as f:
+        yield f
+
+
+def read_rows(f, format):
+    """
+    Yield (line number, row dict) pairs. Empty CSV cells are left out, so
+    they count as "not given" rather than as empty strings.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value != ''}
+        return
+    for number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Each line must be a JSON object.')
+
+
+class RowWriter:
+    def __init__(self, f, format, fields):
+        self.format = format
+        self.fields = fields
+        self.f = f
+        if format == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.f.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            self.f.write('\n')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Rate:
+    """Counts rows and reports them with the elapsed time and rows/s"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def summary(self, rows):
+        elapsed = time.perf_counter() - self.started
+        return f'{rows} rows in {elapsed:.2f}s, {rows / elapsed if elapsed else 0:.0f} rows/s'
+
+
+def format_errors(errors):
+    """Flatten DRF serializer errors into one line"""
+    parts = []
+    for field, messages in errors.items():
+        if isinstance(messages, (list, tuple)):
+            messages = ' '.join(str(message) for message in messages)
+        parts.append(f'{field}: {messages}' if field != 'non_field_errors' else str(messages))
+    return '; '.join(parts)
@@ -23,6 +23,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
+    'channels',
     'corsheaders',
     'cloudinary',
     'cloudinary_storage',
@@ -31,6 +33,7 @@ INSTALLED_APPS = [
     'users',
     'products',
     'reports',
+    'chat',
 ]
 
 MIDDLEWARE = [
@@ -57,11 +60,25 @@ CSRF_TRUSTED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Token buckets for the open auth endpoints, see nitrmart/throttling.py.
+    # Per-IP limits stay loose because a whole hostel can share one address.
+    'DEFAULT_THROTTLE_RATES': {
+        'otp_send_ip': os.getenv('THROTTLE_OTP_SEND_IP', '60/hour'),
+        'otp_send_email': os.getenv('THROTTLE_OTP_SEND_EMAIL', '5/hour'),
+        'otp_verify_ip': os.getenv('THROTTLE_OTP_VERIFY_IP', '120/hour'),
+        'otp_verify_email': os.getenv('THROTTLE_OTP_VERIFY_EMAIL', '10/hour'),
+        'token_ip': os.getenv('THROTTLE_TOKEN_IP', '60/min'),
+        'token_email': os.getenv('THROTTLE_TOKEN_EMAIL', '10/min'),
+        'listing_report_ip': os.getenv('THROTTLE_LISTING_REPORT_IP', '60/hour'),
+        'listing_report_user': os.getenv('THROTTLE_LISTING_REPORT_USER', '20/hour'),
+    },
+    # Reverse proxies in front of the app; client IPs are read from X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES')) if os.getenv('NUM_PROXIES') else None,
 }
 
 SIMPLE_JWT = {
@@ -69,6 +86,51 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Full user rows loaded by StatelessJWTAuthentication are reused for this long per process.
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', 10))
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Live product events (products/events.py). Redis lets every worker process
+# reach every socket; the in-memory layer only works within one process.
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
+PRODUCT_CACHE_ALIAS = 'default'
+PRODUCT_CACHE_TIMEOUT = int(os.getenv('PRODUCT_CACHE_TIMEOUT', 300))
+
+# How often each process rebuilds its search suggestion trie from the
+# database, to pick up listings saved by other workers (products/suggest.py).
+PRODUCT_SUGGEST_REBUILD_SECONDS = int(os.getenv('PRODUCT_SUGGEST_REBUILD_SECONDS', 300))
+
+PRODUCT_SYNC_OVERLAP_SECONDS = int(os.getenv('PRODUCT_SYNC_OVERLAP_SECONDS', 5))
+PRODUCT_TOMBSTONE_RETENTION_DAYS = int(os.getenv('PRODUCT_TOMBSTONE_RETENTION_DAYS', 30))
+
 ROOT_URLCONF = 'nitrmart.urls'
 
 TEMPLATES = [
@@ -87,6 +149,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'nitrmart.wsgi.application'
+ASGI_APPLICATION = 'nitrmart.asgi.application'
+# Serve the product list/detail and /users/me/ with async views
+# (nitrmart/asyncviews.py). nitrmart/asgi.py turns this on; under WSGI every
+# async view would run on its own event loop, so leave it off there.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
 
 # DATABASES = {
 #     'default': {
@@ -122,6 +189,26 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.User'
 
+# The first hasher hashes new passwords; the others still verify older hashes,
+# which are rehashed with the preferred one on the next successful login.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'scrypt')
+_PASSWORD_HASHERS = {
+    'scrypt': 'users.hashers.TunedScryptPasswordHasher',
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',  # needs argon2-cffi
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# scrypt N=2**15, r=8, p=1 takes ~0.1s and 32 MiB per check.
+SCRYPT_WORK_FACTOR = int(os.getenv('SCRYPT_WORK_FACTOR', 2 ** 15))
+SCRYPT_BLOCK_SIZE = int(os.getenv('SCRYPT_BLOCK_SIZE', 8))
+SCRYPT_PARALLELISM = int(os.getenv('SCRYPT_PARALLELISM', 1))
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 102400))
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 8))
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
 EMAIL_PORT = os.getenv('EMAIL_PORT')
@@ -130,8 +217,21 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
+EMAIL_QUEUE_EAGER = os.getenv('EMAIL_QUEUE_EAGER', 'False').lower() == 'true'
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+EMAIL_QUEUE_RETRY_BASE_SECONDS = int(os.getenv('EMAIL_QUEUE_RETRY_BASE_SECONDS', 30))
+EMAIL_QUEUE_RETRY_MAX_SECONDS = int(os.getenv('EMAIL_QUEUE_RETRY_MAX_SECONDS', 3600))
+EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS = int(os.getenv('EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS', 300))
+EMAIL_JOB_RETENTION_DAYS = int(os.getenv('EMAIL_JOB_RETENTION_DAYS', 14))
+
 OTP_EXPIRY_MINUTES = int(os.getenv('OTP_EXPIRY_MINUTES', 30))
 OTP_LENGTH = int(os.getenv('OTP_LENGTH', 6))
+# Codes need a cache shared by every worker, so fall back to the table without Redis.
+OTP_STORE = os.getenv(
+    'OTP_STORE',
+    'users.otp_store.CacheOTPStore' if REDIS_URL else 'users.otp_store.DatabaseOTPStore'
+)
+OTP_CACHE_ALIAS = 'default'
 
 
 LANGUAGE_CODE = 'en-us'
@@ -158,4 +258,34 @@ cloudinary.config(
     secure=True
 )
 
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
\ No newline at end of file
+DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# Product images are uploaded by the browser straight to storage; see products/uploads.py.
+PRODUCT_UPLOAD_BACKEND = os.getenv(
+    'PRODUCT_UPLOAD_BACKEND',
+    'products.uploads.CloudinaryUploadBackend' if os.getenv('CLOUDINARY_CLOUD_NAME')
+    else 'products.uploads.LocalUploadBackend'
+)
+PRODUCT_UPLOAD_FOLDER = os.getenv('PRODUCT_UPLOAD_FOLDER', 'products')
+PRODUCT_UPLOAD_MAX_AGE_SECONDS = int(os.getenv('PRODUCT_UPLOAD_MAX_AGE_SECONDS', 3600))
+
+# Resized renditions made by the process_image_queue worker; see products/images.py.
+PRODUCT_IMAGE_WIDTHS = [int(w) for w in os.getenv('PRODUCT_IMAGE_WIDTHS', '320,640,1024,1600').split(',')]
+PRODUCT_IMAGE_FORMATS = os.getenv('PRODUCT_IMAGE_FORMATS', 'avif,webp,jpeg').split(',')
+PRODUCT_IMAGE_QUEUE_EAGER = os.getenv('PRODUCT_IMAGE_QUEUE_EAGER', 'False').lower() == 'true'
+PRODUCT_IMAGE_QUEUE_MAX_ATTEMPTS = int(os.getenv('PRODUCT_IMAGE_QUEUE_MAX_ATTEMPTS', 3))
+PRODUCT_BULK_MAX_ITEMS = int(os.getenv('PRODUCT_BULK_MAX_ITEMS', 200))
+# Images whose 64-bit perceptual hashes differ in at most this many bits are reposts.
+PRODUCT_DUPLICATE_MAX_DISTANCE = int(os.getenv('PRODUCT_DUPLICATE_MAX_DISTANCE', 6))
+# Longest date range, in days, one report request may cover.
+REPORTS_MAX_DAYS = int(os.getenv('REPORTS_MAX_DAYS', 731))
+# Listings one bulk moderation request may resolve.
+MODERATION_BULK_MAX_ITEMS = int(os.getenv('MODERATION_BULK_MAX_ITEMS', 500))
+CHAT_MESSAGE_MAX_LENGTH = int(os.getenv('CHAT_MESSAGE_MAX_LENGTH', 2000))
+# Chat messages are stored in batches of up to this many (chat/writer.py),
+# after waiting this long for a batch to fill.
+CHAT_WRITE_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BATCH_SIZE', 500))
+CHAT_WRITE_DELAY_MS = int(os.getenv('CHAT_WRITE_DELAY_MS', 5))
@@ -0,0 +1,183 @@
+"""
+Token-bucket throttling for the open authentication endpoints.
+
+Each throttle keeps one bucket per (scope, client IP) or (scope, email). A
+bucket holds up to N tokens and refills at N per period, so a rate of
+``5/hour`` allows a burst of five and then one more every twelve minutes.
+Rates come from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` under
+``<scope>_ip`` and ``<scope>_email``; a missing rate disables that check.
+
+Buckets live in Redis when ``REDIS_URL`` is set, where a Lua script updates
+each one atomically so every gunicorn worker shares the same limits, and in
+process memory otherwise. Rejected requests get DRF's 429 response with a
+``Retry-After`` header, before any serializer or database work runs.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'throttle'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MEMORY_MAX_BUCKETS = 100000
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / refill
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill) + 1)
+return tostring(wait)
+"""
+
+
+def parse_rate(rate):
+    """'5/hour' -> (capacity 5, refill 5/3600 tokens per second)"""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+class MemoryBucketStore:
+    """Buckets in this process only; least recently used ones are dropped past the cap"""
+
+    def __init__(self, max_buckets=MEMORY_MAX_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.max_buckets = max_buckets
+
+    def take(self, key, capacity, refill):
+        """Take one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * refill)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker, updated atomically by a Lua script"""
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, capacity, refill):
+        try:
+            return float(self._script(keys=[key], args=[capacity, refill]))
+        except Exception:
+            # Failing open keeps sign-in working while Redis is down.
+            logger.warning('Throttle store unavailable; allowing request', exc_info=True)
+            return 0
+
+    def clear(self):
+        keys = list(self._client.scan_iter(f'{KEY_PREFIX}:*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = getattr(settings, 'REDIS_URL', None)
+                _store = RedisBucketStore(url) if url else MemoryBucketStore()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class. Subclasses set ``kind`` and implement ``get_ident_for`` to
+    name the bucket; the view supplies ``throttle_scope``.
+    """
+    kind = None
+
+    def get_ident_for(self, request):
+        raise NotImplementedError
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return None, None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.kind}')
+        return scope, rate
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        scope, rate = self.get_rate(view)
+        ident = self.get_ident_for(request)
+        if rate is None or not ident:
+            return True
+        capacity, refill = parse_rate(rate)
+        key = f'{KEY_PREFIX}:{scope}:{self.kind}:{ident}'
+        self.wait_time = get_bucket_store().take(key, capacity, refill)
+        return self.wait_time <= 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client address (honours NUM_PROXIES)"""
+    kind = 'ip'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class EmailTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per email in the request body, however many addresses send it"""
+    kind = 'email'
+
+    def get_ident_for(self, request):
+        try:
+            email = request.data.get('email')
+        except AttributeError:
+            return None
+        if not isinstance(email, str):
+            return None
+        return email.strip().lower() or None
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per signed-in user"""
+    kind = 'user'
+
+    def get_ident_for(self, request):
+        return request.user.pk if request.user.is_authenticated else None
@@ -7,6 +7,8 @@ urlpatterns = [
     path('us/', admin.site.urls),
     path('users/', include('users.urls')),
     path('products/', include('products.urls')),
+    path('reports/', include('reports.urls')),
+    path('chat/', include('chat.urls')),
 ]
 
 if settings.DEBUG:
@@ -1,12 +1,16 @@
-from django.contrib import admin
-from .models import Product
+from django.contrib import admin, messages
+from django.db.models import Q
+from . import bulk
+from .models import Product, ProductImageJob
+from .search import make_search_query, uses_postgres
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('title', 'seller', 'price', 'category', 'is_sold', 'posted_at')
-    list_filter = ('category', 'is_sold', 'posted_at')
-    search_fields = ('title', 'description', 'seller__username')
-    readonly_fields = ('posted_at',)
+    list_display = ('title', 'seller', 'price', 'category', 'is_sold', 'posted_at', 'duplicate_of')
+    list_filter = ('category', 'is_sold', 'posted_at', ('duplicate_of', admin.EmptyFieldListFilter))
+    search_fields = ('title', 'description', 'seller__email')
+    readonly_fields = ('posted_at', 'updated_at', 'duplicate_of')
+    actions = ['mark_sold']
     fieldsets = (
         (None, {
             'fields': ('title', 'description', 'seller')
@@ -15,6 +19,25 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('price', 'negotiable')
         }),
         ('Details', {
-            'fields': ('image', 'category', 'is_sold', 'posted_at')
+            'fields': ('image', 'category', 'is_sold', 'posted_at', 'updated_at', 'duplicate_of')
         }),
-    )
\ No newline at end of file
+    )
+
+    @admin.action(description='Mark selected products as sold')
+    def mark_sold(self, request, queryset):
+        results = bulk.apply(request.user, bulk.MARK_SOLD, queryset.values_list('pk', flat=True))
+        updated = sum(result['status'] == bulk.UPDATED for result in results)
+        self.message_user(request, f'Marked {updated} of {len(results)} products as sold.', messages.SUCCESS)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the tsvector GIN index instead of ILIKE scans where available.
+        if search_term and uses_postgres(queryset):
+            matches = Q(search_vector=make_search_query(search_term)) | Q(seller__email__iexact=search_term)
+            return queryset.filter(matches), False
+        return super().get_search_results(request, queryset, search_term)
+
+@admin.register(ProductImageJob)
+class ProductImageJobAdmin(admin.ModelAdmin):
+    list_display = ('product', 'status', 'attempts', 'next_attempt_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('source', 'created_at', 'finished_at', 'claimed_at', 'last_error')
@@ -0,0 +1,120 @@
+"""
+Mark sold, re-price or delete many products in one transaction.
+
+The rows are locked and checked against the caller in a single query, then
+changed with one UPDATE (or one delete) for everything the caller may
+touch. Updates skip the model signals, so this module does their work
+itself: ``updated_at`` for the changes feed, cache generations, the
+in-process search, suggestion and duplicate indexes and the live feed
+events, once the transaction commits. Other apps hear of updates through
+``products_updated``. Deletes still go through the signals, which record
+the tombstones.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import cache as product_cache
+from . import events
+from .duplicates import duplicate_index
+from .models import Product
+from .search import search_index
+from .suggest import suggestion_index
+
+MARK_SOLD = 'mark_sold'
+REPRICE = 'reprice'
+DELETE = 'delete'
+ACTIONS = (MARK_SOLD, REPRICE, DELETE)
+
+# Per-item outcomes.
+UPDATED = 'updated'
+DELETED = 'deleted'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+# Sent inside the transaction with the products an update changed. They hold
+# their new values, and from_db's _loaded_ ones from before the update.
+products_updated = Signal()
+
+
+def can_edit(user, seller_id):
+    return user.pk == seller_id or user.is_staff or user.is_superuser
+
+
+def _invalidate(products):
+    scopes = {product_cache.ALL_SCOPE}
+    for product in products:
+        scopes.add(product_cache.product_scope(product.pk))
+        scopes.add(product_cache.category_scope(product.category))
+    product_cache.bump(*scopes)
+
+
+def apply(user, action, ids, prices=None):
+    """
+    Apply ``action`` to the products with the given ids on behalf of
+    ``user``. ``prices`` maps id to new price for REPRICE. Returns one
+    ``{'id', 'status'}`` result per distinct id, in request order.
+    """
+    ids = list(dict.fromkeys(ids))
+    now = timezone.now()
+    results = {}
+    with transaction.atomic():
+        rows = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=ids).only('id', 'seller_id', 'category', 'is_sold', 'price', 'posted_at')
+        }
+        allowed = []
+        for pk in ids:
+            product = rows.get(pk)
+            if product is None:
+                results[pk] = NOT_FOUND
+            elif not can_edit(user, product.seller_id):
+                results[pk] = FORBIDDEN
+            elif action == MARK_SOLD and product.is_sold:
+                results[pk] = UNCHANGED
+            elif action == REPRICE and product.price == prices[pk]:
+                results[pk] = UNCHANGED
+            else:
+                allowed.append(product)
+
+        if action == DELETE:
+            if allowed:
+                Product.objects.filter(pk__in=[product.pk for product in allowed]).delete()
+            status = DELETED
+        elif action == MARK_SOLD:
+            if allowed:
+                Product.objects.filter(pk__in=[product.pk for product in allowed]).update(
+                    is_sold=True, updated_at=now
+                )
+            for product in allowed:
+                product.is_sold = True
+                product.updated_at = now
+            status = UPDATED
+        else:
+            for product in allowed:
+                product.price = prices[product.pk]
+                product.updated_at = now
+            Product.objects.bulk_update(allowed, ['price', 'updated_at'])
+            status = UPDATED
+
+        for product in allowed:
+            results[product.pk] = status
+
+        if allowed and action != DELETE:
+            products_updated.send(sender=Product, products=allowed)
+            # After the outermost transaction, which may be the caller's.
+            transaction.on_commit(lambda: _after_update(action, allowed))
+    return [{'id': pk, 'status': results[pk]} for pk in ids]
+
+
+def _after_update(action, products):
+    _invalidate(products)
+    event = events.SOLD if action == MARK_SOLD else events.UPDATED
+    events.publish(events.describe(product, event) for product in products)
+    if action == MARK_SOLD:
+        for product in products:
+            search_index.remove(product.pk)
+            suggestion_index.remove(product.pk)
+            duplicate_index.remove(product.pk)
@@ -0,0 +1,130 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.text import slugify
+
+KEY_PREFIX = 'products'
+ALL_SCOPE = 'all'
+SELLERS_SCOPE = 'sellers'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PRODUCT_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300)
+
+
+def category_scope(category):
+    return f'category:{slugify(category)}'
+
+
+def product_scope(pk):
+    return f'product:{pk}'
+
+
+def _generation_key(scope):
+    return f'{KEY_PREFIX}:gen:{scope}'
+
+
+def _changed_key(scope):
+    return f'{KEY_PREFIX}:changed:{scope}'
+
+
+def _fresh_generation():
+    # Millisecond clock, so a generation that was evicted from the cache comes
+    # back larger than any value it had before and never revives stale keys.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """
+    Current generation number and last change time of each scope, creating
+    missing ones. Returns ({scope: generation}, {scope: changed_at}).
+    """
+    cache = get_cache()
+    generation_keys = {scope: _generation_key(scope) for scope in scopes}
+    changed_keys = {scope: _changed_key(scope) for scope in scopes}
+    found = cache.get_many([*generation_keys.values(), *changed_keys.values()])
+    generations = {}
+    changed = {}
+    for scope in scopes:
+        key = generation_keys[scope]
+        if key not in found:
+            # Nothing is known about earlier versions, so treat it as changed now.
+            now = time.time()
+            cache.add(key, _fresh_generation(), timeout=None)
+            cache.add(changed_keys[scope], now, timeout=None)
+            found[key] = cache.get(key)
+            found[changed_keys[scope]] = cache.get(changed_keys[scope], now)
+        generations[scope] = found[key]
+        changed[scope] = found.get(changed_keys[scope], time.time())
+    return generations, changed
+
+
+def bump(*scopes):
+    """
+    Advance each scope's generation so every payload built on it is skipped.
+    Inside a transaction this waits for the commit; bumping earlier would let
+    a concurrent reader cache the rows still committed under the new
+    generation.
+    """
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    cache = get_cache()
+    now = time.time()
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), timeout=None)
+        cache.set(_changed_key(scope), now, timeout=None)
+
+
+def invalidate_product(pk, *categories):
+    """Drop the detail payload of a product and every list page that may show it"""
+    scopes = {ALL_SCOPE, *(category_scope(category) for category in categories if category)}
+    if pk is not None:
+        scopes.add(product_scope(pk))
+    bump(*scopes)
+
+
+def invalidate_sellers():
+    """Drop every payload that embeds seller details"""
+    bump(SELLERS_SCOPE)
+
+
+# Cache key of a payload plus the HTTP validators derived from the same generations.
+Version = namedtuple('Version', ['key', 'etag', 'last_modified'])
+
+
+def _version(kind, scopes, parts):
+    generations, changed = get_generations(*scopes)
+    version = ':'.join(str(generations[scope]) for scope in scopes)
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    key = f'{KEY_PREFIX}:{kind}:{version}:{digest}'
+    etag = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+    return Version(key, etag, max(changed.values()))
+
+
+def list_version(request, category=None):
+    """
+    Version of a list page. Pages filtered by category only depend on that
+    category's generation, so writes elsewhere leave them cached.
+    """
+    scope = category_scope(category) if category else ALL_SCOPE
+    parts = (request.get_host(), request.scheme, sorted(request.query_params.lists()))
+    return _version('list', (scope, SELLERS_SCOPE), parts)
+
+
+def detail_version(pk):
+    """Version of a product's detail payload, which embeds the seller's details too"""
+    return _version('detail', (product_scope(pk), SELLERS_SCOPE), (pk,))
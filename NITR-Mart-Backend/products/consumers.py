@@ -0,0 +1,76 @@
+from urllib.parse import parse_qs
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import group_name
+from .models import CATEGORIES
+from .sync import starting_token
+
+CATEGORY_VALUES = [value for value, _ in CATEGORIES]
+
+# Close code for a subscription naming an unknown category.
+INVALID_SUBSCRIPTION = 4400
+
+
+class ProductFeedConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live product events for dashboards. Connect to ``ws/products/``, with
+    ``?category=...`` (repeatable) to follow only some categories. Send
+    ``{"categories": [...]}`` at any time to change them; an empty list
+    follows all of them.
+
+    The server answers each subscription with ``{"type": "subscribed",
+    "categories": [...], "since": <sync token>}``. Events then arrive as
+    ``{"type": "events", "events": [...]}``. After a reconnect, pass the last
+    ``since`` to /products/changes/ to catch up on what was missed.
+    """
+
+    async def connect(self):
+        self.categories = set()
+        requested = parse_qs(self.scope.get('query_string', b'').decode()).get('category', [])
+        await self.accept()
+        await self.subscribe(requested)
+
+    async def disconnect(self, code):
+        for category in self.categories:
+            await self.channel_layer.group_discard(group_name(category), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        categories = content.get('categories') if isinstance(content, dict) else None
+        if not isinstance(categories, list):
+            await self.send_json({'type': 'error', 'detail': 'Send {"categories": [...]} to change the subscription.'})
+            return
+        await self.subscribe(categories)
+
+    async def subscribe(self, categories):
+        unknown = [category for category in categories if category not in CATEGORY_VALUES]
+        if unknown:
+            await self.send_json({'type': 'error', 'detail': f'Unknown categories: {", ".join(map(str, unknown))}'})
+            await self.close(code=INVALID_SUBSCRIPTION)
+            return
+        wanted = set(categories) or set(CATEGORY_VALUES)
+        for category in self.categories - wanted:
+            await self.channel_layer.group_discard(group_name(category), self.channel_name)
+        for category in wanted - self.categories:
+            await self.channel_layer.group_add(group_name(category), self.channel_name)
+        self.categories = wanted
+        await self.send_json({
+            'type': 'subscribed',
+            'categories': [category for category in CATEGORY_VALUES if category in wanted],
+            'since': starting_token(),
+        })
+
+    async def product_events(self, message):
+        # A product that changed category is sent to both groups. Forward it
+        # only from the first of its categories this socket follows, so
+        # sockets in both groups get it once.
+        events = [
+            event for event in message['events']
+            if next(
+                (category for category in (event['category'], event.get('previous_category'))
+                 if category in self.categories),
+                None,
+            ) == message['category']
+        ]
+        if events:
+            await self.send_json({'type': 'events', 'events': events})
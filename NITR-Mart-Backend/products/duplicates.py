@@ -0,0 +1,202 @@
+"""
+Near-duplicate listing detection from perceptual image hashes.
+
+Each processed product image gets a 64-bit difference hash (dHash): the
+image is reduced to 9x8 grey pixels and every bit records whether a pixel
+is brighter than its right-hand neighbour. Re-encoding, resizing, light
+crops and colour tweaks flip only a few bits, so reposts of the same photo
+sit within a small Hamming distance of each other.
+
+``duplicate_index`` is a multi-index hash table over the hashes of unsold
+products, loaded lazily from ``Product.image_hash`` and kept current by the
+product signals. A lookup checks only the hashes that share an exact bit
+range with the query, which keeps it well under a millisecond at catalog
+sizes where a linear scan is not (see benchmarks/duplicate_lookup.py). A
+BK-tree prunes almost nothing here: unrelated 64-bit hashes all sit about
+32 bits apart.
+"""
+import threading
+
+from django.conf import settings
+from PIL import Image
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def to_signed(value):
+    """Store an unsigned 64-bit hash in a signed BIGINT column"""
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def to_unsigned(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def get_max_distance():
+    return getattr(settings, 'PRODUCT_DUPLICATE_MAX_DISTANCE', 6)
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing under Hamming distance. Hashes are split into
+    ``radius + 1`` bit ranges with one table per range. Two hashes within
+    ``radius`` bits of each other must agree exactly on at least one range,
+    so a query only checks the entries sharing one of its ranges. Searches
+    beyond ``radius`` fall back to a full scan.
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        count = radius + 1
+        bounds = [HASH_BITS * i // count for i in range(count + 1)]
+        self._ranges = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self._tables = [{} for _ in self._ranges]
+        self._items = {}
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    def _keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self._ranges]
+
+    def add(self, value, item):
+        items = self._items.get(value)
+        if items is None:
+            items = self._items[value] = set()
+            for table, key in zip(self._tables, self._keys(value)):
+                table.setdefault(key, set()).add(value)
+        items.add(item)
+
+    def discard(self, value, item):
+        items = self._items.get(value)
+        if items is None:
+            return
+        items.discard(item)
+        if items:
+            return
+        del self._items[value]
+        for table, key in zip(self._tables, self._keys(value)):
+            bucket = table[key]
+            bucket.discard(value)
+            if not bucket:
+                del table[key]
+
+    def search(self, value, max_distance):
+        """(distance, item) pairs within ``max_distance`` of ``value``"""
+        if max_distance > self.radius:
+            candidates = self._items
+        else:
+            candidates = set()
+            for table, key in zip(self._tables, self._keys(value)):
+                candidates.update(table.get(key, ()))
+        found = []
+        for candidate in candidates:
+            distance = (value ^ candidate).bit_count()
+            if distance <= max_distance:
+                found.extend((distance, item) for item in self._items[candidate])
+        return found
+
+
+class DuplicateIndex:
+    """
+    Hashes of unsold product images by product id, searchable by distance.
+    Loaded lazily on first use and kept current by the product signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._table = MultiIndexHash(get_max_distance())
+        self._hashes = {}
+        self._loaded = False
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import Product
+
+        rows = (
+            Product.objects.filter(is_sold=False, image_hash__isnull=False)
+            .values_list('pk', 'image_hash')
+        )
+        with self._lock:
+            if self._loaded:
+                return
+            for pk, value in rows.iterator(chunk_size=2000):
+                self._add(pk, to_unsigned(value))
+            self._loaded = True
+
+    def _add(self, pk, value):
+        if self._hashes.get(pk) == value:
+            return
+        self._remove(pk)
+        self._hashes[pk] = value
+        self._table.add(value, pk)
+
+    def _remove(self, pk):
+        value = self._hashes.pop(pk, None)
+        if value is not None:
+            self._table.discard(value, pk)
+
+    def update(self, product):
+        if not self._loaded:
+            return
+        with self._lock:
+            if product.is_sold or product.image_hash is None:
+                self._remove(product.pk)
+            else:
+                self._add(product.pk, to_unsigned(product.image_hash))
+
+    def remove(self, pk):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(pk)
+
+    def find(self, value, max_distance=None, exclude=None):
+        """Ids of products whose image is within ``max_distance``, nearest first"""
+        if max_distance is None:
+            max_distance = get_max_distance()
+        self._ensure_loaded()
+        with self._lock:
+            matches = self._table.search(value, max_distance)
+        return [pk for distance, pk in sorted(matches) if pk != exclude]
+
+
+duplicate_index = DuplicateIndex()
+
+
+def find_original(product, value):
+    """
+    The earlier listing ``product`` most likely duplicates: the nearest
+    older product within the configured distance that still exists, or None.
+    """
+    from .models import Product
+
+    candidates = [pk for pk in duplicate_index.find(value, exclude=product.pk) if pk < product.pk]
+    if not candidates:
+        return None
+    # The index may be behind deletes made by other processes.
+    existing = set(Product.objects.filter(pk__in=candidates).values_list('pk', flat=True))
+    return next((pk for pk in candidates if pk in existing), None)
@@ -0,0 +1,100 @@
+"""
+Push product changes to connected dashboards over the channel layer.
+
+Every change becomes a small event, such as ``{"event": "sold", "id": 12,
+"category": "Furniture", ...}``, sent to the group of the product's
+category. Dashboards subscribe to the categories they show
+(products/consumers.py) and fetch details from the API only for the
+products they display. Events from one transaction are collected and sent
+after commit as one message per category. A bulk action over hundreds of
+products therefore costs a handful of channel layer calls, and a rolled
+back write sends nothing.
+"""
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+SOLD = 'sold'
+DELETED = 'deleted'
+
+MESSAGE_TYPE = 'product.events'
+
+_pending = threading.local()
+
+
+def group_name(category):
+    return f'products.{slugify(category)}'
+
+
+def describe(product, event, previous_category=None):
+    """The event for a product; only reads fields every caller has loaded"""
+    data = {
+        'event': event,
+        'id': product.pk,
+        'category': product.category,
+        'price': str(product.price) if product.price is not None else None,
+        'is_sold': product.is_sold,
+        'updated_at': (product.updated_at or timezone.now()).isoformat(),
+    }
+    if previous_category and previous_category != product.category:
+        data['previous_category'] = previous_category
+    return data
+
+
+class _Outbox:
+    """Events of one transaction, sent together when it commits"""
+
+    def __init__(self):
+        self.events = []
+
+    def send(self):
+        if getattr(_pending, 'outbox', None) is self:
+            del _pending.outbox
+        send(self.events)
+
+
+def publish(events):
+    """Send events once the current transaction commits (at once outside one)"""
+    events = list(events)
+    if not events:
+        return
+    connection = transaction.get_connection()
+    outbox = getattr(_pending, 'outbox', None)
+    # Join the outbox of this transaction while its callback is still
+    # registered. A rollback discards the callback and its events with it.
+    if outbox is not None and connection.in_atomic_block and any(
+        callback == outbox.send for _, callback, _ in connection.run_on_commit
+    ):
+        outbox.events.extend(events)
+        return
+    outbox = _pending.outbox = _Outbox()
+    outbox.events.extend(events)
+    transaction.on_commit(outbox.send)
+
+
+def send(events):
+    """Send events to their category groups now, one message per group"""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    batches = {}
+    for event in events:
+        for category in {event['category'], event.get('previous_category')} - {None}:
+            batches.setdefault(category, []).append(event)
+    for category, batch in batches.items():
+        try:
+            async_to_sync(layer.group_send)(
+                group_name(category), {'type': MESSAGE_TYPE, 'category': category, 'events': batch}
+            )
+        except Exception:
+            # Dashboards catch up from the changes feed; a write must not fail over this.
+            logger.warning('Could not publish product events', exc_info=True)
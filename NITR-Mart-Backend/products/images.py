@@ -0,0 +1,330 @@
+"""
+Background processing of product images.
+
+Saving a product with a new image queues a ``ProductImageJob``. The
+``process_image_queue`` command claims due jobs, reads each original from
+the upload backend and renders it in a process pool: orientation is applied
+and all metadata (EXIF, GPS, camera serials) is dropped, the image is scaled
+down to each of ``PRODUCT_IMAGE_WIDTHS`` and encoded as WebP, AVIF (where
+Pillow supports it) and a JPEG fallback, plus a tiny blurred JPEG used as a
+placeholder while the real image loads. The renditions go back to the
+backend and their references are stored in ``Product.image_variants``,
+which ``ProductSerializer`` exposes as srcset strings. The same pass
+computes the perceptual hash used to flag reposted listings
+(products/duplicates.py).
+"""
+import base64
+import io
+import logging
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageFilter, ImageOps, features
+
+from .duplicates import dhash, find_original, to_signed
+from .models import Product, ProductImageJob
+from .uploads import get_upload_backend
+
+logger = logging.getLogger(__name__)
+
+# Preferred order for <picture> sources; JPEG is the fallback every browser reads.
+FORMATS = ('avif', 'webp', 'jpeg')
+PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+PLACEHOLDER_WIDTH = 16
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_widths():
+    return sorted(_setting('PRODUCT_IMAGE_WIDTHS', (320, 640, 1024, 1600)))
+
+
+def get_formats():
+    """Configured output formats this Pillow build can encode"""
+    wanted = _setting('PRODUCT_IMAGE_FORMATS', FORMATS)
+    return [name for name in FORMATS if name in wanted and (name == 'jpeg' or features.check(name))]
+
+
+def get_quality():
+    return {
+        'avif': _setting('PRODUCT_IMAGE_AVIF_QUALITY', 55),
+        'webp': _setting('PRODUCT_IMAGE_WEBP_QUALITY', 75),
+        'jpeg': _setting('PRODUCT_IMAGE_JPEG_QUALITY', 80),
+    }
+
+
+def image_key(value):
+    """The stored form of an image value, used to tell whether it changed"""
+    return Product._meta.get_field('image').get_prep_value(value) or ''
+
+
+def target_widths(width, widths):
+    """Configured widths smaller than the original, capped by the original itself"""
+    chosen = [w for w in widths if w < width]
+    largest = min(width, widths[-1])
+    if largest not in chosen:
+        chosen.append(largest)
+    return chosen
+
+
+def _open_upright(data, choose_width):
+    """
+    Open encoded image bytes with orientation applied, letting the JPEG
+    decoder skip detail the output will not need. ``choose_width`` maps
+    the upright width to the smallest width the caller needs. Returns the
+    image and its full upright (width, height), which a reduced decode no
+    longer has.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    # Orientations 5-8 are quarter turns: the stored width is the upright height.
+    turned = image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8)
+    if turned:
+        width, height = height, width
+    size = choose_width(width)
+    request = (size, max(1, round(height * size / width)))
+    # draft() only works before the pixels are decoded, so it has to come
+    # before exif_transpose(), in the stored orientation.
+    image.draft('RGB', request[::-1] if turned else request)
+    return ImageOps.exif_transpose(image), (width, height)
+
+
+def _flatten(image):
+    """RGB copy of ``image``; transparency is composited onto white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, format, quality):
+    buffer = io.BytesIO()
+    options = {'quality': quality}
+    if format == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    elif format == 'webp':
+        options.update(method=4)
+    image.save(buffer, PIL_FORMATS[format], **options)
+    return buffer.getvalue()
+
+
+def render_variants(data, widths, formats, quality):
+    """
+    Decode ``data`` and encode every (width, format) rendition. Pure, so it
+    can run in a worker process. Returns a dict with the original size, the
+    placeholder data URI, the dHash and ``files``, a list of (width, format,
+    bytes).
+    """
+    # Orientation lives in EXIF, which is not copied to the output. Decode
+    # only the detail the largest rendition keeps.
+    image, (width, height) = _open_upright(data, lambda width: target_widths(width, widths)[-1])
+    sizes = target_widths(width, widths)
+    image = _flatten(image)
+
+    files = []
+    current = image
+    for size in reversed(sizes):
+        # Each rendition is scaled from the next larger one, not the original.
+        if current.width != size:
+            current = current.resize((size, max(1, round(height * size / width))), Image.LANCZOS)
+        for format in formats:
+            files.append((size, format, _encode(current, format, quality[format])))
+
+    tiny = current.resize(
+        (PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.BILINEAR
+    ).filter(ImageFilter.GaussianBlur(1))
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(_encode(tiny, 'jpeg', 40)).decode()
+    return {
+        'width': width, 'height': height, 'placeholder': placeholder,
+        'hash': dhash(current), 'files': files,
+    }
+
+
+def hash_original(data):
+    """dHash of encoded image bytes, decoded the way ``render_variants`` does"""
+    widths = get_widths()
+    image, _ = _open_upright(data, lambda width: target_widths(width, widths)[0])
+    return dhash(_flatten(image))
+
+
+def enqueue_image_job(product):
+    """Queue variant rendering for the product's current image"""
+    source = image_key(product.image)
+    if not source:
+        ProductImageJob.objects.filter(product=product).delete()
+        return None
+    job, _ = ProductImageJob.objects.update_or_create(
+        product=product,
+        defaults={
+            'source': source,
+            'status': ProductImageJob.STATUS_PENDING,
+            'attempts': 0,
+            'next_attempt_at': timezone.now(),
+            'claimed_at': None,
+            'last_error': '',
+            'finished_at': None,
+        },
+    )
+    if _setting('PRODUCT_IMAGE_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: process_jobs([job.pk]))
+    return job
+
+
+def retry_delay(attempts):
+    base = _setting('PRODUCT_IMAGE_QUEUE_RETRY_BASE_SECONDS', 60)
+    return timedelta(seconds=min(3600, base * 2 ** max(attempts - 1, 0)))
+
+
+def claim_due_jobs(batch_size):
+    """
+    Atomically mark up to ``batch_size`` due jobs as processing and return
+    their ids, skipping rows another worker holds. Jobs left processing by a
+    crashed worker become claimable again after a timeout.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('PRODUCT_IMAGE_QUEUE_CLAIM_TIMEOUT_SECONDS', 600))
+    due = (
+        Q(status=ProductImageJob.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=ProductImageJob.STATUS_PROCESSING, claimed_at__lt=stale)
+    )
+    with transaction.atomic():
+        ids = list(
+            ProductImageJob.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if ids:
+            ProductImageJob.objects.filter(pk__in=ids).update(
+                status=ProductImageJob.STATUS_PROCESSING, claimed_at=now
+            )
+    return ids
+
+
+def run_inline(fn, *args):
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def _finish(job, **fields):
+    # Filtering on the source leaves a job that was re-queued for a newer
+    # image while this one ran pending for the next batch.
+    return ProductImageJob.objects.filter(pk=job.pk, source=job.source).update(**fields)
+
+
+def _fail(job, exc):
+    job.attempts += 1
+    max_attempts = _setting('PRODUCT_IMAGE_QUEUE_MAX_ATTEMPTS', 3)
+    fields = {'attempts': job.attempts, 'claimed_at': None, 'last_error': repr(exc)}
+    if job.attempts >= max_attempts:
+        fields.update(status=ProductImageJob.STATUS_FAILED, finished_at=timezone.now())
+    else:
+        fields.update(status=ProductImageJob.STATUS_PENDING, next_attempt_at=timezone.now() + retry_delay(job.attempts))
+    _finish(job, **fields)
+    logger.warning('Image job %s failed (attempt %s): %s', job.pk, job.attempts, exc)
+
+
+def process_jobs(job_ids, executor=None):
+    """
+    Render and store variants for the given jobs; returns (done, failed).
+    Decoding and encoding run on ``executor`` when given, storage I/O and
+    database writes stay in this process.
+    """
+    jobs = list(ProductImageJob.objects.filter(pk__in=job_ids).select_related('product'))
+    backend = get_upload_backend()
+    widths, formats, quality = get_widths(), get_formats(), get_quality()
+    submit = executor.submit if executor is not None else run_inline
+    field = Product._meta.get_field('image')
+
+    rendering = []
+    failed = 0
+    for job in jobs:
+        try:
+            data = backend.read(field.to_python(job.source))
+        except Exception as exc:
+            _fail(job, exc)
+            failed += 1
+            continue
+        rendering.append((job, submit(render_variants, data, widths, formats, quality)))
+
+    done = 0
+    for job, future in rendering:
+        try:
+            result = future.result()
+            resource = field.to_python(job.source)
+            files = {}
+            for width, format, content in result['files']:
+                files.setdefault(format, {})[str(width)] = backend.save_variant(resource, width, format, content)
+        except Exception as exc:
+            _fail(job, exc)
+            failed += 1
+            continue
+
+        product = Product.objects.filter(pk=job.product_id).first()
+        if product is not None and image_key(product.image) == job.source:
+            product.image_variants = {
+                'source': job.source,
+                'width': result['width'],
+                'height': result['height'],
+                'placeholder': result['placeholder'],
+                'files': files,
+            }
+            product.image_hash = to_signed(result['hash'])
+            product.duplicate_of_id = find_original(product, result['hash'])
+            # A regular save, so caches, the indexes and the changes feed see it.
+            product.save(update_fields=['image_variants', 'image_hash', 'duplicate_of', 'updated_at'])
+        _finish(
+            job, status=ProductImageJob.STATUS_DONE, attempts=job.attempts + 1,
+            claimed_at=None, last_error='', finished_at=timezone.now(),
+        )
+        done += 1
+    return done, failed
+
+
+def process_queue(batch_size=20, executor=None):
+    """Claim and process one batch; returns (done, failed) counts"""
+    ids = claim_due_jobs(batch_size)
+    if not ids:
+        return 0, 0
+    return process_jobs(ids, executor)
+
+
+def describe_variants(product, build_url):
+    """
+    The variants of the product's current image for API responses, or None
+    while they are still being made. ``build_url`` turns a backend URL into
+    the one clients should use.
+    """
+    variants = product.image_variants
+    if not variants or variants.get('source') != image_key(product.image):
+        return None
+    backend = get_upload_backend()
+    srcset = {}
+    for format in FORMATS:
+        renditions = variants['files'].get(format)
+        if renditions:
+            srcset[format] = ', '.join(
+                f'{build_url(backend.get_variant_url(reference))} {width}w'
+                for width, reference in sorted(renditions.items(), key=lambda item: int(item[0]))
+            )
+    fallback = variants['files'].get('jpeg', {})
+    largest = max(fallback, key=int) if fallback else None
+    return {
+        'width': variants['width'],
+        'height': variants['height'],
+        'placeholder': variants['placeholder'],
+        'src': build_url(backend.get_variant_url(fallback[largest])) if largest else None,
+        'srcset': srcset,
+    }
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from nitrmart.dataio import FORMATS, Rate, RowWriter, detect_format, open_text
+from products.images import image_key
+from products.models import Product
+
+FIELDS = [
+    'id', 'title', 'description', 'price', 'negotiable', 'category', 'image',
+    'is_sold', 'seller', 'posted_at', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = ('Write every product to a CSV or JSON Lines file ("-" for stdout), streaming the '
+            'table in chunks. The output can be read back with import_products.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or - for stdout.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='csv or jsonl (default: from the file extension).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database at a time (default 2000).')
+        parser.add_argument('--unsold', action='store_true',
+                            help='Only products that are still for sale.')
+
+    def handle(self, *args, **options):
+        format = detect_format(options['path'], options['format'])
+        queryset = Product.objects.all()
+        if options['unsold']:
+            queryset = queryset.filter(is_sold=False)
+        columns = [field if field != 'seller' else 'seller__email' for field in FIELDS]
+        rows = queryset.order_by('pk').values_list(*columns)
+        rate = Rate()
+        count = 0
+        with open_text(options['path'], 'w') as f:
+            writer = RowWriter(f, format, FIELDS)
+            for values in rows.iterator(chunk_size=options['chunk_size']):
+                row = dict(zip(FIELDS, values))
+                row['image'] = image_key(row['image'])
+                writer.write(row)
+                count += 1
+        # Keep the summary off stdout when the data itself goes there.
+        out = self.stderr if options['path'] == '-' else self.stdout
+        out.write(f'Exported {rate.summary(count)}')
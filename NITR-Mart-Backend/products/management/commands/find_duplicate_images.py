@@ -0,0 +1,140 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.duplicates import MultiIndexHash, duplicate_index, get_max_distance, to_signed, to_unsigned
+from products.images import run_inline, hash_original
+from products.models import Product
+from products.uploads import get_upload_backend
+
+
+class Command(BaseCommand):
+    help = 'Hash product images that have no perceptual hash yet, then group near-duplicate listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes that decode and hash images (default: one per core; 0 hashes inline).')
+        parser.add_argument('--batch-size', type=int, default=32,
+                            help='Images held in memory and written per batch (default 32).')
+        parser.add_argument('--max-distance', type=int, default=None,
+                            help='Largest Hamming distance counted as a duplicate (default PRODUCT_DUPLICATE_MAX_DISTANCE).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report clusters without saving hashes or duplicate flags.')
+
+    def handle(self, *args, **options):
+        max_distance = options['max_distance']
+        if max_distance is None:
+            max_distance = get_max_distance()
+
+        executor = None
+        if options['workers'] > 0:
+            connections.close_all()
+            executor = ProcessPoolExecutor(options['workers'])
+        try:
+            hashes = self.backfill(executor, options['batch_size'], options['dry_run'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.cluster(hashes, max_distance, options['batch_size'], options['dry_run'])
+
+    def backfill(self, executor, batch_size, dry_run):
+        """Hash images missing a hash; returns {pk: unsigned hash} for everything computed"""
+        started = time.perf_counter()
+        backend = get_upload_backend()
+        field = Product._meta.get_field('image')
+        missing = (
+            Product.objects.filter(image_hash__isnull=True).exclude(image__isnull=True).exclude(image='')
+            .order_by('pk').values_list('pk', 'image')
+        )
+        submit = executor.submit if executor is not None else run_inline
+        rows = list(missing)
+        computed = {}
+        failed = 0
+        for start in range(0, len(rows), batch_size):
+            pending = []
+            for pk, image in rows[start:start + batch_size]:
+                try:
+                    pending.append((pk, submit(hash_original, backend.read(field.to_python(image)))))
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'product {pk}: could not read image: {exc!r}')
+            products = []
+            for pk, future in pending:
+                try:
+                    computed[pk] = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'product {pk}: could not hash image: {exc!r}')
+                    continue
+                products.append(Product(pk=pk, image_hash=to_signed(computed[pk])))
+            if not dry_run:
+                # The hash is not part of any API payload, so skipping
+                # signals leaves no cache stale; the index reloads below.
+                Product.objects.bulk_update(products, ['image_hash'], batch_size=batch_size)
+
+        elapsed = time.perf_counter() - started
+        rate = len(computed) / elapsed if elapsed else 0
+        self.stdout.write(f'Hashed {len(computed)} images ({failed} failed) in {elapsed:.2f}s, {rate:.0f} images/s')
+        return computed
+
+    def cluster(self, computed, max_distance, batch_size, dry_run):
+        """Flag each unsold listing with the nearest older one it duplicates"""
+        started = time.perf_counter()
+        rows = (
+            Product.objects.filter(is_sold=False)
+            .order_by('pk').values_list('pk', 'image_hash', 'duplicate_of_id', 'seller_id')
+        )
+        table = MultiIndexHash(max_distance)
+        parent = {}
+        sellers = {}
+        changed = []
+        flagged = 0
+
+        def root(pk):
+            while parent[pk] != pk:
+                parent[pk] = parent[parent[pk]]
+                pk = parent[pk]
+            return pk
+
+        for pk, stored, duplicate_of, seller_id in rows.iterator(chunk_size=2000):
+            value = computed.get(pk, to_unsigned(stored) if stored is not None else None)
+            if value is None:
+                continue
+            parent[pk] = pk
+            sellers[pk] = seller_id
+            # Only older listings are in the table yet, so matches are candidates for the original.
+            matches = sorted(table.search(value, max_distance))
+            original = matches[0][1] if matches else None
+            for _, other in matches:
+                parent[root(pk)] = root(other)
+            table.add(value, pk)
+            if original is not None:
+                flagged += 1
+            if original != duplicate_of:
+                changed.append(Product(pk=pk, duplicate_of_id=original))
+
+        clusters = {}
+        for pk in parent:
+            clusters.setdefault(root(pk), []).append(pk)
+        clusters = sorted((members for members in clusters.values() if len(members) > 1), key=len, reverse=True)
+
+        if not dry_run:
+            Product.objects.bulk_update(changed, ['duplicate_of'], batch_size=batch_size)
+            duplicate_index.clear()
+
+        elapsed = time.perf_counter() - started
+        listed = sum(len(members) for members in clusters)
+        self.stdout.write(
+            f'Found {len(clusters)} clusters covering {listed} listings; {flagged} flagged as duplicates '
+            f'({len(changed)} changed) in {elapsed:.2f}s'
+        )
+        for members in clusters:
+            cross = len({sellers[pk] for pk in members}) > 1
+            self.stdout.write(
+                f'  {", ".join(str(pk) for pk in sorted(members))}'
+                f'{" (several sellers)" if cross else ""}'
+            )
+
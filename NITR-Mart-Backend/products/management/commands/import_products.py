@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from nitrmart.dataio import FORMATS, Rate, batched, detect_format, format_errors, open_text, read_rows
+from products import cache as product_cache
+from products import events
+from products.duplicates import duplicate_index
+from products.images import enqueue_image_job
+from products.models import Product
+from products.search import search_index
+from products.serializers import ProductImportSerializer
+from products.suggest import suggestion_index
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Create products from a CSV or JSON Lines file ("-" for stdin), validated like '
+            'new listings and inserted in batches. Sellers are matched by email. Invalid rows '
+            'are reported and skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for stdin.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='csv or jsonl (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows validated and inserted per batch (default 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without inserting anything.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        format = detect_format(options['path'], options['format'])
+        rate = Rate()
+        created = skipped = 0
+        with open_text(options['path'], 'r') as f:
+            for batch in batched(read_rows(f, format), options['batch_size']):
+                products, errors = self.validate_batch(batch)
+                for line, message in errors:
+                    self.stderr.write(f'line {line}: {message}')
+                skipped += len(errors)
+                if products and not options['dry_run']:
+                    self.insert(products)
+                created += len(products)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{created} products so far ({rate.summary(created + skipped)})')
+
+        verb = 'would be created' if options['dry_run'] else 'created'
+        self.stdout.write(f'{created} products {verb}, {skipped} rows skipped; {rate.summary(created + skipped)}')
+
+    def validate_batch(self, batch):
+        """Unsaved products for the valid rows of a batch, and (line, message) for the rest"""
+        valid = []
+        errors = []
+        for line, row in batch:
+            if isinstance(row, Exception):
+                errors.append((line, str(row)))
+                continue
+            serializer = ProductImportSerializer(data=row)
+            if not serializer.is_valid():
+                errors.append((line, format_errors(serializer.errors)))
+                continue
+            valid.append((line, serializer.validated_data))
+
+        emails = {data['seller'] for _, data in valid}
+        sellers = dict(User.objects.filter(email__in=emails).values_list('email', 'pk'))
+        products = []
+        for line, data in valid:
+            seller_id = sellers.get(data['seller'])
+            if seller_id is None:
+                errors.append((line, f"seller: no user with email {data['seller']}."))
+                continue
+            fields = {key: value for key, value in data.items() if key != 'seller'}
+            products.append(Product(seller_id=seller_id, **fields))
+        return products, errors
+
+    def insert(self, products):
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            # bulk_create sends no post_save, so queue image processing here.
+            for product in products:
+                if product.image:
+                    enqueue_image_job(product)
+        product_cache.bump(
+            product_cache.ALL_SCOPE,
+            *{product_cache.category_scope(product.category) for product in products}
+        )
+        events.publish(events.describe(product, events.CREATED) for product in products)
+        for product in products:
+            search_index.update(product)
+            suggestion_index.update(product)
+            duplicate_index.update(product)
@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Render resized, metadata-free variants of newly uploaded product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes that decode and encode images (default: one per core; 0 renders inline).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Jobs claimed per batch (default: twice the workers).')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty (default 5).')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the currently due jobs and exit.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size'] or max(2 * workers, 1)
+        executor = None
+        if workers > 0:
+            # Pool processes only decode and encode; they never touch the database.
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers)
+        try:
+            while True:
+                started = time.perf_counter()
+                done, failed = process_queue(batch_size, executor)
+                if done or failed:
+                    self.stdout.write(
+                        f'Processed {done}, failed {failed} in {time.perf_counter() - started:.2f}s'
+                    )
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
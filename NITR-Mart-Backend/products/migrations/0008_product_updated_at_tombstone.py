@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:47
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(updated_at=F('posted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_title_trigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('category', models.CharField(choices=[('Electronics', 'Electronics'), ('Books & Study Materials', 'Books & Study Materials'), ('Hostel Essentials', 'Hostel Essentials'), ('Furniture', 'Furniture'), ('Sports & Fitness', 'Sports & Fitness'), ('Cycle & Transport', 'Cycle & Transport'), ('Room Decor', 'Room Decor'), ('Lab Equipment', 'Lab Equipment'), ('Others', 'Others')], max_length=50)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 
 CATEGORIES = [
@@ -14,6 +16,21 @@ CATEGORIES = [
     ('Others', 'Others')
 ]
 
+SELLER_FIELDS = ('email', 'first_name', 'last_name', 'roll_no', 'wp_number')
+UNLOADED_FIELDS = ('search_vector',)
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_seller(self):
+        """Join the seller in the same query, loading only the columns the serializers read"""
+        product_fields = [
+            field.attname for field in self.model._meta.concrete_fields
+            if field.attname not in UNLOADED_FIELDS
+        ]
+        seller_fields = [f'seller__{name}' for name in SELLER_FIELDS]
+        return self.select_related('seller').only(*product_fields, *seller_fields)
+
+
 class Product(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
@@ -24,9 +41,92 @@ class Product(models.Model):
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products')
     is_sold = models.BooleanField(default=False)
     posted_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0006),
+    # together with its GIN index. Left empty on other databases.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Resized, metadata-free renditions of ``image`` written by the image
+    # worker (see products/images.py). Empty until the first run finishes.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # 64-bit dHash of the image (products/duplicates.py), stored signed.
+    image_hash = models.BigIntegerField(null=True, blank=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='duplicates'
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-posted_at']
+        indexes = [
+            models.Index(fields=['is_sold', '-posted_at', '-id'], name='product_feed_idx'),
+            models.Index(fields=['is_sold', 'category', '-posted_at', '-id'], name='product_category_feed_idx'),
+            models.Index(fields=['is_sold', 'price', 'id'], name='product_price_idx'),
+            models.Index(fields=['is_sold', 'category', 'price', 'id'], name='product_category_price_idx'),
+            # Day-by-day rebuilds of the reports rollups.
+            models.Index(fields=['posted_at'], name='product_posted_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so a save that moves the product can
+        # invalidate the category it left as well as the one it joined.
+        instance._loaded_category = instance.__dict__.get('category')
+        # And whether it was already sold, so only the sale itself is an event.
+        instance._loaded_is_sold = instance.__dict__.get('is_sold')
+        # The reports rollups count a listing under these too.
+        instance._loaded_price = instance.__dict__.get('price')
+        instance._loaded_seller_id = instance.__dict__.get('seller_id')
+        # Likewise the stored image, so only a new image queues processing.
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.__dict__['image']
+        return instance
+
+    def __str__(self):
+        return self.title
+
+
+class ProductTombstone(models.Model):
+    """Records a deleted product so the changes feed can tell clients to drop it"""
+    product_id = models.BigIntegerField()
+    category = models.CharField(max_length=50, choices=CATEGORIES)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted at {self.deleted_at}"
+
+
+class ProductImageJob(models.Model):
+    """Pending or finished variant rendering for a product's current image"""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='image_job')
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='image_job_due_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"Image job for product {self.product_id} ({self.status})"
@@ -0,0 +1,138 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite ordering such as ('-posted_at', '-id').
+
+    The cursor holds the ordering values of the last row on the page, so the
+    next page is a single index range scan no matter how deep the client is,
+    and rows posted after the first page was fetched never shift later pages.
+    The last ordering field must be unique (normally 'id').
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-posted_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        get_keyset_ordering = getattr(view, 'get_keyset_ordering', None)
+        if get_keyset_ordering is not None:
+            return tuple(get_keyset_ordering())
+        return tuple(self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _field_value(self, obj, name):
+        return obj._meta.get_field(name).value_to_string(obj)
+
+    def _keyset_filter(self, queryset, values):
+        """
+        Build the lexicographic "after this row" condition, e.g. for
+        ('-posted_at', '-id'): posted_at < p OR (posted_at = p AND id < i).
+        """
+        model = queryset.model
+        parsed = []
+        for name, value in zip(self.fields, values):
+            try:
+                parsed.append(model._meta.get_field(name).to_python(value))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        for index, (name, descending) in enumerate(zip(self.fields, self.descending)):
+            lookup = Q(**{f'{name}__lt' if descending else f'{name}__gt': parsed[index]})
+            for prev_name, prev_value in zip(self.fields[:index], parsed[:index]):
+                lookup &= Q(**{prev_name: prev_value})
+            condition |= lookup
+        return queryset.filter(condition)
+
+    def _window(self, queryset, request, view):
+        """The queryset of this page plus one row, which tells whether there is a next page"""
+        self.request = request
+        ordering = self.get_ordering(request, queryset, view)
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = [field.startswith('-') for field in ordering]
+        self.limit = self.get_page_size(request)
+
+        queryset = queryset.order_by(*ordering)
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = self._keyset_filter(queryset, values)
+        return queryset[:self.limit + 1]
+
+    def _take(self, rows):
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._take(list(self._window(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, reading the page with the async ORM"""
+        return self._take([row async for row in self._window(queryset, request, view)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = self.encode_cursor([self._field_value(last, name) for name in self.fields])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductCursorPagination(KeysetPagination):
+    page_size = 20
+    max_page_size = 100
+    ordering = ('-posted_at', '-id')
@@ -0,0 +1,163 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+
+SEARCH_CONFIG = 'english'
+
+# Mirrors the 'A' (title) and 'B' (description) weights ts_rank uses by default.
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+FALLBACK_BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'this', 'to', 'with',
+})
+
+
+def tokenize(text):
+    """Lowercase, split on non-alphanumerics, drop stop words and plural 's'"""
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over unsold product titles and descriptions.
+
+    Used when the database has no full-text support (SQLite in local
+    development and tests). It is loaded lazily from the database on the
+    first query and then kept current by the product signals, so it only
+    sees writes made by this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._loaded = False
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import Product
+
+        rows = Product.objects.filter(is_sold=False).values_list('pk', 'title', 'description')
+        with self._lock:
+            if self._loaded:
+                return
+            for pk, title, description in rows.iterator(chunk_size=2000):
+                self._add(pk, title, description)
+            self._loaded = True
+
+    def _add(self, pk, title, description):
+        self._remove(pk)
+        weights = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            self._postings[token][pk] = weight
+        self._documents[pk] = tuple(weights)
+
+    def _remove(self, pk):
+        for token in self._documents.pop(pk, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(pk, None)
+                if not posting:
+                    del self._postings[token]
+
+    def update(self, product):
+        """Reflect a saved product; sold products leave the index"""
+        if not self._loaded:
+            return
+        with self._lock:
+            if product.is_sold:
+                self._remove(product.pk)
+            else:
+                self._add(product.pk, product.title, product.description)
+
+    def remove(self, pk):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(pk)
+
+    def search(self, query):
+        """Return product ids containing every query term, best match first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            total = len(self._documents)
+            idf = [math.log(1 + total / len(posting)) for posting in postings]
+            scores = {
+                pk: sum(posting[pk] * weight for posting, weight in zip(postings, idf))
+                for pk in candidates
+            }
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+search_index = InvertedIndex()
+
+
+def uses_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def make_search_query(query):
+    """Parse user input the way web search boxes do (quotes, OR, -term)"""
+    return SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search_products(queryset, query, limit):
+    """
+    Return up to ``limit`` products from ``queryset`` that match ``query``,
+    ranked title matches first.
+    """
+    if uses_postgres(queryset):
+        search_query = make_search_query(query)
+        return list(
+            queryset.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-posted_at', '-id')[:limit]
+        )
+
+    ranked_ids = search_index.search(query)
+    matches = []
+    # Walk the ranking in batches so extra filters on the queryset (category,
+    # stale ids) never need one huge IN clause.
+    for start in range(0, len(ranked_ids), FALLBACK_BATCH_SIZE):
+        batch = ranked_ids[start:start + FALLBACK_BATCH_SIZE]
+        found = queryset.in_bulk(batch)
+        matches.extend(found[pk] for pk in batch if pk in found)
+        if len(matches) >= limit:
+            break
+    return matches[:limit]
@@ -1,21 +1,60 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from . import bulk
+from .images import describe_variants
 from .models import Product, CATEGORIES
+from .sync import decode_token
+from .uploads import ALLOWED_FORMATS, get_upload_backend
 
 User = get_user_model()
 
+SORT_ORDERINGS = {
+    'newest': ('-posted_at', '-id'),
+    'oldest': ('posted_at', 'id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+}
+
+def absolute_url(url, context):
+    request = context.get('request')
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ProductImageField(serializers.ImageField):
+    """Image upload field whose URL comes from the configured upload backend"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return absolute_url(get_upload_backend().get_url(value), self.context)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     seller = serializers.SerializerMethodField()
-    image = serializers.ImageField(required=False, allow_null=True)
+    image = ProductImageField(required=False, allow_null=True)
+    image_variants = serializers.SerializerMethodField()
     category = serializers.ChoiceField(choices=CATEGORIES)
 
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'description', 'price', 'negotiable', 'image',
-            'category', 'seller', 'is_sold', 'posted_at'
+            'id', 'title', 'description', 'price', 'negotiable', 'image', 'image_variants',
+            'category', 'seller', 'is_sold', 'posted_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'seller', 'posted_at', 'is_sold']
+        read_only_fields = ['id', 'seller', 'posted_at', 'updated_at', 'is_sold']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Once processed, ``image`` is the largest stripped JPEG, never the original upload.
+        if data['image_variants'] and data['image_variants']['src']:
+            data['image'] = data['image_variants']['src']
+        return data
+
+    def get_image_variants(self, obj):
+        return describe_variants(obj, lambda url: absolute_url(url, self.context))
 
     def get_seller(self, obj):
         return {
@@ -31,13 +70,13 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
 
 class ProductCreateSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(required=False, allow_null=True)
+    image = ProductImageField(required=False, allow_null=True)
     category = serializers.ChoiceField(choices=CATEGORIES)
 
     class Meta:
         model = Product
         fields = [
-            'title', 'description', 'price', 'negotiable', 'image',
+            'id', 'title', 'description', 'price', 'negotiable', 'image',
             'category'
         ]
 
@@ -50,8 +89,27 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         validated_data['seller'] = self.context['request'].user
         return Product.objects.create(**validated_data)
 
+class ProductImportSerializer(ProductCreateSerializer):
+    """
+    One row of ``import_products``: the create rules plus the seller's email,
+    the sold flag and an image already in storage, given as the stored value
+    ``export_products`` writes.
+    """
+    image = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    seller = serializers.EmailField()
+    is_sold = serializers.BooleanField(default=False)
+
+    class Meta(ProductCreateSerializer.Meta):
+        fields = [
+            'title', 'description', 'price', 'negotiable', 'image',
+            'category', 'is_sold', 'seller'
+        ]
+
+    def validate_seller(self, value):
+        return value.lower()
+
 class ProductUpdateSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(required=False, allow_null=True)
+    image = ProductImageField(required=False, allow_null=True)
     category = serializers.ChoiceField(choices=CATEGORIES, required=False)
 
     class Meta:
@@ -65,4 +123,85 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
     def validate_price(self, value):
         if value < 0:
             raise serializers.ValidationError('Price cannot be negative.')
-        return value
\ No newline at end of file
+        return value
+
+class ProductImageSerializer(serializers.Serializer):
+    """The storage service's answer to a direct upload, checked before it is attached"""
+    public_id = serializers.CharField(max_length=255)
+    version = serializers.IntegerField(min_value=1)
+    format = serializers.ChoiceField(choices=ALLOWED_FORMATS)
+    signature = serializers.CharField(max_length=128)
+
+    def validate(self, data):
+        backend = get_upload_backend()
+        if not backend.is_owned_by(data['public_id'], self.context['request'].user):
+            raise serializers.ValidationError({'public_id': 'This upload was not issued to you.'})
+        if not backend.verify_result(data['public_id'], data['version'], data['signature']):
+            raise serializers.ValidationError({'signature': 'Upload signature does not match.'})
+        return data
+
+class ProductPriceSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+class ProductBulkSerializer(serializers.Serializer):
+    """A bulk action: ``ids`` for mark_sold and delete, ``items`` with prices for reprice"""
+    action = serializers.ChoiceField(choices=bulk.ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    items = ProductPriceSerializer(many=True, required=False, allow_empty=False)
+
+    def validate(self, data):
+        if data['action'] == bulk.REPRICE:
+            if 'items' not in data:
+                raise serializers.ValidationError({'items': 'Give an id and price for each product to re-price.'})
+            data['prices'] = {item['id']: item['price'] for item in data['items']}
+            data['ids'] = list(data['prices'])
+        elif 'ids' not in data:
+            raise serializers.ValidationError({'ids': 'Give the ids of the products to change.'})
+        limit = getattr(settings, 'PRODUCT_BULK_MAX_ITEMS', 200)
+        if len(set(data['ids'])) > limit:
+            raise serializers.ValidationError({'ids': f'At most {limit} products per request.'})
+        return data
+
+class ProductFilterSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by the product list"""
+    category = serializers.ChoiceField(choices=CATEGORIES, required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    negotiable = serializers.BooleanField(required=False, allow_null=True, default=None)
+    seller = serializers.IntegerField(min_value=1, required=False)
+    sort = serializers.ChoiceField(choices=list(SORT_ORDERINGS), default='newest')
+
+    def validate(self, data):
+        min_price = data.get('min_price')
+        max_price = data.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({
+                'min_price': 'min_price cannot be greater than max_price.'
+            })
+        return data
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by product search"""
+    q = serializers.CharField(max_length=200, trim_whitespace=True)
+    category = serializers.ChoiceField(choices=CATEGORIES, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class ProductSuggestSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by search suggestions"""
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=8)
+
+
+class ProductChangesSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by the changes feed"""
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=200)
+
+    def validate_since(self, value):
+        try:
+            return decode_token(value)
+        except (ValueError, OverflowError):
+            raise serializers.ValidationError('Invalid sync token.')
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import events
+from .cache import invalidate_product, invalidate_sellers
+from .duplicates import duplicate_index
+from .images import enqueue_image_job, image_key
+from .models import Product, ProductTombstone
+from .search import search_index
+from .suggest import suggestion_index
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search_index.update(instance)
+    suggestion_index.update(instance)
+    duplicate_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search_index.remove(instance.pk)
+    suggestion_index.remove(instance.pk)
+    duplicate_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_saved_product(sender, instance, **kwargs):
+    invalidate_product(instance.pk, instance.category, getattr(instance, '_loaded_category', None))
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product(sender, instance, **kwargs):
+    invalidate_product(instance.pk, instance.category)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_seller_details(sender, instance, created, **kwargs):
+    # A new user has no listings yet; an edited one may appear in any payload.
+    if not created:
+        invalidate_sellers()
+
+
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    ProductTombstone.objects.create(product_id=instance.pk, category=instance.category)
+
+
+@receiver(post_save, sender=Product)
+def queue_image_processing(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if 'image' not in instance.__dict__:
+        # Deferred and therefore not part of this save.
+        return
+    if not created and hasattr(instance, '_loaded_image'):
+        if image_key(instance.image) == image_key(instance._loaded_image):
+            return
+    elif not instance.image:
+        return
+    enqueue_image_job(instance)
+    instance._loaded_image = instance.image
+
+
+@receiver(post_save, sender=Product)
+def publish_saved_product(sender, instance, created, **kwargs):
+    if created:
+        event = events.CREATED
+    elif instance.is_sold and not getattr(instance, '_loaded_is_sold', False):
+        event = events.SOLD
+    else:
+        # Includes edits to a product that was already sold.
+        event = events.UPDATED
+    events.publish([events.describe(instance, event, getattr(instance, '_loaded_category', None))])
+    instance._loaded_is_sold = instance.is_sold
+
+
+@receiver(post_delete, sender=Product)
+def publish_deleted_product(sender, instance, **kwargs):
+    events.publish([events.describe(instance, events.DELETED)])
@@ -0,0 +1,263 @@
+import heapq
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+
+from .search import uses_postgres
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# pg_trgm's default similarity_threshold, used by the Python fallback.
+SIMILARITY_THRESHOLD = 0.3
+HOT_PREFIX_CACHE_SIZE = 2048
+
+
+def get_rebuild_seconds():
+    return getattr(settings, 'PRODUCT_SUGGEST_REBUILD_SECONDS', 300)
+
+
+def words(text):
+    return WORD_RE.findall((text or '').lower())
+
+
+def trigrams(word):
+    """Trigrams of a single word, padded the way pg_trgm pads them"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Node:
+    __slots__ = ('children', 'keys')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
+
+
+class SuggestionIndex:
+    """
+    Prefix trie over the words of unsold product titles.
+
+    Each suggestion is a distinct (title, category) pair ranked by how many
+    unsold listings share it. Every trie node keeps the set of suggestions
+    with a word starting at that prefix, so a keystroke costs one walk down
+    the trie plus a top-N pick. Results for recent prefixes are memoised
+    until the next listing change. A word-level trigram map gives
+    typo-tolerant matches when no database trigram index is available.
+
+    Loaded lazily on first use and kept current by the product signals.
+    Signals only fire in the process that saved the product, so the trie is
+    also rebuilt from the database every PRODUCT_SUGGEST_REBUILD_SECONDS to
+    pick up other workers' writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._root = _Node()
+        self._products = {}
+        self._counts = defaultdict(int)
+        self._display = {}
+        self._word_keys = defaultdict(set)
+        self._trigram_words = defaultdict(set)
+        self._hot = OrderedDict()
+        self._loaded = False
+        self._expires = None
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _is_current(self):
+        return self._loaded and (self._expires is None or time.monotonic() < self._expires)
+
+    def _ensure_loaded(self):
+        if self._is_current():
+            return
+        from .models import Product
+
+        rows = Product.objects.filter(is_sold=False).values_list('pk', 'title', 'category')
+        with self._lock:
+            if self._is_current():
+                return
+            self._reset()
+            for pk, title, category in rows.iterator(chunk_size=2000):
+                self._add(pk, title, category)
+            self._loaded = True
+            rebuild_seconds = get_rebuild_seconds()
+            if rebuild_seconds > 0:
+                self._expires = time.monotonic() + rebuild_seconds
+
+    def _add(self, pk, title, category):
+        key = (' '.join(words(title)), category)
+        if not key[0]:
+            return
+        if self._products.get(pk) == key:
+            return
+        self._remove(pk)
+        self._products[pk] = key
+        self._counts[key] += 1
+        if self._counts[key] > 1:
+            return
+        self._display[key] = title.strip()
+        for word in set(key[0].split()):
+            if not self._word_keys[word]:
+                for trigram in trigrams(word):
+                    self._trigram_words[trigram].add(word)
+            self._word_keys[word].add(key)
+            node = self._root
+            for char in word:
+                node = node.children.setdefault(char, _Node())
+                node.keys.add(key)
+
+    def _remove(self, pk):
+        key = self._products.pop(pk, None)
+        if key is None:
+            return
+        self._counts[key] -= 1
+        if self._counts[key] > 0:
+            return
+        del self._counts[key]
+        del self._display[key]
+        title_words = set(key[0].split())
+        for word in title_words:
+            self._word_keys[word].discard(key)
+            if not self._word_keys[word]:
+                del self._word_keys[word]
+                for trigram in trigrams(word):
+                    self._trigram_words[trigram].discard(word)
+            for node in self._path(word)[1:]:
+                node.keys.discard(key)
+        # Prune only once the key is gone from every word: one word can be a
+        # prefix of another ("pen", "pencil"), so an earlier prune may
+        # already have dropped part of a later word's path.
+        for word in title_words:
+            path = self._path(word)
+            for depth in range(len(path) - 1, 0, -1):
+                if path[depth].keys:
+                    break
+                del path[depth - 1].children[word[depth - 1]]
+
+    def _path(self, word):
+        """Nodes from the root along ``word``, stopping where the trie ends"""
+        path = [self._root]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                break
+            path.append(node)
+        return path
+
+    def update(self, product):
+        if not self._loaded:
+            return
+        with self._lock:
+            if product.is_sold:
+                self._remove(product.pk)
+            else:
+                self._add(product.pk, product.title, product.category)
+            self._hot.clear()
+
+    def remove(self, pk):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(pk)
+            self._hot.clear()
+
+    def _prefix_keys(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.keys
+
+    def _rank(self, keys, limit):
+        best = heapq.nsmallest(limit, keys, key=lambda key: (-self._counts[key], key))
+        return [{'title': self._display[key], 'category': key[1]} for key in best]
+
+    def complete(self, query, limit):
+        """Suggestions whose title has a word starting with each query word"""
+        terms = words(query)
+        if not terms:
+            return []
+        self._ensure_loaded()
+        cache_key = (' '.join(terms), limit)
+        with self._lock:
+            cached = self._hot.get(cache_key)
+            if cached is not None:
+                self._hot.move_to_end(cache_key)
+                return list(cached)
+            matches = sorted((self._prefix_keys(term) for term in terms), key=len)
+            keys = matches[0].intersection(*matches[1:]) if matches[0] else set()
+            results = self._rank(keys, limit)
+            self._hot[cache_key] = results
+            if len(self._hot) > HOT_PREFIX_CACHE_SIZE:
+                self._hot.popitem(last=False)
+        return list(results)
+
+    def fuzzy(self, query, limit):
+        """Suggestions with a word similar to the last query word (trigram similarity)"""
+        terms = words(query)
+        if not terms:
+            return []
+        self._ensure_loaded()
+        target = trigrams(terms[-1])
+        with self._lock:
+            candidates = set()
+            for trigram in target:
+                candidates.update(self._trigram_words.get(trigram, ()))
+            similarity = {}
+            for word in candidates:
+                word_trigrams = trigrams(word)
+                score = len(target & word_trigrams) / len(target | word_trigrams)
+                if score < SIMILARITY_THRESHOLD:
+                    continue
+                for key in self._word_keys[word]:
+                    similarity[key] = max(score, similarity.get(key, 0))
+            best = heapq.nsmallest(
+                limit, similarity,
+                key=lambda key: (-similarity[key], -self._counts[key], key)
+            )
+            return [{'title': self._display[key], 'category': key[1]} for key in best]
+
+
+suggestion_index = SuggestionIndex()
+
+
+def suggest_products(queryset, query, limit):
+    """
+    Autocomplete ``query`` to at most ``limit`` (title, category) suggestions.
+    Prefix matches come from the in-process trie; only when there are none
+    does it fall back to typo-tolerant trigram matches.
+    """
+    results = suggestion_index.complete(query, limit)
+    if results:
+        return results
+
+    if not uses_postgres(queryset):
+        return suggestion_index.fuzzy(query, limit)
+
+    results = []
+    seen = set()
+    rows = (
+        queryset.filter(title__trigram_word_similar=query)
+        .annotate(similarity=TrigramWordSimilarity(query, 'title'))
+        .order_by('-similarity', '-posted_at')
+        .values_list('title', 'category')[:limit * 3]
+    )
+    for title, category in rows:
+        key = (' '.join(words(title)), category)
+        if key not in seen:
+            seen.add(key)
+            results.append({'title': title, 'category': category})
+        if len(results) >= limit:
+            break
+    return results
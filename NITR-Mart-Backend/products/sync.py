@@ -0,0 +1,111 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Product, ProductTombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Sync token is older than the change history. Reload the full product list.'
+    default_code = 'sync_token_expired'
+
+
+# Where a client is in the feed: everything saved or deleted before
+# ``moment`` is sent, plus the products and tombstones stamped exactly at
+# ``moment`` up to these ids. Bulk writes stamp many rows with the same
+# time, so a page can end in the middle of them.
+Position = namedtuple('Position', ['moment', 'product_id', 'tombstone_id'])
+
+
+def encode_token(moment, product_id=0, tombstone_id=0):
+    microseconds = str((moment - EPOCH) // timedelta(microseconds=1))
+    if not (product_id or tombstone_id):
+        return microseconds
+    return f'{microseconds}.{product_id}.{tombstone_id}'
+
+
+def decode_token(token):
+    """Parse a sync token into a Position; raises ValueError for anything we did not issue"""
+    parts = [int(part) for part in token.split('.')]
+    if len(parts) == 1:
+        parts += [0, 0]
+    if len(parts) != 3 or min(parts) < 0:
+        raise ValueError('malformed sync token')
+    return Position(EPOCH + timedelta(microseconds=parts[0]), parts[1], parts[2])
+
+
+def get_overlap():
+    return timedelta(seconds=getattr(settings, 'PRODUCT_SYNC_OVERLAP_SECONDS', 5))
+
+
+def get_retention():
+    return timedelta(days=getattr(settings, 'PRODUCT_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def starting_token():
+    return encode_token(timezone.now() - get_overlap())
+
+
+def collect_changes(since, limit):
+    """
+    Products saved and deleted after the Position ``since``, oldest first,
+    at most ``limit`` of each. Returns (changed products, deleted ids, next
+    token, has_more).
+
+    A write may commit a little after the time stamped on its row, so when
+    the client is caught up the next token trails the current time by the
+    overlap window. Rows from that window are sent again on the next poll,
+    which is harmless because clients apply changes by id.
+    """
+    if since.moment < timezone.now() - get_retention():
+        raise SyncTokenExpired()
+
+    now = timezone.now()
+    changed = list(
+        Product.objects.with_seller()
+        .filter(Q(updated_at__gt=since.moment) | Q(updated_at=since.moment, id__gt=since.product_id))
+        .order_by('updated_at', 'id')[:limit + 1]
+    )
+    deleted = list(
+        ProductTombstone.objects
+        .filter(Q(deleted_at__gt=since.moment) | Q(deleted_at=since.moment, id__gt=since.tombstone_id))
+        .order_by('deleted_at', 'id')
+        .values_list('product_id', 'deleted_at', 'id')[:limit + 1]
+    )
+
+    has_more = len(changed) > limit or len(deleted) > limit
+    if has_more:
+        # Cut both streams at the earliest page boundary so the next request
+        # resumes without skipping anything from the shorter stream. Rows
+        # stamped at the cut itself are resumed by id.
+        boundaries = []
+        if len(changed) > limit:
+            boundaries.append(changed[limit - 1].updated_at)
+        if len(deleted) > limit:
+            boundaries.append(deleted[limit - 1][1])
+        cut = min(boundaries)
+        changed = [product for product in changed[:limit] if product.updated_at <= cut]
+        deleted = [row for row in deleted[:limit] if row[1] <= cut]
+        same_moment = cut == since.moment
+        product_id = since.product_id if same_moment else 0
+        if changed and changed[-1].updated_at == cut:
+            product_id = changed[-1].pk
+        tombstone_id = since.tombstone_id if same_moment else 0
+        if deleted and deleted[-1][1] == cut:
+            tombstone_id = deleted[-1][2]
+        next_token = encode_token(cut, product_id, tombstone_id)
+    elif since.moment >= now - get_overlap():
+        next_token = encode_token(*since)
+    else:
+        next_token = encode_token(now - get_overlap())
+
+    deleted_ids = [product_id for product_id, _, _ in deleted]
+    return changed, deleted_ids, next_token, has_more
@@ -1,3 +1,1245 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from nitrmart.asgi import application
+from .cache import ALL_SCOPE, get_cache, get_generations
+from .duplicates import MultiIndexHash, duplicate_index, hamming
+from .images import claim_due_jobs, process_jobs, process_queue, render_variants
+from .models import Product, ProductImageJob, ProductTombstone
+from .pagination import ProductCursorPagination
+from .search import search_index
+from .serializers import ProductSerializer
+from .suggest import suggestion_index
+from .views import (
+    AsyncProductListCreateView,
+    AsyncProductRetrieveUpdateView,
+    ProductListCreateView,
+    ProductRetrieveUpdateView,
+)
+
+User = get_user_model()
+
+
+def make_user(index=0, **extra):
+    fields = {
+        'first_name': 'Test',
+        'last_name': f'User{index}',
+        'year': '3rd',
+        'branch': 'CSE',
+        'roll_no': f'12{index:07d}',
+        'wp_number': f'9{index:09d}',
+    }
+    fields.update(extra)
+    return User.objects.create_user(f'user{index}@nitrkl.ac.in', 'securepassword123', **fields)
+
+
+def make_products(seller, count, **extra):
+    products = Product.objects.bulk_create([
+        Product(
+            title=f'Item {i}',
+            description=f'Description {i}',
+            price=100 + i,
+            seller=seller,
+            **extra
+        )
+        for i in range(count)
+    ])
+    # bulk_create sends no signals, so nothing invalidates cached pages.
+    get_cache().clear()
+    return products
+
+
+class ProductTestCase(TestCase):
+    """Resets the state that outlives a test's database transaction"""
+
+    def setUp(self):
+        get_cache().clear()
+        search_index.clear()
+        suggestion_index.clear()
+        duplicate_index.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        search_index.clear()
+        suggestion_index.clear()
+        duplicate_index.clear()
+
+
+class ProductPaginationTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user()
+        self.url = reverse('products:product-list-create')
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_walks_every_unsold_product_once_in_feed_order(self):
+        make_products(self.seller, 25)
+        make_products(self.seller, 3, is_sold=True)
+        # Identical timestamps must still be split correctly by id.
+        Product.objects.update(posted_at=timezone.now())
+
+        ids = self.collect(f'{self.url}?page_size=7')
+
+        expected = list(
+            Product.objects.filter(is_sold=False)
+            .order_by('-posted_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_is_stable_when_new_products_are_posted(self):
+        make_products(self.seller, 10)
+        for offset, product in enumerate(Product.objects.order_by('id')):
+            product.posted_at = timezone.now() - timedelta(minutes=100 - offset)
+            product.save(update_fields=['posted_at'])
+
+        first = self.client.get(f'{self.url}?page_size=5')
+        make_products(self.seller, 3)
+        second = self.client.get(first.data['next'])
+
+        seen = [item['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+        self.assertIsNone(second.data['next'])
+
+    def test_page_size_is_capped(self):
+        make_products(self.seller, 5)
+        with mock.patch.object(ProductCursorPagination, 'max_page_size', 3):
+            response = self.client.get(f'{self.url}?page_size=100000')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_rejects_garbage_cursor(self):
+        response = self.client.get(f'{self.url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductFilterTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.other = make_user(1)
+        self.url = reverse('products:product-list-create')
+        Product.objects.bulk_create([
+            Product(title='Laptop', description='x', price=500, category='Electronics',
+                    negotiable=True, seller=self.seller),
+            Product(title='Phone', description='x', price=300, category='Electronics',
+                    seller=self.other),
+            Product(title='Chair', description='x', price=50, category='Furniture',
+                    seller=self.seller),
+            Product(title='Old Phone', description='x', price=100, category='Electronics',
+                    seller=self.seller, is_sold=True),
+        ])
+
+    def titles(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data['results']]
+
+    def test_filters_combine(self):
+        self.assertCountEqual(self.titles('category=Electronics'), ['Laptop', 'Phone'])
+        self.assertCountEqual(self.titles('min_price=100&max_price=400'), ['Phone'])
+        self.assertCountEqual(self.titles('negotiable=true'), ['Laptop'])
+        self.assertCountEqual(self.titles('negotiable=false'), ['Phone', 'Chair'])
+        self.assertCountEqual(
+            self.titles(f'seller={self.seller.pk}&category=Electronics'), ['Laptop']
+        )
+
+    def test_sort_by_price_paginates(self):
+        response = self.client.get(f'{self.url}?sort=price_desc&page_size=2')
+        titles = [item['title'] for item in response.data['results']]
+        response = self.client.get(response.data['next'])
+        titles += [item['title'] for item in response.data['results']]
+        self.assertEqual(titles, ['Laptop', 'Phone', 'Chair'])
+        self.assertEqual(self.titles('sort=price_asc'), ['Chair', 'Phone', 'Laptop'])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(f'{self.url}?category=Cars').status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?min_price=10&max_price=5').status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?sort=random').status_code, 400)
+
+
+class ProductSellerQueryTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sellers = [make_user(i) for i in range(5)]
+        self.url = reverse('products:product-list-create')
+
+    def populate(self, count):
+        Product.objects.bulk_create([
+            Product(title=f'Item {i}', description='x', price=i, seller=self.sellers[i % 5])
+            for i in range(count)
+        ])
+        get_cache().clear()
+
+    def test_serializing_with_seller_is_constant(self):
+        for count in (1, 100, 1000):
+            Product.objects.all().delete()
+            self.populate(count)
+            with self.subTest(count=count), self.assertNumQueries(1):
+                data = ProductSerializer(Product.objects.with_seller(), many=True).data
+                self.assertEqual(len(data), count)
+                self.assertTrue(all(item['seller']['email'] for item in data))
+
+    def test_list_page_is_constant(self):
+        for count in (1, 100, 1000):
+            Product.objects.all().delete()
+            self.populate(count)
+            with self.subTest(count=count), self.assertNumQueries(1):
+                response = self.client.get(f'{self.url}?page_size=100')
+                self.assertEqual(len(response.data['results']), min(count, 100))
+
+    def test_update_response_loads_seller_once(self):
+        self.populate(1)
+        product = Product.objects.get()
+        self.client.force_authenticate(self.sellers[0])
+        url = reverse('products:product-retrieve-update', args=[product.pk])
+        # Fetch the product with its seller, then save it. The new price
+        # also moves the reports rollups: the seller's group and the day's
+        # row (none yet, so nothing to update).
+        with self.assertNumQueries(4):
+            response = self.client.patch(url, {'price': 10}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['seller']['email'], self.sellers[0].email)
+
+        # Nothing the rollups count changed.
+        with self.assertNumQueries(2):
+            self.client.patch(url, {'description': 'Barely used'}, format='json')
+
+
+class ProductSearchTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user()
+        self.url = reverse('products:product-search')
+
+    def create(self, title, description='', **extra):
+        return Product.objects.create(
+            title=title, description=description, price=10, seller=self.seller, **extra
+        )
+
+    def titles(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data['results']]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.create('Study table', 'Wooden, has a drawer for a calculator')
+        self.create('Scientific calculator', 'Casio fx-991')
+        self.create('Cycle', 'Hero cycle with lock')
+
+        self.assertEqual(self.titles('calculator'), ['Scientific calculator', 'Study table'])
+        self.assertEqual(self.titles('casio calculator'), ['Scientific calculator'])
+        self.assertEqual(self.titles('laptop'), [])
+
+    def test_index_follows_edits_sales_and_deletes(self):
+        self.assertEqual(self.titles('cycle'), [])
+        cycle = self.create('Cycle', 'Hero cycle')
+        lamp = self.create('Desk lamp', 'LED')
+        self.assertEqual(self.titles('cycle'), ['Cycle'])
+
+        cycle.title = 'Bicycle'
+        cycle.description = 'Hero bicycle'
+        cycle.save()
+        self.assertEqual(self.titles('cycle'), [])
+        self.assertEqual(self.titles('bicycles'), ['Bicycle'])
+
+        cycle.is_sold = True
+        cycle.save()
+        self.assertEqual(self.titles('bicycle'), [])
+
+        lamp.delete()
+        self.assertEqual(self.titles('lamp'), [])
+
+    def test_category_filter_and_validation(self):
+        self.create('Physics book', category='Books & Study Materials')
+        self.create('Book shelf', category='Furniture')
+        response = self.client.get(self.url, {'q': 'book', 'category': 'Furniture'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Book shelf'])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class ProductSuggestTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user()
+        self.url = reverse('products:product-suggest')
+
+    def create(self, title, category='Others', **extra):
+        return Product.objects.create(
+            title=title, description='x', price=10, seller=self.seller, category=category, **extra
+        )
+
+    def suggest(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item['title'], item['category']) for item in response.data['results']]
+
+    def test_prefix_matches_any_title_word(self):
+        self.create('Scientific Calculator', 'Electronics')
+        self.create('Scientific Calculator', 'Electronics')
+        self.create('Casio Calculator', 'Electronics')
+        self.create('Cycle', 'Cycle & Transport')
+
+        self.assertEqual(self.suggest('calc'), [
+            ('Scientific Calculator', 'Electronics'),
+            ('Casio Calculator', 'Electronics'),
+        ])
+        self.assertEqual(self.suggest('sci calc'), [('Scientific Calculator', 'Electronics')])
+        self.assertEqual(self.suggest('c', limit=1), [('Scientific Calculator', 'Electronics')])
+
+    def test_misspellings_fall_back_to_trigram_matches(self):
+        self.create('Scientific Calculator', 'Electronics')
+        self.create('Hero cycle', 'Cycle & Transport')
+
+        self.assertEqual(self.suggest('calculater'), [('Scientific Calculator', 'Electronics')])
+        self.assertEqual(self.suggest('cycel'), [('Hero cycle', 'Cycle & Transport')])
+
+    def test_trie_follows_listing_changes(self):
+        self.assertEqual(self.suggest('lamp'), [])
+        lamp = self.create('Desk lamp')
+        self.assertEqual(self.suggest('lam'), [('Desk lamp', 'Others')])
+
+        lamp.title = 'Table light'
+        lamp.save()
+        self.assertEqual(self.suggest('lam'), [])
+        self.assertEqual(self.suggest('lig'), [('Table light', 'Others')])
+
+        lamp.is_sold = True
+        lamp.save()
+        self.assertEqual(self.suggest('lig'), [])
+
+    def test_removing_a_title_whose_words_prefix_each_other(self):
+        self.create('Pen stand')
+        kit = self.create('Pen and pencil set')
+        self.assertEqual(self.suggest('pen'), [('Pen and pencil set', 'Others'), ('Pen stand', 'Others')])
+
+        self.client.force_authenticate(self.seller)
+        response = self.client.patch(
+            reverse('products:product-retrieve-update', args=[kit.pk]), {'is_sold': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.suggest('pen'), [('Pen stand', 'Others')])
+        # Queried on the trie itself; the endpoint would fall back to fuzzy matches.
+        self.assertEqual(suggestion_index.complete('penc', 8), [])
+        self.assertEqual(suggestion_index.complete('set', 8), [])
+
+    def test_trie_is_rebuilt_to_see_other_workers_writes(self):
+        self.create('Desk lamp')
+        self.assertEqual(self.suggest('lamp'), [('Desk lamp', 'Others')])
+        # Saved elsewhere: no signal reaches this process's trie.
+        make_products(self.seller, 1)
+        self.assertEqual(self.suggest('item'), [])
+
+        later = time.monotonic() + 301
+        with mock.patch('products.suggest.time.monotonic', return_value=later):
+            self.assertEqual(self.suggest('item'), [('Item 0', 'Others')])
+
+
+class ProductCacheTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.list_url = reverse('products:product-list-create')
+
+    def test_list_page_is_served_from_cache(self):
+        make_products(self.seller, 3)
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_marking_sold_invalidates_list_and_detail(self):
+        product = Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        detail_url = reverse('products:product-retrieve-update', args=[product.pk])
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(len(self.client.get(self.list_url).data['results']), 1)
+        self.assertFalse(self.client.get(detail_url).data['is_sold'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url, {'is_sold': True}, format='json')
+
+        self.assertEqual(len(self.client.get(self.list_url).data['results']), 0)
+        self.assertTrue(self.client.get(detail_url).data['is_sold'])
+
+    def test_writes_only_invalidate_their_categories(self):
+        Product.objects.create(title='Chair', description='x', price=10, seller=self.seller,
+                               category='Furniture')
+        furniture = f'{self.list_url}?category=Furniture'
+        self.client.get(furniture)
+
+        self.client.force_authenticate(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.list_url, {'title': 'Phone', 'description': 'x', 'price': 5,
+                                             'category': 'Electronics'}, format='json')
+        with self.assertNumQueries(0):
+            self.client.get(furniture)
+
+        phone = Product.objects.get(title='Phone')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('products:product-retrieve-update', args=[phone.pk]),
+                              {'category': 'Furniture'}, format='json')
+        titles = [item['title'] for item in self.client.get(furniture).data['results']]
+        self.assertCountEqual(titles, ['Chair', 'Phone'])
+
+    def test_cached_detail_still_checks_ownership(self):
+        product = Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        detail_url = reverse('products:product-retrieve-update', args=[product.pk])
+        self.client.force_authenticate(self.seller)
+        self.client.get(detail_url)
+
+        self.client.force_authenticate(make_user(1))
+        self.assertEqual(self.client.get(detail_url).status_code, 403)
+
+    def test_detail_has_the_list_item_shape(self):
+        product = Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        detail_url = reverse('products:product-retrieve-update', args=[product.pk])
+        self.client.force_authenticate(self.seller)
+        detail = self.client.get(detail_url).data
+        self.assertEqual(list(detail), [
+            'id', 'title', 'description', 'price', 'negotiable', 'image', 'image_variants',
+            'category', 'seller', 'is_sold', 'posted_at', 'updated_at',
+        ])
+        self.assertEqual(detail, self.client.get(self.list_url).data['results'][0])
+        self.assertEqual(list(self.client.patch(detail_url, {'price': 12}, format='json').data), list(detail))
+
+    def test_seller_edits_invalidate_detail(self):
+        product = Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        detail_url = reverse('products:product-retrieve-update', args=[product.pk])
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get(detail_url).data['seller']['name'], 'Test User0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.first_name = 'Changed'
+            self.seller.save()
+        self.assertEqual(self.client.get(detail_url).data['seller']['name'], 'Changed User0')
+
+    def test_seller_edits_invalidate_list_pages(self):
+        Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.first_name = 'Renamed'
+            self.seller.save()
+        response = self.client.get(self.list_url)
+        self.assertTrue(response.data['results'][0]['seller']['name'].startswith('Renamed'))
+
+
+class ProductConditionalGetTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.list_url = reverse('products:product-list-create')
+        self.product = Product.objects.create(title='Lamp', description='x', price=10, seller=self.seller)
+        self.detail_url = reverse('products:product-retrieve-update', args=[self.product.pk])
+
+    def test_list_revalidates_until_a_product_changes(self):
+        response = self.client.get(self.list_url)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other = self.client.get(f'{self.list_url}?sort=oldest', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_sold = True
+            self.product.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_detail_checks_ownership_before_answering_304(self):
+        self.client.force_authenticate(self.seller)
+        etag = self.client.get(self.detail_url).headers['ETag']
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_authenticate(make_user(1))
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+    def test_detail_validators_follow_seller_edits(self):
+        self.client.force_authenticate(self.seller)
+        first = self.client.get(self.detail_url)
+        etag = first.headers['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.first_name = 'Changed'
+            self.seller.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data['seller']['name'], 'Changed User0')
+
+        request = APIRequestFactory().get(self.detail_url, headers={'If-None-Match': etag})
+        force_authenticate(request, self.seller)
+        response = async_to_sync(AsyncProductRetrieveUpdateView.as_view())(request, pk=self.product.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+class AsyncProductViewTests(ProductTestCase):
+    """The async views answer like the regular ones, without sync ORM calls on the event loop"""
+
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.products = make_products(self.seller, 25)
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method='get', path='/products/', user=None, data=None, headers=None, **kwargs):
+        request = getattr(self.factory, method)(path, data, format='json', headers=headers)
+        if user is not None:
+            force_authenticate(request, user)
+        if view.view_is_async:
+            return async_to_sync(view.as_view())(request, **kwargs)
+        return view.as_view()(request, **kwargs)
+
+    def test_list_pages_match_the_sync_view(self):
+        path = '/products/'
+        while path:
+            response = self.call(AsyncProductListCreateView, path=path)
+            self.assertEqual(response.status_code, 200)
+            get_cache().clear()
+            self.assertEqual(response.data, self.call(ProductListCreateView, path=path).data)
+            path = response.data['next']
+
+        first = self.call(AsyncProductListCreateView, path='/products/?category=Others')
+        with self.assertNumQueries(0):
+            cached = self.call(AsyncProductListCreateView, path='/products/?category=Others')
+            revalidated = self.call(
+                AsyncProductListCreateView, path='/products/?category=Others',
+                headers={'If-None-Match': first.headers['ETag']},
+            )
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.call(AsyncProductListCreateView, path='/products/?sort=bogus').status_code, 400)
+
+    def test_detail_checks_ownership_on_miss_and_hit(self):
+        product = self.products[0]
+        path = f'/products/{product.pk}/'
+        response = self.call(AsyncProductRetrieveUpdateView, path=path, user=self.seller, pk=product.pk)
+        self.assertEqual(response.status_code, 200)
+        get_cache().clear()
+        expected = self.call(ProductRetrieveUpdateView, path=path, user=self.seller, pk=product.pk)
+        self.assertEqual(response.data, expected.data)
+
+        other = make_user(1)
+        self.assertEqual(self.call(AsyncProductRetrieveUpdateView, path=path, user=other, pk=product.pk).status_code, 403)
+        get_cache().clear()
+        self.assertEqual(self.call(AsyncProductRetrieveUpdateView, path=path, user=other, pk=product.pk).status_code, 403)
+        self.assertEqual(self.call(AsyncProductRetrieveUpdateView, path=path, pk=product.pk).status_code, 401)
+        self.assertEqual(
+            self.call(AsyncProductRetrieveUpdateView, path='/products/0/', user=self.seller, pk=0).status_code, 404
+        )
+
+    def test_writes_run_the_regular_handlers(self):
+        response = self.call(
+            AsyncProductListCreateView, 'post', user=self.seller,
+            data={'title': 'Desk', 'description': 'x', 'price': 5, 'category': 'Furniture'},
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        product = Product.objects.get(title='Desk')
+
+        path = f'/products/{product.pk}/'
+        response = self.call(
+            AsyncProductRetrieveUpdateView, 'patch', path=path, user=self.seller, data={'price': 7}, pk=product.pk
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['price'], '7.00')
+        self.assertEqual(self.call(AsyncProductRetrieveUpdateView, path=path, user=self.seller, pk=product.pk).data['price'], '7.00')
+
+
+class ProductChangesTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.url = reverse('products:product-changes')
+
+    def create(self, title):
+        return Product.objects.create(title=title, description='x', price=10, seller=self.seller)
+
+    def poll(self, token, **params):
+        response = self.client.get(self.url, {'since': token, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_reports_creates_updates_sales_and_deletes(self):
+        token = self.client.get(self.url).data['next']
+        lamp = self.create('Lamp')
+        self.create('Chair')
+        kettle = self.create('Kettle')
+
+        data = self.poll(token)
+        self.assertEqual([item['title'] for item in data['changed']], ['Lamp', 'Chair', 'Kettle'])
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+
+        lamp.is_sold = True
+        lamp.save()
+        kettle_id = kettle.pk
+        kettle.delete()
+
+        data = self.poll(data['next'])
+        changed = {item['title']: item['is_sold'] for item in data['changed']}
+        self.assertTrue(changed['Lamp'])
+        self.assertIn(kettle_id, data['deleted'])
+        self.assertTrue(ProductTombstone.objects.filter(product_id=kettle_id).exists())
+        self.assertNotIn('Kettle', changed)
+
+    def test_pages_through_large_backlogs(self):
+        token = self.client.get(self.url).data['next']
+        for i in range(5):
+            self.create(f'Item {i}')
+        seen = []
+        while True:
+            data = self.poll(token, limit=2)
+            seen.extend(item['title'] for item in data['changed'])
+            token = data['next']
+            if not data['has_more']:
+                break
+        # The caught-up poll may repeat rows from the overlap window.
+        self.assertEqual(seen[:5], [f'Item {i}' for i in range(5)])
+
+    def test_rows_sharing_a_timestamp_span_pages(self):
+        # Bulk actions stamp every row they touch with the same time.
+        token = self.client.get(self.url).data['next']
+        products = [self.create(f'Item {i}') for i in range(5)]
+        stamp = timezone.now()
+        Product.objects.update(updated_at=stamp)
+        ProductTombstone.objects.bulk_create([ProductTombstone(product_id=1000 + i) for i in range(3)])
+        ProductTombstone.objects.update(deleted_at=stamp)
+        changed, deleted = [], []
+        while True:
+            data = self.poll(token, limit=2)
+            changed.extend(item['id'] for item in data['changed'])
+            deleted.extend(data['deleted'])
+            token = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual(changed, [product.pk for product in products])
+        self.assertEqual(deleted, [1000, 1001, 1002])
+
+    def test_rejects_bad_and_expired_tokens(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': '1.2'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': '0'}).status_code, 410)
+
+
+@override_settings(PRODUCT_UPLOAD_BACKEND='products.uploads.LocalUploadBackend')
+class ProductBulkTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.other = make_user(1)
+        self.url = reverse('products:product-bulk')
+        self.list_url = reverse('products:product-list-create')
+        self.client.force_authenticate(self.seller)
+
+    def bulk(self, **data):
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {result['id']: result['status'] for result in response.data['results']}
+
+    def test_mark_sold_reports_each_item(self):
+        mine = make_products(self.seller, 3)
+        theirs = make_products(self.other, 1)[0]
+        mine[2].is_sold = True
+        mine[2].save()
+        before = Product.objects.get(pk=mine[0].pk).updated_at
+        # Warm the cached list and search index so the bulk write has to invalidate them.
+        self.assertEqual(len(self.client.get(self.list_url).data['results']), 3)
+        self.assertEqual(len(self.client.get(reverse('products:product-search'), {'q': 'Item'}).data['results']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = self.bulk(
+                action='mark_sold', ids=[mine[0].pk, mine[1].pk, mine[2].pk, theirs.pk, 9999, mine[0].pk]
+            )
+        self.assertEqual(results, {
+            mine[0].pk: 'updated', mine[1].pk: 'updated', mine[2].pk: 'unchanged',
+            theirs.pk: 'forbidden', 9999: 'not_found',
+        })
+
+        self.assertEqual([item['id'] for item in self.client.get(self.list_url).data['results']], [theirs.pk])
+        self.assertEqual(
+            [item['id'] for item in self.client.get(reverse('products:product-search'), {'q': 'Item'}).data['results']],
+            [theirs.pk]
+        )
+        self.assertGreater(Product.objects.get(pk=mine[0].pk).updated_at, before)
+        self.assertFalse(Product.objects.get(pk=theirs.pk).is_sold)
+
+    def test_writes_invalidate_after_commit(self):
+        products = make_products(self.seller, 2)
+
+        def generation():
+            return get_generations(ALL_SCOPE)[0][ALL_SCOPE]
+
+        before = generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk(action='mark_sold', ids=[products[0].pk])
+            self.bulk(action='delete', ids=[products[1].pk])
+            # A reader now would still see the committed rows, so caching
+            # them under a new generation would keep them past the commit.
+            self.assertEqual(generation(), before)
+        self.assertNotEqual(generation(), before)
+
+    def test_query_count_does_not_grow_with_items(self):
+        few = [product.pk for product in make_products(self.seller, 3)]
+        many = [product.pk for product in make_products(self.seller, 60)]
+        # The lock, the update, the sellers' groups and one update per
+        # reports rollup row the sales land in.
+        with self.assertNumQueries(6) as few_queries:
+            self.bulk(action='mark_sold', ids=few)
+        with self.assertNumQueries(len(few_queries)):
+            self.bulk(action='mark_sold', ids=many)
+
+    def test_reprice(self):
+        products = make_products(self.seller, 2)
+        results = self.bulk(action='reprice', items=[
+            {'id': products[0].pk, 'price': '75.50'},
+            {'id': products[1].pk, 'price': str(products[1].price)},
+        ])
+        self.assertEqual(results, {products[0].pk: 'updated', products[1].pk: 'unchanged'})
+        self.assertEqual(str(Product.objects.get(pk=products[0].pk).price), '75.50')
+        listed = {item['id']: item['price'] for item in self.client.get(self.list_url).data['results']}
+        self.assertEqual(listed[products[0].pk], '75.50')
+
+    def test_delete_records_tombstones(self):
+        products = make_products(self.seller, 2)
+        theirs = make_products(self.other, 1)[0]
+        results = self.bulk(action='delete', ids=[products[0].pk, products[1].pk, theirs.pk])
+        self.assertEqual(results, {products[0].pk: 'deleted', products[1].pk: 'deleted', theirs.pk: 'forbidden'})
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [theirs.pk])
+        self.assertEqual(ProductTombstone.objects.count(), 2)
+
+    def test_staff_can_moderate_any_listing(self):
+        products = make_products(self.seller, 2) + make_products(self.other, 2)
+        self.client.force_authenticate(make_user(2, is_staff=True))
+        results = self.bulk(action='delete', ids=[product.pk for product in products])
+        self.assertEqual(set(results.values()), {'deleted'})
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(PRODUCT_BULK_MAX_ITEMS=2)
+    def test_rejects_malformed_requests(self):
+        self.assertEqual(self.client.post(self.url, {'action': 'reprice', 'ids': [1]}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'action': 'mark_sold'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'action': 'mark_sold', 'ids': [1, 2, 3]}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'action': 'archive', 'ids': [1]}, format='json').status_code, 400)
+        response = self.client.post(self.url, {'action': 'reprice', 'items': [{'id': 1, 'price': '-1'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(self.url, {'action': 'mark_sold', 'ids': [1]}, format='json').status_code, 401)
+
+
+class TestSocket(ApplicationCommunicator):
+    """A WebSocket client talking straight to the ASGI app"""
+
+    def __init__(self, path, query=''):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [(b'host', b'testserver'), (b'origin', b'http://testserver')],
+            'subprotocols': [],
+        })
+
+    async def connect(self):
+        await self.send_input({'type': 'websocket.connect'})
+        return (await self.receive_output())['type'] == 'websocket.accept'
+
+    async def receive_json_from(self):
+        message = await self.receive_output()
+        assert message['type'] == 'websocket.send', message
+        return json.loads(message['text'])
+
+    async def send_json_to(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait()
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ProductFeedTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+
+    async def connect(self, *categories):
+        query = urlencode([('category', category) for category in categories])
+        communicator = TestSocket('/ws/products/', query)
+        self.assertTrue(await communicator.connect())
+        subscribed = await communicator.receive_json_from()
+        self.assertEqual(subscribed['type'], 'subscribed')
+        self.assertTrue(subscribed['since'])
+        return communicator
+
+    async def write(self, fn):
+        """Run ``fn`` against the database and its on_commit callbacks, as a request would"""
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                fn()
+        await sync_to_async(run)()
+
+    async def create(self, **fields):
+        created = []
+        await self.write(lambda: created.append(Product.objects.create(
+            title='Item', description='x', price=100, seller=self.seller, **fields
+        )))
+        return created[0]
+
+    async def events(self, communicator):
+        received = []
+        while not await communicator.receive_nothing(timeout=0.1):
+            frame = await communicator.receive_json_from()
+            self.assertEqual(frame['type'], 'events')
+            received.extend(frame['events'])
+        return [(event['event'], event['id']) for event in received]
+
+    async def test_subscribers_get_only_their_categories(self):
+        books = await self.connect('Books & Study Materials')
+        everything = await self.connect()
+        book = await self.create(category='Books & Study Materials')
+        phone = await self.create(category='Electronics')
+        self.assertEqual(await self.events(books), [('created', book.pk)])
+        self.assertEqual(await self.events(everything), [('created', book.pk), ('created', phone.pk)])
+        await books.disconnect()
+        await everything.disconnect()
+
+    async def test_bulk_mark_sold_sends_one_frame(self):
+        products = await sync_to_async(make_products)(self.seller, 3, category='Furniture')
+        communicator = await self.connect('Furniture')
+        self.client.force_authenticate(self.seller)
+        await self.write(lambda: self.client.post(
+            reverse('products:product-bulk'),
+            {'action': 'mark_sold', 'ids': [product.pk for product in products]},
+            format='json',
+        ))
+        frame = await communicator.receive_json_from()
+        self.assertEqual([event['event'] for event in frame['events']], ['sold'] * 3)
+        self.assertTrue(all(event['is_sold'] for event in frame['events']))
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await communicator.disconnect()
+
+    async def test_updates_and_deletes(self):
+        product = await self.create(category='Furniture')
+        pk = product.pk
+        communicator = await self.connect('Furniture')
+
+        def update():
+            product.price = 800
+            product.save()
+
+        await self.write(update)
+        await self.write(product.delete)
+        self.assertEqual(await self.events(communicator), [('updated', pk), ('deleted', pk)])
+        await communicator.disconnect()
+
+    async def test_only_the_sale_is_a_sold_event(self):
+        product = await self.create(category='Furniture')
+        pk = product.pk
+        communicator = await self.connect('Furniture')
+
+        def sell_then_edit():
+            product.is_sold = True
+            product.save()
+            product.price = 700
+            product.save()
+            loaded = Product.objects.get(pk=pk)
+            loaded.price = 650
+            loaded.save()
+
+        await self.write(sell_then_edit)
+        self.assertEqual(await self.events(communicator), [('sold', pk), ('updated', pk), ('updated', pk)])
+        await communicator.disconnect()
+
+    async def test_moved_product_reaches_each_socket_once(self):
+        product = await self.create(category='Furniture')
+        old_only = await self.connect('Furniture')
+        both = await self.connect('Furniture', 'Room Decor')
+
+        def move():
+            moved = Product.objects.get(pk=product.pk)
+            moved.category = 'Room Decor'
+            moved.save()
+
+        await self.write(move)
+        frame = await old_only.receive_json_from()
+        self.assertEqual(frame['events'][0]['previous_category'], 'Furniture')
+        self.assertEqual(await self.events(old_only), [])
+        self.assertEqual(await self.events(both), [('updated', product.pk)])
+        await old_only.disconnect()
+        await both.disconnect()
+
+    async def test_rolled_back_writes_send_nothing(self):
+        communicator = await self.connect()
+
+        def fail():
+            try:
+                with transaction.atomic():
+                    Product.objects.create(title='Ghost', description='x', price=1, seller=self.seller)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        await self.write(fail)
+        self.assertEqual(await self.events(communicator), [])
+        await communicator.disconnect()
+
+    async def test_changing_the_subscription(self):
+        communicator = await self.connect('Electronics')
+        await communicator.send_json_to({'categories': ['Others']})
+        self.assertEqual((await communicator.receive_json_from())['categories'], ['Others'])
+        await self.create(category='Electronics')
+        self.assertEqual(await self.events(communicator), [])
+
+        await communicator.send_json_to({'categories': ['Spaceships']})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        self.assertEqual((await communicator.receive_output())['code'], 4400)
+
+
+class ProductImportExportTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_user(0)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def run_command(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command(*args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_validates_and_updates_indexes(self):
+        path = os.path.join(self.dir, 'products.csv')
+        with open(path, 'w') as f:
+            f.write(
+                'title,description,price,negotiable,category,seller\n'
+                'Desk Lamp,Bright,120.50,true,Room Decor,USER0@nitrkl.ac.in\n'
+                'Bad Price,x,-5,false,Others,user0@nitrkl.ac.in\n'
+                'Cycle,x,900,false,Cars,user0@nitrkl.ac.in\n'
+                'Stranger,x,10,false,Others,nobody@nitrkl.ac.in\n'
+                'Kettle,Electric,300,false,Hostel Essentials,user0@nitrkl.ac.in\n'
+            )
+        # Cache an empty list and load the search index first; the import has to invalidate both.
+        self.assertEqual(self.client.get(reverse('products:product-list-create')).data['results'], [])
+        self.assertEqual(self.client.get(reverse('products:product-search'), {'q': 'lamp'}).data['results'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            out, err = self.run_command('import_products', path, '--batch-size', '2')
+        self.assertIn('2 products created, 3 rows skipped', out)
+        self.assertIn('line 3: price: Price cannot be negative.', err)
+        self.assertIn('line 4: category: "Cars" is not a valid choice.', err)
+        self.assertIn('line 5: seller: no user with email nobody@nitrkl.ac.in.', err)
+
+        titles = [item['title'] for item in self.client.get(reverse('products:product-list-create')).data['results']]
+        self.assertCountEqual(titles, ['Desk Lamp', 'Kettle'])
+        found = self.client.get(reverse('products:product-search'), {'q': 'lamp'}).data['results']
+        self.assertEqual([item['title'] for item in found], ['Desk Lamp'])
+        self.assertEqual(str(Product.objects.get(title='Desk Lamp').price), '120.50')
+
+    def test_export_streams_and_round_trips(self):
+        make_products(self.seller, 3)
+        make_products(self.seller, 1, is_sold=True)
+        path = os.path.join(self.dir, 'products.jsonl')
+        out, _ = self.run_command('export_products', path, '--chunk-size', '2')
+        self.assertIn('Exported 4 rows', out)
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['title'] for row in rows], ['Item 0', 'Item 1', 'Item 2', 'Item 0'])
+        self.assertEqual(rows[0]['seller'], 'user0@nitrkl.ac.in')
+        self.assertEqual(rows[0]['price'], '100.00')
+        self.assertTrue(rows[3]['is_sold'])
+
+        Product.objects.all().delete()
+        out, err = self.run_command('import_products', path)
+        self.assertIn('4 products created, 0 rows skipped', out)
+        self.assertEqual(Product.objects.filter(is_sold=True).count(), 1)
+
+
+class ProductDirectUploadTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.media_root = media_root
+
+        self.seller = make_user()
+        self.product = make_products(self.seller, 1)[0]
+        self.client.force_authenticate(self.seller)
+
+    def upload(self, fields, content=b'\xff\xd8\xff fake jpeg', name='photo.jpg'):
+        client = APIClient()
+        return client.post(
+            reverse('products:product-upload-local'),
+            {**fields, 'file': SimpleUploadedFile(name, content, content_type='image/jpeg')},
+            format='multipart'
+        )
+
+    def test_sign_upload_finalize(self):
+        params = self.client.post(reverse('products:product-upload')).data
+        self.assertTrue(params['upload_url'].endswith('/products/uploads/local/'))
+        self.assertTrue(params['public_id'].startswith(f'products/{self.seller.pk}/'))
+
+        response = self.upload(params['fields'])
+        self.assertEqual(response.status_code, 200, response.data)
+        result = response.data
+        stored = os.path.join(self.media_root, f"{params['public_id']}.jpg")
+        self.assertTrue(os.path.exists(stored))
+
+        url = reverse('products:product-image', args=[self.product.pk])
+        response = self.client.post(url, {**result, 'signature': 'forged'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(url, result, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(response.data['image'].endswith(f"/media/{params['public_id']}.jpg"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image.public_id, params['public_id'])
+
+        detail = self.client.get(reverse('products:product-retrieve-update', args=[self.product.pk]))
+        self.assertEqual(detail.data['image'], response.data['image'])
+
+    def test_rejects_tampered_or_foreign_uploads(self):
+        params = self.client.post(reverse('products:product-upload')).data
+        tampered = {**params['fields'], 'public_id': 'products/999/stolen'}
+        self.assertEqual(self.upload(tampered).status_code, 400)
+        self.assertEqual(self.upload(params['fields'], name='script.svg').status_code, 400)
+
+        # A valid upload issued to someone else cannot be attached here.
+        other = make_user(1)
+        self.client.force_authenticate(other)
+        other_params = self.client.post(reverse('products:product-upload')).data
+        result = self.upload(other_params['fields']).data
+        self.client.force_authenticate(self.seller)
+        response = self.client.post(reverse('products:product-image', args=[self.product.pk]), result, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('public_id', response.data)
+
+        # And nobody but the seller can attach to this product.
+        self.client.force_authenticate(other)
+        response = self.client.post(reverse('products:product-image', args=[self.product.pk]), result, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+def make_jpeg(width=2000, height=1500, orientation=None):
+    image = Image.new('RGB', (width, height), (200, 60, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class ImageUploadMixin:
+    """Local media root, a seller with one product, and a helper to attach images"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(
+            MEDIA_ROOT=media_root, PRODUCT_IMAGE_WIDTHS=[320, 640, 1600], PRODUCT_IMAGE_FORMATS=['webp', 'jpeg']
+        )
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.seller = make_user()
+        self.product = make_products(self.seller, 1)[0]
+        self.client.force_authenticate(self.seller)
+
+    def attach(self, content):
+        params = self.client.post(reverse('products:product-upload')).data
+        result = APIClient().post(
+            reverse('products:product-upload-local'),
+            {**params['fields'], 'file': SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')},
+            format='multipart'
+        ).data
+        response = self.client.post(reverse('products:product-image', args=[self.product.pk]), result, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+
+class ProductImagePipelineTests(ImageUploadMixin, ProductTestCase):
+    def test_render_strips_metadata_and_scales_down(self):
+        result = render_variants(make_jpeg(orientation=6), [320, 640, 1024, 1600], ['webp', 'jpeg'], {'webp': 75, 'jpeg': 80})
+        # Orientation 6 is a quarter turn, applied before the tag is dropped.
+        self.assertEqual((result['width'], result['height']), (1500, 2000))
+        self.assertEqual(
+            sorted({width for width, _, _ in result['files']}), [320, 640, 1024, 1500]
+        )
+        for width, format, content in result['files']:
+            image = Image.open(io.BytesIO(content))
+            self.assertEqual(image.format, format.upper())
+            self.assertEqual(image.width, width)
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertTrue(result['placeholder'].startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(result['placeholder']), 1000)
+
+    def test_large_photos_are_decoded_at_reduced_size(self):
+        with mock.patch('products.images.ImageOps.exif_transpose', wraps=ImageOps.exif_transpose) as transpose:
+            result = render_variants(make_jpeg(orientation=6), [320, 640], ['jpeg'], {'jpeg': 80})
+        # 640 wide upright is 853x640 as stored, so the decoder can halve the 2000x1500 original.
+        self.assertEqual(transpose.call_args.args[0].size, (1000, 750))
+        self.assertEqual((result['width'], result['height']), (1500, 2000))
+        for width, _, content in result['files']:
+            self.assertEqual(Image.open(io.BytesIO(content)).size, (width, round(2000 * width / 1500)))
+
+    def test_new_image_is_queued_and_served_as_variants(self):
+        response = self.attach(make_jpeg())
+        self.assertIsNone(response.data['image_variants'])
+        original = response.data['image']
+        job = ProductImageJob.objects.get(product=self.product)
+        self.assertEqual(job.status, ProductImageJob.STATUS_PENDING)
+
+        self.assertEqual(process_queue(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProductImageJob.STATUS_DONE)
+
+        detail = self.client.get(reverse('products:product-retrieve-update', args=[self.product.pk])).data
+        variants = detail['image_variants']
+        self.assertEqual((variants['width'], variants['height']), (2000, 1500))
+        self.assertEqual(list(variants['srcset']), ['webp', 'jpeg'])
+        self.assertRegex(variants['srcset']['webp'], r'^http://testserver/media/\S+_320w\.webp 320w, \S+ 640w, \S+ 1600w$')
+        self.assertTrue(variants['src'].endswith('_1600w.jpeg'))
+        self.assertEqual(detail['image'], variants['src'])
+        self.assertNotEqual(detail['image'], original)
+
+        listed = self.client.get(reverse('products:product-list-create')).data['results'][0]
+        self.assertEqual(listed['image_variants'], variants)
+
+        # Saving other fields keeps the variants and queues nothing.
+        self.client.patch(reverse('products:product-retrieve-update', args=[self.product.pk]), {'price': 50}, format='json')
+        self.assertEqual(claim_due_jobs(10), [])
+
+    def test_image_replaced_during_rendering_is_requeued(self):
+        self.attach(make_jpeg())
+        ids = claim_due_jobs(10)
+
+        def render_then_replace(*args):
+            result = render_variants(*args)
+            self.attach(make_jpeg(800, 600))
+            return result
+
+        with mock.patch('products.images.render_variants', render_then_replace):
+            self.assertEqual(process_jobs(ids), (1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants, {})
+        job = ProductImageJob.objects.get(product=self.product)
+        self.assertEqual(job.status, ProductImageJob.STATUS_PENDING)
+
+        self.assertEqual(process_queue(), (1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants['width'], 800)
+        self.assertEqual(sorted(self.product.image_variants['files']['jpeg'], key=int), ['320', '640', '800'])
+
+
+def make_photo(seed, width=1200, height=900, quality=90):
+    """A JPEG with coarse random structure, so different seeds hash far apart"""
+    rng = random.Random(seed)
+    small = Image.frombytes('L', (12, 9), bytes(rng.randrange(256) for _ in range(12 * 9)))
+    image = small.resize((width, height), Image.BILINEAR).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class MultiIndexHashTests(TestCase):
+    def test_search_matches_brute_force(self):
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(500)]
+        # Plant near neighbours of the first hash.
+        hashes += [hashes[0] ^ (1 << bit) ^ (1 << (bit + 7)) for bit in range(0, 40, 8)]
+        index = MultiIndexHash(6)
+        for pk, value in enumerate(hashes):
+            index.add(value, pk)
+        index.discard(hashes[-1], len(hashes) - 1)
+
+        # 20 is beyond the index radius and takes the full scan.
+        for radius in (0, 2, 6, 20):
+            expected = sorted(
+                (hamming(hashes[0], value), pk) for pk, value in enumerate(hashes[:-1])
+                if hamming(hashes[0], value) <= radius
+            )
+            self.assertEqual(sorted(index.search(hashes[0], radius)), expected)
+
+
+class DuplicateImageTests(ImageUploadMixin, ProductTestCase):
+    def attach_to(self, product, content):
+        self.product = product
+        self.client.force_authenticate(product.seller)
+        return self.attach(content)
+
+    def test_reposted_image_is_flagged_against_the_older_listing(self):
+        other_seller = make_user(1)
+        original, repost, unrelated = (
+            self.product, make_products(other_seller, 1)[0], make_products(self.seller, 1)[0]
+        )
+        self.attach_to(original, make_photo(1))
+        self.attach_to(repost, make_photo(1, width=1000, height=750, quality=60))
+        self.attach_to(unrelated, make_photo(2))
+        self.assertEqual(process_queue(), (3, 0))
+
+        for product in (original, repost, unrelated):
+            product.refresh_from_db()
+        self.assertIsNotNone(original.image_hash)
+        self.assertLessEqual(hamming(original.image_hash, repost.image_hash), 6)
+        self.assertIsNone(original.duplicate_of_id)
+        self.assertEqual(repost.duplicate_of_id, original.pk)
+        self.assertIsNone(unrelated.duplicate_of_id)
+
+    def test_command_backfills_and_clusters(self):
+        products = [self.product, *make_products(self.seller, 3)]
+        for product, seed in zip(products, (1, 2, 1, 1)):
+            self.attach_to(product, make_photo(seed))
+        process_queue()
+        Product.objects.update(image_hash=None, duplicate_of=None)
+
+        out = io.StringIO()
+        call_command('find_duplicate_images', workers=0, stdout=out)
+        self.assertIn('Hashed 4 images (0 failed)', out.getvalue())
+        self.assertIn('Found 1 clusters covering 3 listings; 2 flagged', out.getvalue())
+        flags = dict(Product.objects.values_list('pk', 'duplicate_of'))
+        first = products[0].pk
+        self.assertEqual(flags, {first: None, products[1].pk: None, products[2].pk: first, products[3].pk: first})
+
+        # Nothing left to hash on a second run.
+        out = io.StringIO()
+        call_command('find_duplicate_images', workers=0, stdout=out)
+        self.assertIn('Hashed 0 images', out.getvalue())
+        self.assertIn('(0 changed)', out.getvalue())
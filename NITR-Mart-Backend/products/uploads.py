@@ -0,0 +1,204 @@
+"""
+Direct-to-storage product image uploads.
+
+1. ``POST /products/uploads/`` returns a URL and signed form fields. The
+   public id is chosen by the server and scoped to the requesting user.
+2. The browser posts the file plus those fields straight to the URL. The
+   storage service checks the signature and answers with ``public_id``,
+   ``version``, ``format`` and a response ``signature``.
+3. ``POST /products/<pk>/image/`` with that answer verifies the response
+   signature and attaches the image to the product.
+
+Django never sees the file bytes. ``CloudinaryUploadBackend`` talks to
+Cloudinary's signed upload API. ``LocalUploadBackend`` implements the same
+protocol, signatures included, against ``MEDIA_ROOT`` so development and
+tests need no Cloudinary account.
+
+Backends also read originals and store the resized renditions made by the
+image worker (products/images.py).
+"""
+import io
+import secrets
+import time
+import urllib.request
+from functools import lru_cache
+
+import cloudinary
+import cloudinary.uploader
+from cloudinary import CloudinaryResource
+from cloudinary.utils import api_sign_request
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+ALLOWED_FORMATS = ('jpg', 'jpeg', 'png', 'webp', 'gif', 'heic')
+
+
+class UploadBackend:
+    api_key = None
+    api_secret = None
+
+    def get_upload_url(self, request):
+        raise NotImplementedError
+
+    def get_folder(self):
+        return getattr(settings, 'PRODUCT_UPLOAD_FOLDER', 'products')
+
+    def get_max_age(self):
+        return getattr(settings, 'PRODUCT_UPLOAD_MAX_AGE_SECONDS', 3600)
+
+    def sign(self, params):
+        return api_sign_request(params, self.api_secret)
+
+    def sign_upload(self, request):
+        """Upload URL and form fields for one image owned by ``request.user``"""
+        timestamp = int(time.time())
+        params = {
+            'public_id': f'{self.get_folder()}/{request.user.pk}/{secrets.token_urlsafe(12)}',
+            'timestamp': timestamp,
+            'allowed_formats': ','.join(ALLOWED_FORMATS),
+        }
+        return {
+            'upload_url': self.get_upload_url(request),
+            'fields': {**params, 'api_key': self.api_key, 'signature': self.sign(params)},
+            'public_id': params['public_id'],
+            'expires_at': timestamp + self.get_max_age(),
+        }
+
+    def is_owned_by(self, public_id, user):
+        return public_id.startswith(f'{self.get_folder()}/{user.pk}/')
+
+    def verify_result(self, public_id, version, signature):
+        """True if storage really produced this (public_id, version) answer"""
+        expected = self.sign({'public_id': public_id, 'version': version})
+        return constant_time_compare(expected, signature)
+
+    def to_resource(self, public_id, version, format):
+        return CloudinaryResource(
+            public_id, format=format, version=version, type='upload', resource_type='image'
+        )
+
+    def get_url(self, resource):
+        return resource.url
+
+    def read(self, resource):
+        """Bytes of the original upload"""
+        raise NotImplementedError
+
+    def variant_name(self, resource, width, format):
+        return f'{resource.public_id}_{width}w.{format}'
+
+    def save_variant(self, resource, width, format, data):
+        """Store one rendition and return a reference for ``get_variant_url``"""
+        raise NotImplementedError
+
+    def get_variant_url(self, reference):
+        raise NotImplementedError
+
+
+class CloudinaryUploadBackend(UploadBackend):
+    @property
+    def api_key(self):
+        return cloudinary.config().api_key
+
+    @property
+    def api_secret(self):
+        return cloudinary.config().api_secret
+
+    def get_upload_url(self, request):
+        return f'https://api.cloudinary.com/v1_1/{cloudinary.config().cloud_name}/image/upload'
+
+    def read(self, resource):
+        with urllib.request.urlopen(resource.build_url(), timeout=30) as response:
+            return response.read()
+
+    def save_variant(self, resource, width, format, data):
+        public_id = self.variant_name(resource, width, format).rsplit('.', 1)[0]
+        result = cloudinary.uploader.upload(
+            io.BytesIO(data), public_id=public_id, format=format,
+            resource_type='image', overwrite=True,
+        )
+        return result['secure_url']
+
+    def get_variant_url(self, reference):
+        return reference
+
+
+class LocalUploadBackend(UploadBackend):
+    """Stores uploads under MEDIA_ROOT and serves them from MEDIA_URL"""
+    api_key = 'local'
+
+    @property
+    def api_secret(self):
+        return settings.SECRET_KEY
+
+    def get_storage(self):
+        return FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+    def get_upload_url(self, request):
+        return request.build_absolute_uri(reverse('products:product-upload-local'))
+
+    def receive(self, fields, upload):
+        """
+        Store an upload the way Cloudinary would: check the signed fields and
+        return the response body, or raise ValueError.
+        """
+        params = {name: fields.get(name) for name in ('public_id', 'timestamp', 'allowed_formats')}
+        if not all(params.values()):
+            raise ValueError('Missing upload parameters.')
+        if fields.get('api_key') != self.api_key:
+            raise ValueError('Unknown api_key.')
+        if not constant_time_compare(self.sign(params), fields.get('signature', '')):
+            raise ValueError('Invalid signature.')
+        try:
+            timestamp = int(params['timestamp'])
+        except ValueError:
+            raise ValueError('Invalid timestamp.')
+        if timestamp + self.get_max_age() < time.time():
+            raise ValueError('Stale request.')
+
+        format = upload.name.rsplit('.', 1)[-1].lower() if '.' in upload.name else ''
+        if format not in params['allowed_formats'].split(','):
+            raise ValueError(f'Image format {format or "(none)"} is not allowed.')
+
+        version = int(time.time())
+        storage = self.get_storage()
+        name = f"{params['public_id']}.{format}"
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, upload)
+        return {
+            'public_id': params['public_id'],
+            'version': version,
+            'format': format,
+            'signature': self.sign({'public_id': params['public_id'], 'version': version}),
+        }
+
+    def get_url(self, resource):
+        return self.get_storage().url(f'{resource.public_id}.{resource.format}')
+
+    def read(self, resource):
+        with self.get_storage().open(f'{resource.public_id}.{resource.format}', 'rb') as f:
+            return f.read()
+
+    def save_variant(self, resource, width, format, data):
+        storage = self.get_storage()
+        name = self.variant_name(resource, width, format)
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(data))
+
+    def get_variant_url(self, reference):
+        return self.get_storage().url(reference)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_upload_backend():
+    return _load_backend(getattr(settings, 'PRODUCT_UPLOAD_BACKEND', 'products.uploads.LocalUploadBackend'))
@@ -1,10 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from .views import ProductListCreateView, ProductRetrieveUpdateView, ProductDeleteView
+from .views import (
+    AsyncProductListCreateView,
+    AsyncProductRetrieveUpdateView,
+    ProductListCreateView,
+    ProductSearchView,
+    ProductSuggestView,
+    ProductChangesView,
+    ProductRetrieveUpdateView,
+    ProductDeleteView,
+    ProductUploadView,
+    ProductImageView,
+    LocalUploadView,
+    ProductBulkView,
+)
 
 app_name = 'products'
 
+# Async versions of the busiest reads, see nitrmart/asyncviews.py.
+list_create_view = AsyncProductListCreateView if settings.ASYNC_VIEWS else ProductListCreateView
+retrieve_update_view = AsyncProductRetrieveUpdateView if settings.ASYNC_VIEWS else ProductRetrieveUpdateView
+
 urlpatterns = [
-    path('', ProductListCreateView.as_view(), name='product-list-create'),
-    path('<int:pk>/', ProductRetrieveUpdateView.as_view(), name='product-retrieve-update'),
+    path('', list_create_view.as_view(), name='product-list-create'),
+    path('search/', ProductSearchView.as_view(), name='product-search'),
+    path('suggest/', ProductSuggestView.as_view(), name='product-suggest'),
+    path('changes/', ProductChangesView.as_view(), name='product-changes'),
+    path('uploads/', ProductUploadView.as_view(), name='product-upload'),
+    path('uploads/local/', LocalUploadView.as_view(), name='product-upload-local'),
+    path('bulk/', ProductBulkView.as_view(), name='product-bulk'),
+    path('<int:pk>/', retrieve_update_view.as_view(), name='product-retrieve-update'),
+    path('<int:pk>/image/', ProductImageView.as_view(), name='product-image'),
     path('<int:pk>/delete/', ProductDeleteView.as_view(), name='product-delete'),
 ]
\ No newline at end of file
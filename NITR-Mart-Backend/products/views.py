@@ -1,32 +1,204 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from rest_framework import generics, permissions
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import status
+from nitrmart.asyncviews import AsyncAPIView, run_sync
+from nitrmart.conditional import add_validators, not_modified
+from . import bulk
+from . import cache as product_cache
 from .models import Product
-from .serializers import ProductSerializer, ProductCreateSerializer, ProductUpdateSerializer
+from .pagination import ProductCursorPagination
+from .serializers import (
+    SORT_ORDERINGS,
+    ProductSerializer,
+    ProductCreateSerializer,
+    ProductUpdateSerializer,
+    ProductFilterSerializer,
+    ProductSearchSerializer,
+    ProductSuggestSerializer,
+    ProductChangesSerializer,
+    ProductImageSerializer,
+    ProductBulkSerializer,
+)
+from .search import search_products
+from .suggest import suggest_products
+from .sync import collect_changes, starting_token
+from .uploads import LocalUploadBackend, get_upload_backend
 
 class ProductListCreateView(generics.ListCreateAPIView):
-    queryset = Product.objects.filter(is_sold=False)
+    queryset = Product.objects.filter(is_sold=False).with_seller()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ProductCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ProductCreateSerializer
         return ProductSerializer
 
+    def get_filters(self):
+        if not hasattr(self, '_filters'):
+            serializer = ProductFilterSerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._filters = serializer.validated_data
+        return self._filters
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+
+        filters = self.get_filters()
+        if 'category' in filters:
+            queryset = queryset.filter(category=filters['category'])
+        if 'min_price' in filters:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+        if filters.get('negotiable') is not None:
+            queryset = queryset.filter(negotiable=filters['negotiable'])
+        if 'seller' in filters:
+            queryset = queryset.filter(seller_id=filters['seller'])
+        return queryset
+
+    def get_keyset_ordering(self):
+        return SORT_ORDERINGS[self.get_filters()['sort']]
+
+    def list(self, request, *args, **kwargs):
+        version = product_cache.list_version(request, self.get_filters().get('category'))
+        response = not_modified(request, version.etag, version.last_modified)
+        if response is not None:
+            return response
+
+        cache = product_cache.get_cache()
+        data = cache.get(version.key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(version.key, data, product_cache.get_timeout())
+        return add_validators(Response(data), version.etag, version.last_modified)
+
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
 
+class AsyncProductListCreateView(AsyncAPIView, ProductListCreateView):
+    """ProductListCreateView that reads the listing with the async ORM"""
+
+    async def get(self, request, *args, **kwargs):
+        category = self.get_filters().get('category')
+        version = await sync_to_async(product_cache.list_version)(request, category)
+        response = not_modified(request, version.etag, version.last_modified)
+        if response is not None:
+            return response
+
+        cache = product_cache.get_cache()
+        data = await cache.aget(version.key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+            await cache.aset(version.key, data, product_cache.get_timeout())
+        return add_validators(Response(data), version.etag, version.last_modified)
+
+    post = run_sync(ProductListCreateView.post)
+
+class ProductSearchView(generics.GenericAPIView):
+    queryset = Product.objects.filter(is_sold=False).with_seller()
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get(self, request, *args, **kwargs):
+        params = ProductSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data['q']
+
+        queryset = self.get_queryset()
+        if 'category' in params.validated_data:
+            queryset = queryset.filter(category=params.validated_data['category'])
+
+        products = search_products(queryset, query, params.validated_data['limit'])
+        serializer = self.get_serializer(products, many=True)
+        return Response({'results': serializer.data}, status=status.HTTP_200_OK)
+
+class ProductSuggestView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = ProductSuggestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = Product.objects.filter(is_sold=False)
+        results = suggest_products(queryset, params.validated_data['q'], params.validated_data['limit'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+class ProductChangesView(APIView):
+    """
+    Delta feed for clients that keep a local copy of the catalog. Without
+    ``since`` it only issues a starting token; with it, it returns what was
+    saved or deleted after that token and the token for the next poll.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        params = ProductChangesSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get('since')
+        if since is None:
+            return Response(
+                {'changed': [], 'deleted': [], 'next': starting_token(), 'has_more': False},
+                status=status.HTTP_200_OK
+            )
+
+        changed, deleted, next_token, has_more = collect_changes(since, params.validated_data['limit'])
+        return Response(
+            {
+                'changed': ProductSerializer(changed, many=True).data,
+                'deleted': deleted,
+                'next': next_token,
+                'has_more': has_more,
+            },
+            status=status.HTTP_200_OK
+        )
+
 class ProductRetrieveUpdateView(generics.RetrieveUpdateAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_seller()
     serializer_class = ProductUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return ProductSerializer
+        return ProductUpdateSerializer
+
+    def check_owner(self, seller_id):
+        if self.request.user.pk != seller_id and not (self.request.user.is_staff or self.request.user.is_superuser):
+            self.permission_denied(self.request, message="You can only edit your own products.")
+
     def get_object(self):
         obj = super().get_object()
-        if self.request.user != obj.seller and not (self.request.user.is_staff or self.request.user.is_superuser):
-            self.permission_denied(self.request, message="You can only edit your own products.")
+        self.check_owner(obj.seller_id)
         return obj
 
+    def retrieve(self, request, *args, **kwargs):
+        # The seller id is cached with the payload so ownership is still
+        # checked on a cache hit without touching the database.
+        version = product_cache.detail_version(kwargs['pk'])
+        cache = product_cache.get_cache()
+        cached = cache.get(version.key)
+        if cached is None:
+            instance = self.get_object()
+        else:
+            self.check_owner(cached['seller_id'])
+
+        response = not_modified(request, version.etag, version.last_modified)
+        if response is not None:
+            return response
+
+        if cached is None:
+            cached = {'seller_id': instance.seller_id, 'data': self.get_serializer(instance).data}
+            cache.set(version.key, cached, product_cache.get_timeout())
+        return add_validators(Response(cached['data']), version.etag, version.last_modified, private=True)
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -35,11 +207,116 @@ class ProductRetrieveUpdateView(generics.RetrieveUpdateAPIView):
         self.perform_update(serializer)
         return Response(ProductSerializer(instance).data, status=status.HTTP_200_OK)
 
+class AsyncProductRetrieveUpdateView(AsyncAPIView, ProductRetrieveUpdateView):
+    """ProductRetrieveUpdateView that reads the product with the async ORM"""
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).afirst()
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        self.check_owner(obj.seller_id)
+        return obj
+
+    async def get(self, request, *args, **kwargs):
+        version = await sync_to_async(product_cache.detail_version)(kwargs['pk'])
+        cache = product_cache.get_cache()
+        cached = await cache.aget(version.key)
+        if cached is None:
+            instance = await self.aget_object()
+        else:
+            self.check_owner(cached['seller_id'])
+
+        response = not_modified(request, version.etag, version.last_modified)
+        if response is not None:
+            return response
+
+        if cached is None:
+            cached = {'seller_id': instance.seller_id, 'data': self.get_serializer(instance).data}
+            await cache.aset(version.key, cached, product_cache.get_timeout())
+        return add_validators(Response(cached['data']), version.etag, version.last_modified, private=True)
+
+    put = run_sync(ProductRetrieveUpdateView.put)
+    patch = run_sync(ProductRetrieveUpdateView.patch)
+
+class ProductUploadView(APIView):
+    """
+    Signed parameters for uploading one product image straight to storage.
+    Attach the result with ProductImageView.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response(get_upload_backend().sign_upload(request), status=status.HTTP_200_OK)
+
+class ProductImageView(generics.GenericAPIView):
+    """Attach a finished direct upload to a product"""
+    queryset = Product.objects.with_seller()
+    serializer_class = ProductImageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        product = self.get_object()
+        if request.user.pk != product.seller_id and not (request.user.is_staff or request.user.is_superuser):
+            self.permission_denied(request, message="You can only edit your own products.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        product.image = get_upload_backend().to_resource(data['public_id'], data['version'], data['format'])
+        product.save(update_fields=['image', 'updated_at'])
+        return Response(
+            ProductSerializer(product, context=self.get_serializer_context()).data,
+            status=status.HTTP_200_OK
+        )
+
+class LocalUploadView(APIView):
+    """
+    Stand-in for the storage service's upload endpoint, used with
+    LocalUploadBackend. The signed fields are the credentials.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        backend = get_upload_backend()
+        if not isinstance(backend, LocalUploadBackend):
+            raise Http404
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': {'message': 'Missing file.'}}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = backend.receive(request.data, upload)
+        except ValueError as exc:
+            return Response({'error': {'message': str(exc)}}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+class ProductBulkView(APIView):
+    """
+    Mark sold, re-price or delete many products at once. Sellers can act on
+    their own products, staff on any. Each product gets its own result, so
+    one foreign or missing id does not block the rest.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = ProductBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = bulk.apply(request.user, data['action'], data['ids'], data.get('prices'))
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'results': results, 'counts': counts}, status=status.HTTP_200_OK)
+
 class ProductDeleteView(generics.DestroyAPIView):
     queryset = Product.objects.all()
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_destroy(self, instance):
-        if self.request.user != instance.seller and not (self.request.user.is_staff or self.request.user.is_superuser):
+        if self.request.user.pk != instance.seller_id and not (self.request.user.is_staff or self.request.user.is_superuser):
             self.permission_denied(self.request, message="You can only delete your own products.")
         instance.delete()
\ No newline at end of file
@@ -1,3 +1,52 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from . import moderation
+from .models import DailyListingStats, ListingReport, ModerationItem, MonthlySellerStats
+
+
+@admin.register(DailyListingStats)
+class DailyListingStatsAdmin(admin.ModelAdmin):
+    list_display = ('day', 'category', 'branch', 'listed', 'sold', 'sellers', 'price_total', 'refreshed_at')
+    list_filter = ('category', 'branch')
+    date_hierarchy = 'day'
+    readonly_fields = [field.name for field in DailyListingStats._meta.fields]
+
+
+@admin.register(MonthlySellerStats)
+class MonthlySellerStatsAdmin(admin.ModelAdmin):
+    list_display = ('month', 'branch', 'year', 'active_sellers', 'listed', 'refreshed_at')
+    list_filter = ('branch', 'year')
+    readonly_fields = [field.name for field in MonthlySellerStats._meta.fields]
+
+
+@admin.register(ListingReport)
+class ListingReportAdmin(admin.ModelAdmin):
+    list_display = ('product', 'reporter', 'reason', 'status', 'created_at', 'resolved_by')
+    list_filter = ('status', 'reason')
+    search_fields = ('product__title', 'reporter__email')
+    raw_id_fields = ('product', 'reporter', 'resolved_by')
+    readonly_fields = ('created_at', 'resolved_at')
+
+
+@admin.register(ModerationItem)
+class ModerationItemAdmin(admin.ModelAdmin):
+    list_display = ('product', 'report_count', 'first_report_at', 'latest_report_at')
+    list_select_related = ('product',)
+    readonly_fields = ('product', 'report_count', 'first_report_at', 'latest_report_at')
+    actions = ['dismiss_reports', 'remove_listings']
+
+    def has_add_permission(self, request):
+        return False
+
+    def _resolve(self, request, queryset, action, verb):
+        results = moderation.resolve(request.user, action, list(queryset.values_list('product_id', flat=True)))
+        resolved = sum(result['status'] == moderation.RESOLVED for result in results)
+        self.message_user(request, f'{verb} {resolved} listings.', messages.SUCCESS)
+
+    @admin.action(description='Dismiss the reports on selected listings')
+    def dismiss_reports(self, request, queryset):
+        self._resolve(request, queryset, moderation.DISMISS, 'Dismissed reports on')
+
+    @admin.action(description='Remove selected listings')
+    def remove_listings(self, request, queryset):
+        self._resolve(request, queryset, moderation.REMOVE, 'Removed')
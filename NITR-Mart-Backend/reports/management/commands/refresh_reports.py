@@ -0,0 +1,42 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reports.rollups import changed_days, rebuild, refresh_days
+
+
+class Command(BaseCommand):
+    help = ('Bring the reports rollups up to date. By default refreshes the days of products '
+            'changed recently, which catches bulk updates and imports that send no signals. '
+            'With --rebuild, recomputes every day in a range.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=25,
+                            help='Refresh days with products changed in this many hours (default 25).')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every day from --start to --end instead.')
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='First day to rebuild, YYYY-MM-DD (default: 365 days before --end).')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Last day to rebuild, YYYY-MM-DD (default: today).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            end = options['end'] or timezone.localdate()
+            start = options['start'] or end - timedelta(days=365)
+            if start > end:
+                raise CommandError('--start cannot be after --end.')
+            days = (end - start).days + 1
+            daily, monthly = rebuild(start, end)
+        else:
+            found = changed_days(timezone.now() - timedelta(hours=options['hours']))
+            days = len(found)
+            daily, monthly = refresh_days(found)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Refreshed {days} days: {daily} daily and {monthly} monthly rollup rows in {elapsed:.2f}s'
+        )
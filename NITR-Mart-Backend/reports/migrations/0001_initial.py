@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyListingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('Electronics', 'Electronics'), ('Books & Study Materials', 'Books & Study Materials'), ('Hostel Essentials', 'Hostel Essentials'), ('Furniture', 'Furniture'), ('Sports & Fitness', 'Sports & Fitness'), ('Cycle & Transport', 'Cycle & Transport'), ('Room Decor', 'Room Decor'), ('Lab Equipment', 'Lab Equipment'), ('Others', 'Others')], max_length=50)),
+                ('branch', models.CharField(blank=True, max_length=50)),
+                ('listed', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('sellers', models.PositiveIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('price_histogram', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'daily listing stats',
+                'ordering': ['day', 'category', 'branch'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'category', 'branch'), name='daily_listing_stats_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySellerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month.')),
+                ('branch', models.CharField(blank=True, max_length=50)),
+                ('year', models.CharField(blank=True, max_length=10)),
+                ('active_sellers', models.PositiveIntegerField(default=0)),
+                ('listed', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'monthly seller stats',
+                'ordering': ['month', 'branch', 'year'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'branch', 'year'), name='monthly_seller_stats_key')],
+            },
+        ),
+    ]
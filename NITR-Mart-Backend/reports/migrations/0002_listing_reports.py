@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_posted_idx'),
+        ('reports', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationItem',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='moderation_item', serialize=False, to='products.product')),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('reasons', models.JSONField(default=dict)),
+                ('first_report_at', models.DateTimeField()),
+                ('latest_report_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-report_count', '-latest_report_at', '-product_id'],
+                'indexes': [models.Index(fields=['-report_count', '-latest_report_at', '-product'], name='moderation_queue_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('fraud', 'Fraud or scam'), ('spam', 'Spam or repeated listing'), ('prohibited', 'Prohibited item'), ('misleading', 'Misleading description or price'), ('other', 'Other')], max_length=20)),
+                ('details', models.TextField(blank=True, max_length=1000)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Dismissed'), ('actioned', 'Listing removed'), ('closed', 'Listing deleted by seller')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listing_reports', to='products.product')),
+                ('reporter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listing_reports', to=settings.AUTH_USER_MODEL)),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['product', 'status'], name='listing_report_product_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'open')), fields=('product', 'reporter'), name='listing_report_open_once')],
+            },
+        ),
+    ]
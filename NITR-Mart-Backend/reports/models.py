@@ -1,3 +1,137 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from products.models import CATEGORIES
+
+
+class DailyListingStats(models.Model):
+    """
+    Listings posted on one day in one category by sellers of one branch.
+    ``sold`` counts those listings that have since been sold, so
+    sold / listed is the sell-through rate of that day's listings.
+    Maintained by reports/rollups.py; never edited by hand.
+    """
+    day = models.DateField()
+    category = models.CharField(max_length=50, choices=CATEGORIES)
+    # Empty for sellers without a branch (faculty).
+    branch = models.CharField(max_length=50, blank=True)
+    listed = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    sellers = models.PositiveIntegerField(default=0)
+    price_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sparse log-scale price histogram ({bin: count}, see rollups.price_bin),
+    # so medians can be taken over any range of days.
+    price_histogram = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day', 'category', 'branch']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'branch'], name='daily_listing_stats_key'),
+        ]
+        verbose_name_plural = 'daily listing stats'
+
+    def __str__(self):
+        return f"{self.day} {self.category} {self.branch or '-'}: {self.listed} listed"
+
+
+class MonthlySellerStats(models.Model):
+    """Sellers who posted at least one listing in a month, by branch and year"""
+    month = models.DateField(help_text='First day of the month.')
+    branch = models.CharField(max_length=50, blank=True)
+    year = models.CharField(max_length=10, blank=True)
+    active_sellers = models.PositiveIntegerField(default=0)
+    listed = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['month', 'branch', 'year']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'branch', 'year'], name='monthly_seller_stats_key'),
+        ]
+        verbose_name_plural = 'monthly seller stats'
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.branch or '-'} {self.year or '-'}: {self.active_sellers} sellers"
+
+
+class ListingReport(models.Model):
+    """A user's report that a listing is fraudulent or breaks the rules"""
+    REASON_FRAUD = 'fraud'
+    REASON_SPAM = 'spam'
+    REASON_PROHIBITED = 'prohibited'
+    REASON_MISLEADING = 'misleading'
+    REASON_OTHER = 'other'
+    REASON_CHOICES = [
+        (REASON_FRAUD, 'Fraud or scam'),
+        (REASON_SPAM, 'Spam or repeated listing'),
+        (REASON_PROHIBITED, 'Prohibited item'),
+        (REASON_MISLEADING, 'Misleading description or price'),
+        (REASON_OTHER, 'Other'),
+    ]
+
+    STATUS_OPEN = 'open'
+    STATUS_DISMISSED = 'dismissed'
+    STATUS_ACTIONED = 'actioned'
+    STATUS_CLOSED = 'closed'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_DISMISSED, 'Dismissed'),
+        (STATUS_ACTIONED, 'Listing removed'),
+        (STATUS_CLOSED, 'Listing deleted by seller'),
+    ]
+
+    # Kept when the listing is removed, as a record of the moderation.
+    product = models.ForeignKey(
+        'products.Product', on_delete=models.SET_NULL, null=True, blank=True, related_name='listing_reports'
+    )
+    reporter = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='listing_reports')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    details = models.TextField(blank=True, max_length=1000)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    resolved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # One open report per user and listing, however often they press the button.
+            models.UniqueConstraint(
+                fields=['product', 'reporter'], condition=models.Q(status='open'), name='listing_report_open_once'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'status'], name='listing_report_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"Report on product {self.product_id} by {self.reporter_id} ({self.status})"
+
+
+class ModerationItem(models.Model):
+    """
+    A listing with open reports, waiting for a moderator. The counters are
+    kept next to the reports (reports/moderation.py) so the queue is read
+    straight off ``moderation_queue_idx`` instead of grouping the reports
+    on every request. Resolving the listing deletes its item.
+    """
+    product = models.OneToOneField(
+        'products.Product', on_delete=models.CASCADE, primary_key=True, related_name='moderation_item'
+    )
+    report_count = models.PositiveIntegerField(default=0)
+    # Open reports per reason, e.g. {"fraud": 3, "spam": 1}.
+    reasons = models.JSONField(default=dict)
+    first_report_at = models.DateTimeField()
+    latest_report_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-report_count', '-latest_report_at', '-product_id']
+        indexes = [
+            models.Index(fields=['-report_count', '-latest_report_at', '-product'], name='moderation_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id}: {self.report_count} open reports"
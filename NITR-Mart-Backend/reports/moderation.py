@@ -0,0 +1,81 @@
+"""
+Listing reports and the moderation queue.
+
+Filing a report updates its listing's ModerationItem in the same
+transaction: the total, the count per reason and the time of the latest
+report. A queue page is then one scan of ``moderation_queue_idx``, whose
+cost does not grow however many reports a spam wave piles up. Grouping the
+reports on every request does (see benchmarks/moderation_queue.py). Moderators resolve
+listings in bulk. The open reports of all of them are closed with one
+UPDATE and their items removed with one DELETE.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from products import bulk
+from .models import ListingReport, ModerationItem
+
+DISMISS = 'dismiss'
+REMOVE = 'remove'
+ACTIONS = (DISMISS, REMOVE)
+
+# Per-listing outcomes.
+RESOLVED = 'resolved'
+NOT_FOUND = 'not_found'
+
+
+def file_report(reporter, product, reason, details=''):
+    """
+    Record a report and queue the listing for moderation. Raises
+    IntegrityError if ``reporter`` already has an open report on it.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # The item row is locked before the report is written, so a bulk
+        # resolve running at the same time cannot leave a report behind
+        # without an item, and concurrent reports cannot lose a count.
+        item = ModerationItem.objects.select_for_update().filter(product=product).first()
+        if item is None:
+            try:
+                with transaction.atomic():
+                    item = ModerationItem.objects.create(
+                        product=product, first_report_at=now, latest_report_at=now
+                    )
+            except IntegrityError:
+                # Another report created the item first.
+                item = ModerationItem.objects.select_for_update().get(product=product)
+        item.report_count += 1
+        item.reasons[reason] = item.reasons.get(reason, 0) + 1
+        item.latest_report_at = now
+        item.save(update_fields=['report_count', 'reasons', 'latest_report_at'])
+        return ListingReport.objects.create(product=product, reporter=reporter, reason=reason, details=details)
+
+
+def resolve(moderator, action, product_ids):
+    """
+    Close every open report on the given listings: DISMISS keeps the
+    listings, REMOVE deletes them. Returns one ``{'id', 'status'}`` result
+    per distinct id, in request order.
+    """
+    ids = list(dict.fromkeys(product_ids))
+    status = ListingReport.STATUS_DISMISSED if action == DISMISS else ListingReport.STATUS_ACTIONED
+    with transaction.atomic():
+        found = set(
+            ModerationItem.objects.select_for_update().filter(product_id__in=ids).order_by()
+            .values_list('product_id', flat=True)
+        )
+        if found:
+            ListingReport.objects.filter(product_id__in=found, status=ListingReport.STATUS_OPEN).update(
+                status=status, resolved_at=timezone.now(), resolved_by=moderator
+            )
+            ModerationItem.objects.filter(product_id__in=found).delete()
+            if action == REMOVE:
+                bulk.apply(moderator, bulk.DELETE, found)
+    return [{'id': pk, 'status': RESOLVED if pk in found else NOT_FOUND} for pk in ids]
+
+
+def close_reports(product):
+    """Close the open reports of a listing its seller deleted"""
+    ListingReport.objects.filter(product=product, status=ListingReport.STATUS_OPEN).update(
+        status=ListingReport.STATUS_CLOSED, resolved_at=timezone.now()
+    )
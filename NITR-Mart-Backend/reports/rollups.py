@@ -0,0 +1,463 @@
+"""
+Pre-aggregated marketplace metrics.
+
+Each product counts towards one ``DailyListingStats`` row: the local day it
+was posted, its category and its seller's branch. Saves and deletes move the
+rows by the difference between the listing as it was counted and as it is
+now (``record``, called from reports/signals.py): counters change by F()
+updates and only the price histogram needs its row locked. Seller counts
+are the one value a delta cannot give, so they are recounted for just the
+sellers whose listings enter or leave a group. The refresh_reports command
+catches writes that skip signals, such as imports, and rebuilds whole
+ranges. The report endpoints only read the rollups.
+
+A rebuild reads each product once as a plain tuple and accumulates every
+group in the same pass. Seller counts per month are a single GROUP BY in
+the database. A year of listings rebuilds in seconds (see
+benchmarks/reports_rebuild.py).
+
+Prices go into a sparse histogram with bins ``RATIO`` wide, so the median
+over any set of rows comes from merged histograms. It is accurate to within
+half a bin, about 2.5%.
+"""
+import math
+import threading
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate, TruncMonth
+from django.utils import timezone
+
+from products.models import Product
+from .models import DailyListingStats, MonthlySellerStats
+
+RATIO = 1.05
+_LOG_RATIO = math.log(RATIO)
+CENTS = Decimal('0.01')
+
+DAILY_KEY = ('day', 'category', 'branch')
+DAILY_VALUES = ('listed', 'sold', 'sellers', 'price_total', 'price_histogram', 'refreshed_at')
+MONTHLY_KEY = ('month', 'branch', 'year')
+MONTHLY_VALUES = ('active_sellers', 'listed', 'refreshed_at')
+
+
+def price_bin(price):
+    """Histogram bin of a price: 0 below 1, otherwise floor(log(price) / log(RATIO)) + 1"""
+    price = float(price)
+    if price < 1:
+        return 0
+    return int(math.log(price) / _LOG_RATIO) + 1
+
+
+def bin_price(index):
+    """Price standing for a bin: the geometric middle of its bounds"""
+    if index == 0:
+        return Decimal('0.00')
+    return Decimal(RATIO ** (index - 0.5)).quantize(CENTS)
+
+
+def merge_histograms(histograms):
+    merged = {}
+    for histogram in histograms:
+        for index, count in histogram.items():
+            merged[int(index)] = merged.get(int(index), 0) + count
+    return merged
+
+
+def histogram_median(histogram):
+    """Approximate median of a merged histogram, or None when it is empty"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    # The two middle positions; they are the same one for an odd count.
+    wanted = [(total - 1) // 2, total // 2]
+    found = []
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        while wanted and wanted[0] < seen:
+            wanted.pop(0)
+            found.append(bin_price(index))
+    return ((found[0] + found[1]) / 2).quantize(CENTS)
+
+
+def day_bounds(day):
+    """Aware start and end of a local day"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _spans(days, step):
+    """Merge sorted days into [first, after_last) spans of consecutive ``step`` units"""
+    spans = []
+    for day in sorted(days):
+        if spans and spans[-1][1] == day:
+            spans[-1][1] = step(day)
+        else:
+            spans.append([day, step(day)])
+    return spans
+
+
+def _posted_in(spans):
+    condition = Q()
+    for first, after in spans:
+        condition |= Q(posted_at__gte=day_bounds(first)[0], posted_at__lt=day_bounds(after)[0])
+    return condition
+
+
+def _key_in(field, spans):
+    condition = Q()
+    for first, after in spans:
+        condition |= Q(**{f'{field}__gte': first, f'{field}__lt': after})
+    return condition
+
+
+def build_daily(products):
+    """Unsaved DailyListingStats for a queryset of products"""
+    groups = {}
+    sellers = {}
+    days = {}
+    rows = products.order_by().values_list('posted_at', 'category', 'price', 'is_sold', 'seller_id', 'seller__branch')
+    for posted_at, category, price, is_sold, seller_id, branch in rows.iterator(chunk_size=5000):
+        # Time zone offsets are whole quarter hours, so every timestamp in
+        # the same UTC quarter hour falls on the same local day.
+        quarter = posted_at.replace(minute=posted_at.minute // 15 * 15, second=0, microsecond=0)
+        day = days.get(quarter)
+        if day is None:
+            day = days[quarter] = timezone.localdate(posted_at)
+        key = (day, category, branch or '')
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = DailyListingStats(
+                day=day, category=category, branch=key[2], price_total=Decimal(0), price_histogram={}
+            )
+            sellers[key] = set()
+        stats.listed += 1
+        stats.sold += is_sold
+        stats.price_total += price
+        index = price_bin(price)
+        stats.price_histogram[index] = stats.price_histogram.get(index, 0) + 1
+        sellers[key].add(seller_id)
+    for key, stats in groups.items():
+        stats.sellers = len(sellers[key])
+    return list(groups.values())
+
+
+def build_monthly(products):
+    """Unsaved MonthlySellerStats for a queryset of products"""
+    rows = (
+        products.order_by()
+        .annotate(month=TruncMonth('posted_at'))
+        .values('month', 'seller__branch', 'seller__year')
+        .annotate(active_sellers=Count('seller', distinct=True), listed=Count('id'))
+    )
+    return [
+        MonthlySellerStats(
+            month=timezone.localtime(row['month']).date(),
+            branch=row['seller__branch'] or '',
+            year=row['seller__year'] or '',
+            active_sellers=row['active_sellers'],
+            listed=row['listed'],
+        )
+        for row in rows
+    ]
+
+
+def _replace(model, scope, rows, key, values):
+    """Upsert ``rows`` and delete the rows in ``scope`` they no longer cover"""
+    model.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, unique_fields=key, update_fields=values
+    )
+    kept = {tuple(getattr(row, field) for field in key) for row in rows}
+    stale = [
+        pk for pk, *row_key in model.objects.filter(scope).values_list('pk', *key)
+        if tuple(row_key) not in kept
+    ]
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+
+
+def refresh_days(days):
+    """
+    Rebuild the rollups of the given local days, and the seller counts of
+    the months they fall in. Returns (daily rows, monthly rows) written.
+    """
+    days = set(days)
+    if not days:
+        return 0, 0
+    day_spans = _spans(days, lambda day: day + timedelta(days=1))
+    month_spans = _spans({month_start(day) for day in days}, next_month)
+    with transaction.atomic():
+        daily = build_daily(Product.objects.filter(_posted_in(day_spans)))
+        _replace(DailyListingStats, _key_in('day', day_spans), daily, DAILY_KEY, DAILY_VALUES)
+        monthly = build_monthly(Product.objects.filter(_posted_in(month_spans)))
+        _replace(MonthlySellerStats, _key_in('month', month_spans), monthly, MONTHLY_KEY, MONTHLY_VALUES)
+    return len(daily), len(monthly)
+
+
+def rebuild(start, end):
+    """Rebuild every rollup from ``start`` to ``end`` inclusive"""
+    return refresh_days(start + timedelta(days=offset) for offset in range((end - start).days + 1))
+
+
+def changed_days(since):
+    """Local posting days of the products changed since ``since``"""
+    posted = Product.objects.filter(updated_at__gte=since).order_by().values_list('posted_at', flat=True)
+    return {timezone.localdate(posted_at) for posted_at in posted.iterator(chunk_size=5000)}
+
+
+# A listing as the rollups count it. ``group`` is the seller's (branch, year)
+# when it differs from the one stored now, as for a seller who just moved.
+Listing = namedtuple('Listing', ['day', 'category', 'price', 'is_sold', 'seller_id', 'group'])
+
+
+def listing(product, **values):
+    """The Listing of a product, with ``values`` standing in for its fields"""
+    for field in ('category', 'price', 'is_sold', 'seller_id'):
+        if field not in values:
+            values[field] = getattr(product, field)
+    if 'day' not in values:
+        values['day'] = timezone.localdate(product.posted_at)
+    values.setdefault('group', None)
+    return Listing(**values)
+
+
+class _DailyDelta:
+    def __init__(self):
+        self.listed = self.sold = self.sellers = 0
+        self.price_total = Decimal(0)
+        self.histogram = Counter()
+
+
+class Changes:
+    """Listings leaving and joining the rollups, applied together"""
+
+    def __init__(self):
+        self.entries = []
+        self.groups = {}
+
+    def record(self, before, after, groups=None):
+        """
+        Count ``before`` out and ``after`` in; either may be None for a
+        listing that is new or gone. ``groups`` maps seller ids to their
+        current (branch, year) where the caller already has them.
+        """
+        if before == after:
+            return
+        self.entries.extend((sign, item) for sign, item in ((-1, before), (1, after)) if item is not None)
+        self.groups.update(groups or {})
+
+    def apply(self):
+        if not self.entries:
+            return
+        missing = {item.seller_id for _, item in self.entries if item.group is None} - self.groups.keys()
+        if missing:
+            users = get_user_model().objects.filter(pk__in=missing).values_list('pk', 'branch', 'year')
+            self.groups.update((pk, (branch, year)) for pk, branch, year in users)
+
+        daily = {}
+        monthly = {}
+        presence = Counter()
+        for sign, item in self.entries:
+            branch, year = item.group or self.groups.get(item.seller_id, (None, None))
+            daily_key = (item.day, item.category, branch or '')
+            monthly_key = (month_start(item.day), branch or '', year or '')
+            stats = daily.setdefault(daily_key, _DailyDelta())
+            stats.listed += sign
+            stats.sold += sign * item.is_sold
+            stats.price_total += sign * item.price
+            stats.histogram[price_bin(item.price)] += sign
+            monthly.setdefault(monthly_key, Counter())['listed'] += sign
+            presence[daily_key, monthly_key, item.seller_id] += sign
+        self._count_sellers(daily, monthly, presence)
+
+        with transaction.atomic(savepoint=False):
+            for key in sorted(daily):
+                _add_daily(key, daily[key])
+            for key in sorted(monthly):
+                _add_monthly(key, monthly[key]['active_sellers'], monthly[key]['listed'])
+
+    def _count_sellers(self, daily, monthly, presence):
+        """
+        A group gains a seller when their first listing joins it and loses
+        one when their last listing leaves, so compare what each seller has
+        in the group now with what they had before these changes.
+        """
+        moved = {key: net for key, net in presence.items() if net}
+        if not moved:
+            return
+        sellers = {seller_id for _, _, seller_id in moved}
+        months = {monthly_key[0] for _, monthly_key, _ in moved}
+        rows = (
+            Product.objects.filter(_posted_in(_spans(months, next_month)), seller_id__in=sellers)
+            .order_by()
+            .annotate(day=TruncDate('posted_at'))
+            .values_list('seller_id', 'day', 'category')
+            .annotate(count=Count('id'))
+        )
+        now_daily = Counter()
+        now_monthly = Counter()
+        for seller_id, day, category, count in rows:
+            branch, year = self.groups.get(seller_id, (None, None))
+            now_daily[day, category, branch or '', seller_id] += count
+            now_monthly[month_start(day), branch or '', year or '', seller_id] += count
+
+        net_daily = Counter()
+        net_monthly = Counter()
+        for (daily_key, monthly_key, seller_id), net in moved.items():
+            net_daily[daily_key, seller_id] += net
+            net_monthly[monthly_key, seller_id] += net
+        for (daily_key, seller_id), net in net_daily.items():
+            after = now_daily[(*daily_key, seller_id)]
+            daily[daily_key].sellers += (after > 0) - (after - net > 0)
+        for (monthly_key, seller_id), net in net_monthly.items():
+            after = now_monthly[(*monthly_key, seller_id)]
+            monthly[monthly_key]['active_sellers'] += (after > 0) - (after - net > 0)
+
+
+def _plus(field, delta):
+    # Never below zero, should a row have been built before writes that
+    # skipped the signals.
+    return Greatest(F(field) + delta, 0) if delta < 0 else F(field) + delta
+
+
+def _changes(**deltas):
+    """update() arguments for the counters that move"""
+    values = {field: _plus(field, delta) for field, delta in deltas.items() if delta}
+    values['refreshed_at'] = timezone.now()
+    return values
+
+
+def _add_daily(key, delta):
+    histogram = {index: count for index, count in delta.histogram.items() if count}
+    if not (histogram or delta.sold or delta.sellers or delta.price_total):
+        return
+    rows = DailyListingStats.objects.filter(day=key[0], category=key[1], branch=key[2])
+    values = _changes(listed=delta.listed, sold=delta.sold, sellers=delta.sellers)
+    if delta.price_total:
+        values['price_total'] = F('price_total') + delta.price_total
+    if not histogram:
+        rows.update(**values)
+        return
+
+    # The histogram is the one value without an F() update, so lock the row.
+    row = rows.select_for_update().only('listed', 'price_histogram').first()
+    if row is None:
+        if delta.listed <= 0:
+            # Never built for this day; refresh_reports will.
+            return
+        try:
+            with transaction.atomic():
+                DailyListingStats.objects.create(
+                    day=key[0], category=key[1], branch=key[2], listed=delta.listed, sold=max(delta.sold, 0),
+                    sellers=max(delta.sellers, 0), price_total=delta.price_total, price_histogram=histogram,
+                )
+            return
+        except IntegrityError:
+            # Another transaction added it first.
+            row = rows.select_for_update().only('listed', 'price_histogram').get()
+    if row.listed + delta.listed <= 0:
+        rows.delete()
+        return
+    merged = merge_histograms([row.price_histogram, histogram])
+    rows.update(price_histogram={index: count for index, count in merged.items() if count > 0}, **values)
+
+
+def _add_monthly(key, active_sellers, listed):
+    if not (active_sellers or listed):
+        return
+    rows = MonthlySellerStats.objects.filter(month=key[0], branch=key[1], year=key[2])
+    values = _changes(active_sellers=active_sellers, listed=listed)
+    if rows.update(**values):
+        if listed < 0:
+            rows.filter(listed=0).delete()
+        return
+    if listed <= 0:
+        return
+    try:
+        with transaction.atomic():
+            MonthlySellerStats.objects.create(
+                month=key[0], branch=key[1], year=key[2], active_sellers=max(active_sellers, 0), listed=listed
+            )
+    except IntegrityError:
+        rows.update(**values)
+
+
+_batch = threading.local()
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the changes recorded inside the block and apply them together
+    when it exits without an error. Nested blocks join the outermost one.
+    """
+    if getattr(_batch, 'changes', None) is not None:
+        yield _batch.changes
+        return
+    _batch.changes = changes = Changes()
+    try:
+        yield changes
+    finally:
+        _batch.changes = None
+    changes.apply()
+
+
+def record(before, after, groups=None):
+    """Move the rollups from ``before`` to ``after`` (see Changes.record)"""
+    changes = getattr(_batch, 'changes', None)
+    if changes is not None:
+        changes.record(before, after, groups)
+        return
+    changes = Changes()
+    changes.record(before, after, groups)
+    changes.apply()
+
+
+def summarize(rollups, field):
+    """
+    Totals of DailyListingStats rows per value of ``field`` ('category' or
+    'branch'), most listed first.
+    """
+    groups = {}
+    rows = rollups.values_list(field, 'listed', 'sold', 'price_total', 'price_histogram')
+    for value, listed, sold, price_total, histogram in rows:
+        group = groups.setdefault(value, {'listed': 0, 'sold': 0, 'price_total': Decimal(0), 'histograms': []})
+        group['listed'] += listed
+        group['sold'] += sold
+        group['price_total'] += price_total
+        group['histograms'].append(histogram)
+
+    results = []
+    for value, group in groups.items():
+        listed = group['listed']
+        median = histogram_median(merge_histograms(group['histograms']))
+        results.append({
+            field: value or None,
+            'listed': listed,
+            'sold': group['sold'],
+            'sell_through': round(group['sold'] / listed, 4) if listed else None,
+            'average_price': str((group['price_total'] / listed).quantize(CENTS)) if listed else None,
+            'median_price': str(median) if median is not None else None,
+        })
+    results.sort(key=lambda result: (-result['listed'], result[field] or ''))
+    return results
+
+
+def daily_series(rollups):
+    """Listings posted and since sold per day, for days with any listings"""
+    rows = rollups.order_by('day').values('day').annotate(listed=Sum('listed'), sold=Sum('sold'))
+    return [{'day': row['day'], 'listed': row['listed'], 'sold': row['sold']} for row in rows]
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import serializers
+
+from products.models import CATEGORIES
+from . import moderation
+from .models import ListingReport, ModerationItem
+from .moderation import file_report
+
+
+def get_max_days():
+    return getattr(settings, 'REPORTS_MAX_DAYS', 731)
+
+
+class ReportFilterSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by the reports. Defaults to the last 30 days."""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.ChoiceField(choices=CATEGORIES, required=False)
+    branch = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    def validate(self, data):
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({'start': 'start cannot be after end.'})
+        if (end - start).days >= get_max_days():
+            raise serializers.ValidationError({'start': f'Reports cover at most {get_max_days()} days.'})
+        data['start'] = start
+        data['end'] = end
+        return data
+
+
+class ListingReportSerializer(serializers.ModelSerializer):
+    """A report filed by the signed-in user"""
+
+    class Meta:
+        model = ListingReport
+        fields = ['id', 'product', 'reason', 'details', 'status', 'created_at']
+        read_only_fields = ['status', 'created_at']
+        extra_kwargs = {'product': {'required': True, 'allow_null': False}}
+
+    def validate_product(self, value):
+        if value.seller_id == self.context['request'].user.pk:
+            raise serializers.ValidationError('You cannot report your own listing.')
+        return value
+
+    def create(self, validated_data):
+        try:
+            return file_report(
+                self.context['request'].user,
+                validated_data['product'],
+                validated_data['reason'],
+                validated_data.get('details', ''),
+            )
+        except IntegrityError:
+            raise serializers.ValidationError({'product': ['You have already reported this listing.']})
+
+
+class ModerationItemSerializer(serializers.ModelSerializer):
+    """A queued listing with its open report counts"""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    title = serializers.CharField(source='product.title', read_only=True)
+    price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    category = serializers.CharField(source='product.category', read_only=True)
+    is_sold = serializers.BooleanField(source='product.is_sold', read_only=True)
+    seller = serializers.EmailField(source='product.seller.email', read_only=True)
+
+    class Meta:
+        model = ModerationItem
+        fields = [
+            'id', 'title', 'price', 'category', 'is_sold', 'seller',
+            'report_count', 'reasons', 'first_report_at', 'latest_report_at',
+        ]
+
+
+class ModerationReportSerializer(serializers.ModelSerializer):
+    """An open report as moderators see it"""
+    reporter = serializers.EmailField(source='reporter.email', read_only=True)
+
+    class Meta:
+        model = ListingReport
+        fields = ['id', 'reporter', 'reason', 'details', 'created_at']
+
+
+class ModerationResolveSerializer(serializers.Serializer):
+    """Resolve the reports of many listings at once"""
+    action = serializers.ChoiceField(choices=moderation.ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        limit = getattr(settings, 'MODERATION_BULK_MAX_ITEMS', 500)
+        if len(set(value)) > limit:
+            raise serializers.ValidationError(f'At most {limit} listings per request.')
+        return value
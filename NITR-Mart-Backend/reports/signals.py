@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products import bulk
+from products.models import Product
+from . import rollups
+from .moderation import close_reports
+
+# Saves that change none of these leave the rollups as they were.
+ROLLUP_FIELDS = {'category', 'price', 'is_sold', 'seller', 'seller_id'}
+
+
+def _moves_rollups(update_fields):
+    return update_fields is None or bool(ROLLUP_FIELDS & set(update_fields))
+
+
+def _seller_groups(product):
+    """{seller id: (branch, year)} if the product already holds its loaded seller"""
+    if Product.seller.is_cached(product):
+        seller = vars(product.seller)
+        if 'branch' in seller and 'year' in seller:
+            return {product.seller_id: (seller['branch'], seller['year'])}
+    return None
+
+
+def counted(product):
+    """The product as the rollups last counted it, reading the row if need be"""
+    listing = getattr(product, '_rollup_listing', None)
+    if listing is not None:
+        return listing
+    loaded = {
+        'category': getattr(product, '_loaded_category', None),
+        'price': getattr(product, '_loaded_price', None),
+        'is_sold': getattr(product, '_loaded_is_sold', None),
+        'seller_id': getattr(product, '_loaded_seller_id', None),
+    }
+    if None not in loaded.values():
+        return rollups.listing(product, **loaded)
+    row = Product.objects.filter(pk=product.pk).values('posted_at', *loaded).first()
+    if row is None:
+        return None
+    return rollups.Listing(timezone.localdate(row.pop('posted_at')), group=None, **row)
+
+
+@receiver(pre_save, sender=Product)
+def remember_counted_product(sender, instance, update_fields=None, **kwargs):
+    # Before the product receivers update the _loaded_ values after the save.
+    if not instance._state.adding and _moves_rollups(update_fields):
+        instance._rollup_before = counted(instance)
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, update_fields=None, **kwargs):
+    if not _moves_rollups(update_fields):
+        return
+    before = None if created else instance.__dict__.pop('_rollup_before', None)
+    if update_fields is None or before is None:
+        after = rollups.listing(instance)
+    else:
+        # Fields left out of the save keep their stored values.
+        saved = set(update_fields)
+        if 'seller' in saved:
+            saved.add('seller_id')
+        after = before._replace(
+            group=None, **{field: getattr(instance, field) for field in before._fields if field in saved}
+        )
+    rollups.record(before, after, _seller_groups(instance))
+    instance._rollup_listing = after
+
+
+@receiver(bulk.products_updated, sender=Product)
+def count_bulk_updated_products(sender, products, **kwargs):
+    with rollups.deferred():
+        for product in products:
+            after = rollups.listing(product)
+            rollups.record(counted(product), after)
+            product._rollup_listing = after
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    rollups.record(counted(instance), None)
+
+
+def _regroups(update_fields):
+    return update_fields is None or bool({'branch', 'year'} & set(update_fields))
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_seller_group(sender, instance, update_fields=None, **kwargs):
+    # Users loaded from the database or created here already know it.
+    if instance._state.adding or hasattr(instance, '_loaded_group') or not _regroups(update_fields):
+        return
+    instance._loaded_group = sender.objects.filter(pk=instance.pk).values_list('branch', 'year').first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def regroup_moved_seller(sender, instance, created, update_fields=None, **kwargs):
+    """A seller who changes branch or year takes their listings to the new group"""
+    group = (instance.branch, instance.year)
+    if created or not _regroups(update_fields):
+        instance._loaded_group = group
+        return
+    old = getattr(instance, '_loaded_group', None)
+    instance._loaded_group = group
+    if old is None or tuple(old) == group:
+        return
+    listings = Product.objects.filter(seller=instance).order_by().only('posted_at', 'category', 'price', 'is_sold')
+    with rollups.deferred():
+        for product in listings:
+            now = rollups.listing(product, seller_id=instance.pk)
+            rollups.record(now._replace(group=old), now, {instance.pk: group})
+
+
+@receiver(pre_delete, sender=Product)
+def close_listing_reports(sender, instance, **kwargs):
+    # Before the reports lose their product to SET_NULL.
+    close_reports(instance)
@@ -1,3 +1,406 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from nitrmart.throttling import get_bucket_store
+from products import bulk
+from products.models import Product, ProductTombstone
+from products.tests import ProductTestCase, make_products, make_user
+from .models import DailyListingStats, ListingReport, ModerationItem, MonthlySellerStats
+from .rollups import histogram_median, merge_histograms, price_bin, rebuild, refresh_days
+
+
+def posted(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+
+def make_listing(seller, day, price, category='Electronics', is_sold=False):
+    # Written without signals, as an import would be, so only rebuilds count it.
+    [product] = Product.objects.bulk_create([
+        Product(title='Listing', description='x', price=price, category=category, seller=seller, is_sold=is_sold)
+    ])
+    # posted_at is auto_now_add, so backdate it afterwards.
+    Product.objects.filter(pk=product.pk).update(posted_at=posted(day))
+    return product
+
+
+class HistogramTests(ProductTestCase):
+    def test_median_is_within_half_a_bin(self):
+        prices = [Decimal(price) for price in (40, 95, 100, 250, 999, 1200, 15000)]
+        histogram = merge_histograms([{str(price_bin(price)): 1} for price in prices])
+        self.assertAlmostEqual(float(histogram_median(histogram)), 250, delta=250 * 0.025)
+
+        histogram = merge_histograms([{price_bin(100): 1}, {price_bin(300): 1}])
+        self.assertAlmostEqual(float(histogram_median(histogram)), 200, delta=200 * 0.025)
+        self.assertEqual(histogram_median({price_bin(0): 3}), Decimal('0.00'))
+        self.assertIsNone(histogram_median({}))
+
+
+class RollupTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cse = make_user(0)
+        self.ece = make_user(1, branch='ECE', year='2nd')
+        self.faculty = make_user(2, role='faculty', year=None, branch=None, roll_no=None, department='Physics')
+        self.day = date(2025, 3, 10)
+
+    def test_rebuild_groups_by_day_category_and_branch(self):
+        make_listing(self.cse, self.day, 100)
+        make_listing(self.cse, self.day, 300, is_sold=True)
+        make_listing(self.ece, self.day, 500)
+        make_listing(self.faculty, self.day, 50, category='Lab Equipment')
+        make_listing(self.cse, self.day + timedelta(days=1), 80, category='Furniture')
+
+        daily, monthly = rebuild(self.day, self.day + timedelta(days=1))
+        self.assertEqual((daily, monthly), (4, 3))
+        cse = DailyListingStats.objects.get(day=self.day, category='Electronics', branch='CSE')
+        self.assertEqual((cse.listed, cse.sold, cse.sellers, cse.price_total), (2, 1, 1, Decimal('400.00')))
+        self.assertTrue(DailyListingStats.objects.filter(day=self.day, category='Lab Equipment', branch='').exists())
+
+        sellers = MonthlySellerStats.objects.get(month=date(2025, 3, 1), branch='CSE', year='3rd')
+        self.assertEqual((sellers.active_sellers, sellers.listed), (1, 3))
+
+    def test_rows_follow_local_days(self):
+        # 02:00 in Asia/Kolkata is still the previous day in UTC.
+        product = make_listing(self.cse, self.day, 100)
+        Product.objects.filter(pk=product.pk).update(posted_at=posted(self.day, hour=2))
+        self.assertEqual(Product.objects.get(pk=product.pk).posted_at.astimezone(dt_timezone.utc).day, 9)
+        rebuild(self.day - timedelta(days=1), self.day + timedelta(days=1))
+        self.assertEqual(list(DailyListingStats.objects.values_list('day', flat=True)), [self.day])
+
+    def test_refresh_drops_emptied_groups(self):
+        product = make_listing(self.cse, self.day, 100)
+        refresh_days({self.day})
+        Product.objects.filter(pk=product.pk).update(category='Furniture')
+        refresh_days({self.day})
+        self.assertEqual(
+            list(DailyListingStats.objects.values_list('category', 'listed')), [('Furniture', 1)]
+        )
+        Product.objects.filter(pk=product.pk).delete()
+        refresh_days({self.day})
+        self.assertFalse(DailyListingStats.objects.exists())
+        self.assertFalse(MonthlySellerStats.objects.exists())
+
+    def test_signals_refresh_on_commit(self):
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                title='Lamp', description='x', price=200, category='Room Decor', seller=self.cse
+            )
+        stats = DailyListingStats.objects.get(day=today)
+        self.assertEqual((stats.category, stats.listed, stats.sold), ('Room Decor', 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.is_sold = True
+            product.save()
+        self.assertEqual(DailyListingStats.objects.get(day=today).sold, 1)
+
+        # A seller moving branch takes their listings along.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cse.branch = 'MECH'
+            self.cse.save()
+        self.assertEqual(DailyListingStats.objects.get(day=today).branch, 'MECH')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse(DailyListingStats.objects.exists())
+
+    def rollups(self):
+        daily = DailyListingStats.objects.values_list(
+            'day', 'category', 'branch', 'listed', 'sold', 'sellers', 'price_total', 'price_histogram'
+        )
+        monthly = MonthlySellerStats.objects.values_list('month', 'branch', 'year', 'active_sellers', 'listed')
+        return sorted(daily, key=str), sorted(monthly, key=str)
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        rebuild(self.day, timezone.localdate())
+        self.assertEqual(incremental, self.rollups())
+
+    def test_signals_move_rollups_by_deltas(self):
+        make_listing(self.cse, self.day, 100)
+        make_listing(self.cse, self.day, 300, is_sold=True)
+        make_listing(self.ece, self.day, 500)
+        make_listing(self.cse, self.day + timedelta(days=1), 80, category='Furniture')
+        rebuild(self.day, timezone.localdate())
+        first, sold, other = Product.objects.filter(posted_at__date=self.day).order_by('price')
+
+        steps = [
+            lambda: setattr(first, 'price', 120) or first.save(),
+            lambda: setattr(first, 'category', 'Furniture') or first.save(),
+            lambda: setattr(sold, 'is_sold', False) or sold.save(update_fields=['is_sold']),
+            lambda: setattr(other, 'seller', self.cse) or other.save(),
+            lambda: Product.objects.create(title='Lamp', description='x', price=40, seller=self.faculty),
+            lambda: first.delete(),
+            lambda: setattr(self.cse, 'year', '4th') or self.cse.save(),
+            lambda: setattr(self.cse, 'branch', 'ECE') or self.cse.save(),
+        ]
+        for number, step in enumerate(steps):
+            with self.subTest(step=number), self.captureOnCommitCallbacks(execute=True):
+                step()
+            self.assertMatchesRebuild()
+
+    def test_saves_cost_the_same_on_busy_days(self):
+        today = timezone.localdate()
+        for price in range(100, 130):
+            make_listing(self.cse, today, price)
+        rebuild(today, today)
+        product = Product.objects.order_by('price').first()
+
+        # Nothing the rollups count changed.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            product.description = 'Barely used'
+            product.save()
+        # The save, the seller's group and one F() update of the day's row.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(3):
+            product.is_sold = True
+            product.save()
+        # A new price also locks the row for its histogram.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(4):
+            product.price = 5000
+            product.save()
+        # A new listing recounts its seller's listings that month instead
+        # (the seller came with the product) and moves the month's row too.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(5):
+            Product.objects.create(title='Desk', description='x', price=900, category='Electronics', seller=self.cse)
+        stats = DailyListingStats.objects.get(day=today)
+        self.assertEqual((stats.listed, stats.sold, stats.sellers), (31, 1, 1))
+        self.assertEqual(MonthlySellerStats.objects.get().listed, 31)
+        self.assertMatchesRebuild()
+
+    def test_bulk_updates_move_rollups(self):
+        for offset in range(3):
+            make_listing(self.cse, self.day + timedelta(days=offset), 100 + offset)
+            make_listing(self.ece, self.day + timedelta(days=offset), 200 + offset)
+        rebuild(self.day, timezone.localdate())
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        staff = make_user(3, is_staff=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.apply(staff, bulk.MARK_SOLD, ids[:4])
+        self.assertEqual(DailyListingStats.objects.aggregate(sold=Sum('sold'))['sold'], 4)
+        self.assertMatchesRebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.apply(staff, bulk.REPRICE, ids[2:], {pk: Decimal('5000') for pk in ids[2:]})
+        self.assertMatchesRebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.apply(staff, bulk.DELETE, ids[::2])
+        self.assertMatchesRebuild()
+
+    def test_command_picks_up_writes_without_signals(self):
+        product = Product.objects.create(title='Desk', description='x', price=900, seller=self.cse)
+        refresh_days({timezone.localdate()})
+        Product.objects.filter(pk=product.pk).update(is_sold=True, updated_at=timezone.now())
+        self.assertEqual(DailyListingStats.objects.get().sold, 0)
+
+        out = StringIO()
+        call_command('refresh_reports', '--hours', '1', stdout=out)
+        self.assertIn('Refreshed 1 days: 1 daily and 1 monthly rollup rows', out.getvalue())
+        self.assertEqual(DailyListingStats.objects.get().sold, 1)
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        for offset in range(40):
+            day = self.day + timedelta(days=offset)
+            make_listing(self.cse, day, 100 + offset, is_sold=offset % 3 == 0)
+            make_listing(self.ece, day, 20 * offset, category='Books & Study Materials')
+        refresh_days({self.day + timedelta(days=offset) for offset in range(40)})
+        incremental = list(DailyListingStats.objects.values_list('day', 'category', 'branch', 'listed', 'sold'))
+
+        DailyListingStats.objects.all().delete()
+        out = StringIO()
+        call_command('refresh_reports', '--rebuild', '--start', '2025-03-01', '--end', '2025-04-30', stdout=out)
+        self.assertIn('Refreshed 61 days: 80 daily and 4 monthly rollup rows', out.getvalue())
+        rebuilt = list(DailyListingStats.objects.values_list('day', 'category', 'branch', 'listed', 'sold'))
+        self.assertEqual(rebuilt, incremental)
+
+
+class ReportEndpointTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user(9, is_staff=True)
+        self.cse = make_user(0)
+        self.ece = make_user(1, branch='ECE', year='2nd')
+        self.day = date(2025, 3, 10)
+        for price, is_sold in ((100, True), (200, False), (300, True), (400, False)):
+            make_listing(self.cse, self.day, price, is_sold=is_sold)
+        make_listing(self.ece, self.day + timedelta(days=1), 1000, category='Furniture')
+        make_listing(self.ece, self.day + timedelta(days=40), 500, category='Furniture')
+        rebuild(self.day, self.day + timedelta(days=40))
+        self.client.force_authenticate(self.admin)
+        self.params = {'start': '2025-03-01', 'end': '2025-03-31'}
+
+    def test_category_report(self):
+        response = self.client.get(reverse('reports:report-categories'), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['start'], date(2025, 3, 1))
+        electronics, furniture = response.data['results']
+        self.assertEqual(electronics['category'], 'Electronics')
+        self.assertEqual((electronics['listed'], electronics['sold'], electronics['sell_through']), (4, 2, 0.5))
+        self.assertEqual(electronics['average_price'], '250.00')
+        self.assertAlmostEqual(float(electronics['median_price']), 250, delta=250 * 0.025)
+        self.assertEqual((furniture['listed'], furniture['sell_through']), (1, 0.0))
+
+    def test_branch_and_daily_reports(self):
+        response = self.client.get(reverse('reports:report-branches'), {**self.params, 'category': 'Furniture'})
+        self.assertEqual([(row['branch'], row['listed']) for row in response.data['results']], [('ECE', 1)])
+
+        response = self.client.get(reverse('reports:report-daily'), self.params)
+        self.assertEqual(
+            [(row['day'], row['listed'], row['sold']) for row in response.data['results']],
+            [(self.day, 4, 2), (self.day + timedelta(days=1), 1, 0)],
+        )
+
+    def test_seller_report(self):
+        response = self.client.get(reverse('reports:report-sellers'), {'start': '2025-03-15', 'end': '2025-04-30'})
+        self.assertEqual(
+            [(row['month'], row['branch'], row['year'], row['active_sellers']) for row in response.data['results']],
+            [(date(2025, 3, 1), 'CSE', '3rd', 1), (date(2025, 3, 1), 'ECE', '2nd', 1), (date(2025, 4, 1), 'ECE', '2nd', 1)],
+        )
+
+    def test_reports_are_for_admins_and_validate_ranges(self):
+        self.assertEqual(self.client.get(reverse('reports:report-daily'), {'start': '2025-04-01', 'end': '2025-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('reports:report-daily'), {'start': '2020-01-01', 'end': '2025-03-01'}).status_code, 400)
+        self.client.force_authenticate(self.cse)
+        self.assertEqual(self.client.get(reverse('reports:report-categories')).status_code, 403)
+
+
+class ModerationTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        get_bucket_store().clear()
+        self.moderator = make_user(9, is_staff=True)
+        self.seller = make_user(0)
+        self.reporters = [make_user(index) for index in range(1, 6)]
+        self.products = make_products(self.seller, 4)
+
+    def tearDown(self):
+        super().tearDown()
+        get_bucket_store().clear()
+
+    def report(self, reporter, product, reason='fraud', **extra):
+        self.client.force_authenticate(reporter)
+        return self.client.post(
+            reverse('reports:listing-report-create'), {'product': product.pk, 'reason': reason, **extra}
+        )
+
+    def queue(self, **params):
+        self.client.force_authenticate(self.moderator)
+        return self.client.get(reverse('reports:moderation-queue'), params)
+
+    def resolve(self, action, ids):
+        self.client.force_authenticate(self.moderator)
+        return self.client.post(reverse('reports:moderation-resolve'), {'action': action, 'ids': ids}, format='json')
+
+    def test_report_validation(self):
+        response = self.report(self.reporters[0], self.products[0], details='Asked for payment up front')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'open')
+
+        response = self.report(self.reporters[0], self.products[0], reason='spam')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product'], ['You have already reported this listing.'])
+        self.assertEqual(self.report(self.seller, self.products[0]).status_code, 400)
+        self.assertEqual(self.report(self.reporters[1], self.products[0], reason='nonsense').status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.client.post(reverse('reports:listing-report-create'), {'product': self.products[0].pk, 'reason': 'fraud'}).status_code,
+            401,
+        )
+        self.assertEqual(ModerationItem.objects.get().report_count, 1)
+
+    def test_queue_orders_by_count_then_latest_report(self):
+        first, second, third, _ = self.products
+        for reporter in self.reporters[:3]:
+            self.report(reporter, first)
+        self.report(self.reporters[0], second, reason='spam')
+        self.report(self.reporters[1], second, reason='fraud')
+        self.report(self.reporters[0], third, reason='prohibited')
+        # third and fourth have one report each; the later one comes first.
+        self.report(self.reporters[3], self.products[3])
+
+        with self.assertNumQueries(1):
+            response = self.queue(page_size=3)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [first.pk, second.pk, self.products[3].pk])
+        self.assertEqual(results[0]['report_count'], 3)
+        self.assertEqual(results[0]['reasons'], {'fraud': 3})
+        self.assertEqual(results[1]['reasons'], {'spam': 1, 'fraud': 1})
+        self.assertEqual(results[0]['seller'], 'user0@nitrkl.ac.in')
+
+        self.client.force_authenticate(self.moderator)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], [third.pk])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('reports:moderation-reports', args=[first.pk]))
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['reporter'], 'user3@nitrkl.ac.in')
+
+    def test_queue_is_for_admins(self):
+        self.client.force_authenticate(self.reporters[0])
+        self.assertEqual(self.client.get(reverse('reports:moderation-queue')).status_code, 403)
+        self.assertEqual(
+            self.client.post(reverse('reports:moderation-resolve'), {'action': 'dismiss', 'ids': [1]}, format='json').status_code,
+            403,
+        )
+
+    def test_bulk_dismiss_and_remove(self):
+        for product in self.products[:3]:
+            for reporter in self.reporters[:2]:
+                self.report(reporter, product)
+        unreported = self.products[3]
+
+        response = self.resolve('dismiss', [self.products[0].pk, unreported.pk])
+        self.assertEqual(response.data['counts'], {'resolved': 1, 'not_found': 1})
+        self.assertTrue(Product.objects.filter(pk=self.products[0].pk).exists())
+        self.assertEqual(ListingReport.objects.filter(status='dismissed', resolved_by=self.moderator).count(), 2)
+
+        removed = [self.products[1].pk, self.products[2].pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.resolve('remove', removed)
+        self.assertEqual(response.data['counts'], {'resolved': 2})
+        self.assertFalse(Product.objects.filter(pk__in=removed).exists())
+        self.assertEqual(set(ProductTombstone.objects.values_list('product_id', flat=True)), set(removed))
+        self.assertEqual(ListingReport.objects.filter(status='actioned', product__isnull=True).count(), 4)
+        self.assertFalse(ModerationItem.objects.exists())
+        self.assertEqual(self.queue().data['results'], [])
+
+        # A new report after a dismissal queues the listing again.
+        self.report(self.reporters[2], self.products[0])
+        self.assertEqual([item['report_count'] for item in self.queue().data['results']], [1])
+
+    def test_resolve_query_count_does_not_grow_with_items(self):
+        products = make_products(self.seller, 40)
+        for product in products:
+            self.report(self.reporters[0], product)
+        with self.assertNumQueries(5) as few:
+            self.resolve('dismiss', [product.pk for product in products[:3]])
+        with self.assertNumQueries(len(few)):
+            self.resolve('dismiss', [product.pk for product in products[3:]])
+
+    @override_settings(MODERATION_BULK_MAX_ITEMS=2)
+    def test_resolve_limits_items(self):
+        response = self.resolve('dismiss', [1, 2, 3])
+        self.assertEqual(response.status_code, 400)
+
+    def test_seller_deleting_a_listing_closes_its_reports(self):
+        self.report(self.reporters[0], self.products[0])
+        self.products[0].delete()
+        self.assertEqual(ListingReport.objects.get().status, 'closed')
+        self.assertFalse(ModerationItem.objects.exists())
+
+    def test_reports_are_throttled_per_user(self):
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'listing_report_user': '2/hour'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            for product in self.products[:2]:
+                self.assertEqual(self.report(self.reporters[0], product).status_code, 201)
+            self.assertEqual(self.report(self.reporters[0], self.products[2]).status_code, 429)
+            self.assertEqual(self.report(self.reporters[1], self.products[2]).status_code, 201)
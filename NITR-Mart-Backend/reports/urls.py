@@ -0,0 +1,24 @@
+from django.urls import path
+from .views import (
+    CategoryReportView,
+    BranchReportView,
+    DailyReportView,
+    SellerReportView,
+    ListingReportCreateView,
+    ModerationQueueView,
+    ModerationReportsView,
+    ModerationResolveView,
+)
+
+app_name = 'reports'
+
+urlpatterns = [
+    path('categories/', CategoryReportView.as_view(), name='report-categories'),
+    path('branches/', BranchReportView.as_view(), name='report-branches'),
+    path('daily/', DailyReportView.as_view(), name='report-daily'),
+    path('sellers/', SellerReportView.as_view(), name='report-sellers'),
+    path('listings/', ListingReportCreateView.as_view(), name='listing-report-create'),
+    path('moderation/', ModerationQueueView.as_view(), name='moderation-queue'),
+    path('moderation/resolve/', ModerationResolveView.as_view(), name='moderation-resolve'),
+    path('moderation/<int:product_id>/', ModerationReportsView.as_view(), name='moderation-reports'),
+]
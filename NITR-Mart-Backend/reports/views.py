@@ -1,3 +1,139 @@
-from django.shortcuts import render
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from nitrmart.throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
+from products.pagination import KeysetPagination
+from . import moderation
+from .models import DailyListingStats, ListingReport, ModerationItem, MonthlySellerStats
+from .rollups import daily_series, month_start, summarize
+from .serializers import (
+    ReportFilterSerializer,
+    ListingReportSerializer,
+    ModerationItemSerializer,
+    ModerationReportSerializer,
+    ModerationResolveSerializer,
+)
+
+
+class ReportView(APIView):
+    """Base for the report endpoints; they read the rollups only and are for admins"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_filters(self):
+        if not hasattr(self, '_filters'):
+            serializer = ReportFilterSerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._filters = serializer.validated_data
+        return self._filters
+
+    def get_rollups(self):
+        filters = self.get_filters()
+        rollups = DailyListingStats.objects.filter(day__range=(filters['start'], filters['end']))
+        if 'category' in filters:
+            rollups = rollups.filter(category=filters['category'])
+        if 'branch' in filters:
+            rollups = rollups.filter(branch=filters['branch'])
+        return rollups
+
+    def respond(self, results):
+        filters = self.get_filters()
+        return Response({'start': filters['start'], 'end': filters['end'], 'results': results})
+
+
+class CategoryReportView(ReportView):
+    """Listings, sell-through and prices per category"""
+
+    def get(self, request):
+        return self.respond(summarize(self.get_rollups(), 'category'))
+
+
+class BranchReportView(ReportView):
+    """Listings, sell-through and prices per seller branch"""
+
+    def get(self, request):
+        return self.respond(summarize(self.get_rollups(), 'branch'))
+
+
+class DailyReportView(ReportView):
+    """Listings posted and since sold, day by day"""
+
+    def get(self, request):
+        return self.respond(daily_series(self.get_rollups()))
+
+
+class SellerReportView(ReportView):
+    """Active sellers per month by branch and year, for the months the range touches"""
+
+    def get(self, request):
+        filters = self.get_filters()
+        rollups = MonthlySellerStats.objects.filter(month__range=(month_start(filters['start']), filters['end']))
+        if 'branch' in filters:
+            rollups = rollups.filter(branch=filters['branch'])
+        results = [
+            {
+                'month': row.month,
+                'branch': row.branch or None,
+                'year': row.year or None,
+                'active_sellers': row.active_sellers,
+                'listed': row.listed,
+            }
+            for row in rollups
+        ]
+        return self.respond(results)
+
+
+class ListingReportCreateView(generics.CreateAPIView):
+    """Report a listing to the moderators"""
+    serializer_class = ListingReportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'listing_report'
+
+
+class ModerationPagination(KeysetPagination):
+    ordering = ('-report_count', '-latest_report_at', '-product_id')
+
+
+class ModerationQueueView(generics.ListAPIView):
+    """Listings with open reports, most reported first, then most recently reported"""
+    queryset = ModerationItem.objects.select_related('product__seller').only(
+        'product_id', 'report_count', 'reasons', 'first_report_at', 'latest_report_at',
+        'product__title', 'product__price', 'product__category', 'product__is_sold', 'product__seller__email',
+    )
+    serializer_class = ModerationItemSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = ModerationPagination
+
+
+class ModerationReportsView(generics.ListAPIView):
+    """The open reports on one listing, newest first"""
+    serializer_class = ModerationReportSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
+
+    def get_keyset_ordering(self):
+        return ('-created_at', '-id')
+
+    def get_queryset(self):
+        return ListingReport.objects.filter(
+            product_id=self.kwargs['product_id'], status=ListingReport.STATUS_OPEN
+        ).select_related('reporter').only('id', 'reason', 'details', 'created_at', 'reporter__email')
+
+
+class ModerationResolveView(APIView):
+    """
+    Dismiss the reports on many listings, or remove the listings, at once.
+    Each listing gets its own result; ids without open reports are
+    reported as not_found.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = ModerationResolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = moderation.resolve(request.user, serializer.validated_data['action'], serializer.validated_data['ids'])
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'results': results, 'counts': counts}, status=status.HTTP_200_OK)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import User
+from .models import EmailJob, User
 
 
 @admin.register(User)
@@ -30,3 +30,12 @@ class CustomUserAdmin(BaseUserAdmin):
     )
 
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(EmailJob)
+class EmailJobAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to',)
+    readonly_fields = ('created_at', 'sent_at', 'claimed_at', 'last_error')
+    exclude = ('body', 'html_body')
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .otp_email import get_otp_templates
+
+        # Compile the OTP email once per process rather than on the first send.
+        get_otp_templates()
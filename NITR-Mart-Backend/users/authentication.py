@@ -0,0 +1,192 @@
+"""
+JWT authentication without a user query on every request.
+
+Access tokens carry ``is_staff``, ``is_superuser`` and ``is_active`` next
+to the user id (see ``add_user_claims``). ``StatelessJWTAuthentication``
+turns those claims into a ``ClaimsUser``, a lazy stand-in for the ``User``
+row. Permission checks and ownership tests that only need the id or flags
+run with no query. Any other attribute loads the full row, through a small
+per-process cache that lives for ``AUTH_USER_CACHE_SECONDS``.
+
+Flags in a token reflect the user when it was issued or last refreshed, so
+revoking staff rights or deactivating an account takes effect within one
+access-token lifetime. Tokens issued before these claims existed fall back
+to simplejwt's usual per-request lookup.
+
+``JWTAuthMiddleware`` does the same for WebSocket connections.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import LazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+USER_CLAIMS = ('is_staff', 'is_superuser', 'is_active')
+USER_CACHE_MAX_ENTRIES = 10000
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserCache:
+    """Recently loaded users by id; hands out copies so requests never share an instance"""
+
+    def __init__(self, max_entries=USER_CACHE_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, user_id):
+        user = self._cached(user_id)
+        if user is not None:
+            return user
+        User = get_user_model()
+        try:
+            user = User.objects.get(**{jwt_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return self._store(user_id, user)
+
+    async def aget(self, user_id):
+        """get() for async views, loading a missing user with the async ORM"""
+        user = self._cached(user_id)
+        if user is not None:
+            return user
+        User = get_user_model()
+        try:
+            user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return self._store(user_id, user)
+
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return copy.copy(entry[1])
+        return None
+
+    def _store(self, user_id, user):
+        ttl = getattr(settings, 'AUTH_USER_CACHE_SECONDS', 10)
+        if ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (time.monotonic() + ttl, user)
+                self._entries.move_to_end(user_id)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def evict(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsUser(LazyObject):
+    """
+    The authenticated user, answered from token claims until something
+    needs a column the token does not carry.
+    """
+
+    def __init__(self, user_id, claims):
+        super().__init__()
+        self.__dict__['_user_id'] = user_id
+        self.__dict__['_claims'] = dict(claims, is_authenticated=True, is_anonymous=False)
+
+    def _setup(self):
+        self._wrapped = user_cache.get(self._user_id)
+
+    async def aresolve(self):
+        """The full user, loaded without blocking the event loop"""
+        if self._wrapped is empty:
+            self._wrapped = await user_cache.aget(self._user_id)
+        return self._wrapped
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            if name in ('id', 'pk', jwt_settings.USER_ID_FIELD):
+                return self._user_id
+            if name in self._claims:
+                return self._claims[name]
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        return True
+
+    def __copy__(self):
+        if self._wrapped is empty:
+            return type(self)(self._user_id, self._claims)
+        return copy.copy(self._wrapped)
+
+    def __deepcopy__(self, memo):
+        if self._wrapped is empty:
+            result = type(self)(self._user_id, self._claims)
+            memo[id(self)] = result
+            return result
+        return copy.deepcopy(self._wrapped, memo)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        claims = {claim: validated_token.get(claim) for claim in USER_CLAIMS}
+        if None in claims.values() or jwt_settings.CHECK_REVOKE_TOKEN:
+            # Older tokens, or revocation checks that need the password hash.
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not claims['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return ClaimsUser(user_id, claims)
+
+
+class JWTAuthMiddleware:
+    """
+    ASGI middleware that sets ``scope['user']`` for WebSocket routes from an
+    access token passed as ``?token=``, since browsers cannot send headers
+    with a WebSocket handshake. A missing or invalid token gives
+    AnonymousUser.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await self.get_user(scope))
+        return await self.app(scope, receive, send)
+
+    async def get_user(self, scope):
+        raw = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if not raw:
+            return AnonymousUser()
+        authentication = StatelessJWTAuthentication()
+        try:
+            token = authentication.get_validated_token(raw[0])
+            # Usually answered from the claims; older tokens need a query.
+            return await sync_to_async(authentication.get_user)(token)
+        except (InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
@@ -0,0 +1,166 @@
+"""
+Durable outgoing email queue.
+
+Requests call ``enqueue_email``, which stores an ``EmailJob`` row and returns
+at once. The ``process_email_queue`` management command claims due jobs,
+sends them over one SMTP connection per batch and retries failures with
+exponential backoff. When ``REDIS_URL`` is set, each enqueue also pushes the
+job id onto a Redis list so idle workers wake immediately instead of waiting
+for their next poll; the database stays the source of truth either way.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailJob
+
+logger = logging.getLogger(__name__)
+
+WAKEUP_KEY = 'users:email_queue:wakeup'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_redis():
+    url = _setting('REDIS_URL', None)
+    if not url:
+        return None
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+def _notify(job_id):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.lpush(WAKEUP_KEY, job_id)
+    except Exception:
+        # The worker's poll picks the job up anyway.
+        logger.warning('Could not notify email workers about job %s', job_id, exc_info=True)
+
+
+def enqueue_email(to, subject, body, html_body=''):
+    """Queue an email for background delivery and return the job"""
+    job = EmailJob.objects.create(to=to, subject=subject, body=body, html_body=html_body)
+    if _setting('EMAIL_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: deliver_jobs([job.pk]))
+    else:
+        transaction.on_commit(lambda: _notify(job.pk))
+    return job
+
+
+def retry_delay(attempts):
+    base = _setting('EMAIL_QUEUE_RETRY_BASE_SECONDS', 30)
+    cap = _setting('EMAIL_QUEUE_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def claim_due_jobs(batch_size):
+    """
+    Atomically mark up to ``batch_size`` due jobs as sending and return their
+    ids. Rows locked by another worker are skipped, and jobs left in
+    'sending' by a crashed worker become claimable again after a timeout.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS', 300))
+    due = (
+        Q(status=EmailJob.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=EmailJob.STATUS_SENDING, claimed_at__lt=stale)
+    )
+    with transaction.atomic():
+        ids = list(
+            EmailJob.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if ids:
+            EmailJob.objects.filter(pk__in=ids).update(status=EmailJob.STATUS_SENDING, claimed_at=now)
+    return ids
+
+
+def deliver_jobs(job_ids):
+    """Send the given claimed jobs; returns (sent, failed) counts"""
+    jobs = list(EmailJob.objects.filter(pk__in=job_ids).exclude(status=EmailJob.STATUS_SENT))
+    if not jobs:
+        return 0, 0
+
+    max_attempts = _setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        try:
+            connection.open()
+        except Exception:
+            # Each send below retries the connection and records the failure.
+            logger.warning('Could not open the email connection', exc_info=True)
+        for job in jobs:
+            message = EmailMultiAlternatives(
+                subject=job.subject,
+                body=job.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[job.to],
+                connection=connection,
+            )
+            if job.html_body:
+                message.attach_alternative(job.html_body, 'text/html')
+
+            job.attempts += 1
+            job.claimed_at = None
+            try:
+                message.send()
+            except Exception as exc:
+                failed += 1
+                job.last_error = repr(exc)
+                if job.attempts >= max_attempts:
+                    job.status = EmailJob.STATUS_FAILED
+                else:
+                    job.status = EmailJob.STATUS_PENDING
+                    job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+                logger.warning('Email job %s failed (attempt %s): %s', job.pk, job.attempts, exc)
+            else:
+                sent += 1
+                job.status = EmailJob.STATUS_SENT
+                job.sent_at = timezone.now()
+                job.last_error = ''
+            job.save(update_fields=[
+                'status', 'attempts', 'claimed_at', 'next_attempt_at', 'last_error', 'sent_at'
+            ])
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def process_queue(batch_size=50):
+    """Claim and deliver one batch; returns (sent, failed) counts"""
+    ids = claim_due_jobs(batch_size)
+    if not ids:
+        return 0, 0
+    return deliver_jobs(ids)
+
+
+def wait_for_work(timeout):
+    """
+    Block until a job is enqueued or ``timeout`` seconds pass. Without Redis
+    this is a plain sleep between polls.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            client.blpop([WAKEUP_KEY], timeout=timeout)
+            # Drop duplicate wakeups; one batch claims every due job anyway.
+            client.delete(WAKEUP_KEY)
+            return
+        except Exception:
+            logger.warning('Could not wait on the email wakeup list', exc_info=True)
+    time.sleep(timeout)
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand
+
+from nitrmart.dataio import FORMATS, Rate, RowWriter, detect_format, open_text
+
+User = get_user_model()
+
+FIELDS = [
+    'id', 'email', 'first_name', 'last_name', 'role', 'year', 'branch', 'roll_no',
+    'department', 'wp_number', 'is_verified', 'is_staff', 'created_at',
+]
+
+
+class Command(BaseCommand):
+    help = ('Write every user to a CSV or JSON Lines file ("-" for stdout), streaming the '
+            'table in chunks. The output can be read back with import_users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or - for stdout.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='csv or jsonl (default: from the file extension).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database at a time (default 2000).')
+        parser.add_argument('--include-password-hashes', action='store_true',
+                            help='Add a password_hash column so accounts keep their passwords on import.')
+
+    def handle(self, *args, **options):
+        format = detect_format(options['path'], options['format'])
+        fields = FIELDS + ['password_hash'] if options['include_password_hashes'] else FIELDS
+        columns = [field if field != 'password_hash' else 'password' for field in fields]
+        rows = User.objects.order_by('pk').values_list(*columns)
+        rate = Rate()
+        count = 0
+        with open_text(options['path'], 'w') as f:
+            writer = RowWriter(f, format, fields)
+            for values in rows.iterator(chunk_size=options['chunk_size']):
+                row = dict(zip(fields, values))
+                if row.get('password_hash', '').startswith(UNUSABLE_PASSWORD_PREFIX):
+                    row['password_hash'] = None
+                writer.write(row)
+                count += 1
+        # Keep the summary off stdout when the data itself goes there.
+        out = self.stderr if options['path'] == '-' else self.stdout
+        out.write(f'Exported {rate.summary(count)}')
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from nitrmart.dataio import FORMATS, Rate, batched, detect_format, format_errors, open_text, read_rows
+from users.serializers import UserImportSerializer
+
+User = get_user_model()
+
+UNIQUE_FIELDS = ('email', 'wp_number', 'roll_no')
+
+
+class Command(BaseCommand):
+    help = ('Create users from a CSV or JSON Lines file ("-" for stdin), validated like '
+            'registrations and inserted in batches. Invalid rows are reported and skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for stdin.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='csv or jsonl (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows validated and inserted per batch (default 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without inserting anything.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        format = detect_format(options['path'], options['format'])
+        rate = Rate()
+        created = skipped = 0
+        with open_text(options['path'], 'r') as f:
+            for batch in batched(read_rows(f, format), options['batch_size']):
+                users, errors = self.validate_batch(batch)
+                for line, message in errors:
+                    self.stderr.write(f'line {line}: {message}')
+                skipped += len(errors)
+                if users and not options['dry_run']:
+                    with transaction.atomic():
+                        User.objects.bulk_create(users)
+                created += len(users)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{created} users so far ({rate.summary(created + skipped)})')
+
+        verb = 'would be created' if options['dry_run'] else 'created'
+        self.stdout.write(f'{created} users {verb}, {skipped} rows skipped; {rate.summary(created + skipped)}')
+
+    def validate_batch(self, batch):
+        """Unsaved users for the valid rows of a batch, and (line, message) for the rest"""
+        valid = []
+        errors = []
+        for line, row in batch:
+            if isinstance(row, Exception):
+                errors.append((line, str(row)))
+                continue
+            serializer = UserImportSerializer(data=row)
+            if not serializer.is_valid():
+                errors.append((line, format_errors(serializer.errors)))
+                continue
+            valid.append((line, serializer.build()))
+
+        # One query for clashes with existing accounts, a set for clashes within the batch.
+        values = {field: {getattr(user, field) for _, user in valid} - {None} for field in UNIQUE_FIELDS}
+        taken = {field: set() for field in UNIQUE_FIELDS}
+        clashes = Q()
+        for field in UNIQUE_FIELDS:
+            clashes |= Q(**{f'{field}__in': values[field]})
+        for existing in User.objects.filter(clashes).values_list(*UNIQUE_FIELDS):
+            for field, value in zip(UNIQUE_FIELDS, existing):
+                taken[field].add(value)
+
+        users = []
+        for line, user in valid:
+            duplicate = next(
+                (field for field in UNIQUE_FIELDS
+                 if getattr(user, field) is not None and getattr(user, field) in taken[field]),
+                None
+            )
+            if duplicate:
+                errors.append((line, f'{duplicate}: a user with this {duplicate} already exists.'))
+                continue
+            for field in UNIQUE_FIELDS:
+                if getattr(user, field) is not None:
+                    taken[field].add(getattr(user, field))
+            users.append(user)
+        return users, errors
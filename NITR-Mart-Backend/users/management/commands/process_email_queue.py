@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from users.emails import process_queue, wait_for_work
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails (OTP codes and other notifications), retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Jobs claimed per batch (default 50).')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty (default 2).')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the currently due jobs and exit.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            sent, failed = process_queue(batch_size)
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if options['once']:
+                return
+            wait_for_work(options['poll_interval'])
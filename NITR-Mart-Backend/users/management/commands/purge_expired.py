@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from products.models import ProductTombstone
+from products.sync import get_retention
+from users.models import EmailJob, OTPVerification
+
+
+def get_targets(now):
+    """
+    Each target is (name, queryset of rows to delete, indexed column to walk).
+    Walking the column in order keeps every batch on its index.
+    """
+    email_cutoff = now - timedelta(days=getattr(settings, 'EMAIL_JOB_RETENTION_DAYS', 14))
+    return [
+        ('otp', OTPVerification.objects.filter(expires_at__lt=now), 'expires_at'),
+        (
+            'email_jobs',
+            # Finished jobs by their last scheduled attempt, via email_job_due_idx.
+            EmailJob.objects.filter(
+                status__in=[EmailJob.STATUS_SENT, EmailJob.STATUS_FAILED],
+                next_attempt_at__lt=email_cutoff,
+            ),
+            'next_attempt_at',
+        ),
+        ('tombstones', ProductTombstone.objects.filter(deleted_at__lt=now - get_retention()), 'deleted_at'),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Delete expired OTPs, finished email jobs and old product tombstones in small '
+            'batches. Safe to run from cron while the site is serving traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per statement (default 1000).')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches (default 0.05).')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help='Stop starting new batches after this long.')
+        parser.add_argument('--only', action='append', default=None,
+                            help='Purge only this target (otp, email_jobs, tombstones); repeatable.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would be deleted without deleting it.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        targets = get_targets(timezone.now())
+        names = [name for name, _, _ in targets]
+        only = options['only'] or names
+        unknown = set(only) - set(names)
+        if unknown:
+            raise CommandError(f"Unknown target(s): {', '.join(sorted(unknown))}. Choose from {', '.join(names)}.")
+
+        started = time.monotonic()
+        deadline = started + options['max_seconds'] if options['max_seconds'] else None
+        total = 0
+        for name, queryset, column in targets:
+            if name not in only:
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'{name}: {queryset.count()} rows would be deleted')
+                continue
+            deleted, batches, elapsed, finished = self.purge(
+                queryset, column, batch_size, options['pause'], deadline
+            )
+            total += deleted
+            rate = deleted / elapsed if elapsed else 0
+            note = '' if finished else ' (stopped at time limit)'
+            self.stdout.write(
+                f'{name}: deleted {deleted} rows in {batches} batches, '
+                f'{elapsed:.2f}s, {rate:.0f} rows/s{note}'
+            )
+
+        if not options['dry_run']:
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f'Deleted {total} rows in {elapsed:.2f}s'))
+
+    def purge(self, queryset, column, batch_size, pause, deadline):
+        """
+        Delete matching rows oldest first, one short autocommitted statement
+        per batch, so no lock is held across batches. Returns (deleted,
+        batches, seconds, finished).
+        """
+        started = time.monotonic()
+        deleted = batches = 0
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return deleted, batches, time.monotonic() - started, False
+            ids = list(queryset.order_by(column).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted, batches, time.monotonic() - started, True
+            # Keep the condition: a row may have been renewed since the SELECT
+            # (a re-sent OTP is updated in place).
+            count, _ = queryset.filter(pk__in=ids).delete()
+            deleted += count
+            batches += 1
+            if len(ids) < batch_size:
+                return deleted, batches, time.monotonic() - started, True
+            if pause:
+                time.sleep(pause)
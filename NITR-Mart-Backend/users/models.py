@@ -1,11 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
-import random
+import secrets
 from django.utils import timezone
 from django.conf import settings
 
 
+def generate_otp():
+    return f"{secrets.randbelow(1000000):06d}"
+
 
 class OTPVerification(models.Model):
     email = models.EmailField(unique=True, db_index=True)
@@ -16,10 +19,12 @@ class OTPVerification(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.pk:
-            self.otp = f"{random.randint(0, 999999):06d}"
-            self.expires_at = timezone.now() + timezone.timedelta(
-                minutes=getattr(settings, 'OTP_EXPIRY_MINUTES', 30)
-            )
+            if not self.otp:
+                self.otp = generate_otp()
+            if not self.expires_at:
+                self.expires_at = timezone.now() + timezone.timedelta(
+                    minutes=getattr(settings, 'OTP_EXPIRY_MINUTES', 30)
+                )
         super().save(*args, **kwargs)
 
     def is_expired(self):
@@ -33,6 +38,40 @@ class OTPVerification(models.Model):
         return f"{self.email} - {self.otp} ({'Verified' if self.is_verified else 'Pending'})"
 
 
+class EmailJob(models.Model):
+    """An outgoing email, delivered by the process_email_queue worker"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.status})"
+
+
 class CustomUserManager(UserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -100,5 +139,13 @@ class User(AbstractUser):
         self.full_clean()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored branch and year, so the reports only regroup a
+        # seller's listings when one of them changes.
+        instance._loaded_group = (instance.__dict__.get('branch'), instance.__dict__.get('year'))
+        return instance
+
     def __str__(self):
         return self.email
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Where one-time passwords live between send, verify and registration.
+
+``OTP_STORE`` names the backend class. ``CacheOTPStore`` keeps each code in
+the Django cache (Redis in production) with a TTL, so codes expire on their
+own. ``DatabaseOTPStore`` keeps the ``OTPVerification`` table for setups
+without a shared cache. Both verify and consume a code in a single atomic
+step, so two requests can never register with the same code.
+"""
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.module_loading import import_string
+
+from .models import OTPVerification, generate_otp
+
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+
+PENDING = 'pending'
+VERIFIED = 'verified'
+
+
+def get_expiry():
+    return timedelta(minutes=getattr(settings, 'OTP_EXPIRY_MINUTES', 30))
+
+
+class BaseOTPStore:
+    def issue(self, email):
+        """Create a new code for ``email``, replacing any earlier one, and return it"""
+        raise NotImplementedError
+
+    def verify(self, email, otp):
+        """Mark the code as verified; returns VALID, INVALID or EXPIRED"""
+        raise NotImplementedError
+
+    def consume(self, email, otp):
+        """Delete a verified code; returns VALID only to the one caller that deleted it"""
+        raise NotImplementedError
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """Codes in the OTPVerification table; each call is one statement on the happy path"""
+
+    def issue(self, email):
+        otp = generate_otp()
+        now = timezone.now()
+        fields = {'otp': otp, 'is_verified': False, 'created_at': now, 'expires_at': now + get_expiry()}
+        if not OTPVerification.objects.filter(email=email).update(**fields):
+            OTPVerification.objects.update_or_create(email=email, defaults=fields)
+        return otp
+
+    def verify(self, email, otp):
+        codes = OTPVerification.objects.filter(email=email, otp=otp)
+        if codes.filter(expires_at__gt=timezone.now()).update(is_verified=True):
+            return VALID
+        # Matches only if the code exists but has run out; drop it.
+        deleted, _ = codes.delete()
+        return EXPIRED if deleted else INVALID
+
+    def consume(self, email, otp):
+        codes = OTPVerification.objects.filter(email=email, otp=otp, is_verified=True)
+        deleted, _ = codes.filter(expires_at__gt=timezone.now()).delete()
+        if deleted:
+            return VALID
+        deleted, _ = codes.delete()
+        return EXPIRED if deleted else INVALID
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    Codes in the Django cache with a TTL. Each code sits under a key derived
+    from the email and the code itself, so a lookup needs no second read, and
+    a pointer key per email lets a resend drop the previous code. Consuming
+    relies on ``delete()`` reporting whether it removed the key: only one
+    concurrent caller can see True.
+    """
+
+    prefix = 'users:otp'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'OTP_CACHE_ALIAS', 'default')]
+
+    def _email_key(self, email):
+        return f'{self.prefix}:email:{email}'
+
+    def _code_key(self, email, otp):
+        digest = salted_hmac(self.prefix, f'{email}:{otp}').hexdigest()
+        return f'{self.prefix}:code:{digest}'
+
+    def issue(self, email):
+        otp = generate_otp()
+        code_key = self._code_key(email, otp)
+        timeout = get_expiry().total_seconds()
+        previous = self.cache.get(self._email_key(email))
+        if previous and previous != code_key:
+            self.cache.delete(previous)
+        self.cache.set_many({
+            self._email_key(email): code_key,
+            code_key: (PENDING, timezone.now() + get_expiry()),
+        }, timeout=timeout)
+        return otp
+
+    def verify(self, email, otp):
+        code_key = self._code_key(email, otp)
+        entry = self.cache.get(code_key)
+        if entry is None:
+            # Expired codes are evicted, so they look like wrong ones.
+            return INVALID
+        _, expires_at = entry
+        remaining = (expires_at - timezone.now()).total_seconds()
+        if remaining <= 0:
+            self.cache.delete(code_key)
+            return EXPIRED
+        self.cache.set(code_key, (VERIFIED, expires_at), timeout=remaining)
+        return VALID
+
+    def consume(self, email, otp):
+        code_key = self._code_key(email, otp)
+        entry = self.cache.get(code_key)
+        if entry is None or entry[0] != VERIFIED:
+            return INVALID
+        if entry[1] <= timezone.now():
+            self.cache.delete(code_key)
+            return EXPIRED
+        if not self.cache.delete(code_key):
+            return INVALID
+        self.cache.delete(self._email_key(email))
+        return VALID
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_otp_store():
+    return _load_store(getattr(settings, 'OTP_STORE', 'users.otp_store.DatabaseOTPStore'))
@@ -1,15 +1,32 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.conf import settings
-from .models import OTPVerification, User
+from .authentication import add_user_claims
+from .emails import enqueue_email
+from .models import User
+from .otp_email import render_otp_email
+from .otp_store import EXPIRED, VALID, get_otp_store
 
 User = get_user_model()
 
 
+def validate_role_fields(data):
+    """Role-specific required fields, as User.clean checks them"""
+    role = data.get('role', 'student')
+    if role == 'student' and not all([data.get('year'), data.get('branch')]):
+        raise serializers.ValidationError({
+            'detail': 'Year and branch are required for students'
+        })
+    elif role == 'faculty' and not data.get('department'):
+        raise serializers.ValidationError({
+            'detail': 'Department is required for faculty'
+        })
+
+
 class OTPSendSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
@@ -31,29 +48,14 @@ class OTPSendSerializer(serializers.Serializer):
                 {'email': 'No user found with this email address.'}
             )
 
-        OTPVerification.objects.filter(email=email).delete()
+        otp = get_otp_store().issue(email)
 
-        otp_obj = OTPVerification.objects.create(email=email)
-
-        subject = 'Your OTP for NITR Mart Password Reset' # Changed subject
-        context = {
-            'otp': otp_obj.otp,
-            'expiry_minutes': getattr(settings, 'OTP_EXPIRY_MINUTES', 30), # Use getattr for default
-        }
+        subject, plain_message, html_message = render_otp_email(otp)
 
-        html_message = render_to_string('otp_email.html', context)
-        plain_message = strip_tags(html_message)
+        # Delivered by the process_email_queue worker, not inside the request.
+        enqueue_email(email, subject, plain_message, html_message)
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-
-        return otp_obj
+        return {'email': email}
 
 
 class OTPVerifySerializer(serializers.Serializer):
@@ -61,40 +63,24 @@ class OTPVerifySerializer(serializers.Serializer):
     otp = serializers.CharField(max_length=6)
 
     def validate(self, data):
-        """Validate OTP against database"""
-        email = data['email'].lower()
-        otp = data['otp']
+        """Check the OTP and mark it verified in one step"""
+        data['email'] = data['email'].lower()
 
-        try:
-            otp_obj = OTPVerification.objects.get(
-                email=email,
-                otp=otp
-            )
-        except OTPVerification.DoesNotExist:
+        result = get_otp_store().verify(data['email'], data['otp'])
+        if result == EXPIRED:
             raise serializers.ValidationError({
-                'detail': 'Invalid OTP or email'
+                'detail': 'OTP has expired'
             })
-
-        if otp_obj.is_expired():
-            otp_obj.delete()
+        if result != VALID:
             raise serializers.ValidationError({
-                'detail': 'OTP has expired'
+                'detail': 'Invalid OTP or email'
             })
 
-        if otp_obj.is_verified:
-            # If already verified, no need to re-verify, just return
-            data['otp_obj'] = otp_obj
-            return data
-
-        data['otp_obj'] = otp_obj
         return data
 
     def create(self, validated_data):
-        """Mark OTP as verified"""
-        otp_obj = validated_data['otp_obj']
-        otp_obj.is_verified = True
-        otp_obj.save()
-        return otp_obj
+        """The OTP was already marked verified during validation"""
+        return validated_data
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -121,6 +107,59 @@ class UserSerializer(serializers.ModelSerializer):
         return value.lower()
 
 
+class UserImportSerializer(UserSerializer):
+    """
+    One row of ``import_users``. Either ``password`` (hashed on import) or
+    ``password_hash`` (an already encoded hash, as written by
+    ``export_users --include-password-hashes``) may be given; without both
+    the account gets an unusable password and signs in after an OTP reset.
+    Uniqueness is checked a batch at a time by the command, not per row.
+    """
+    password = serializers.CharField(write_only=True, required=False, allow_null=True, min_length=8)
+    password_hash = serializers.CharField(write_only=True, required=False, allow_null=True, max_length=128)
+
+    class Meta:
+        model = User
+        fields = [
+            'email', 'first_name', 'last_name', 'year', 'branch', 'roll_no',
+            'role', 'department', 'wp_number', 'is_verified', 'password', 'password_hash'
+        ]
+        extra_kwargs = {
+            'email': {'validators': []},
+            'wp_number': {'validators': []},
+            'roll_no': {'validators': []},
+            'first_name': {'required': True},
+            'last_name': {'required': True},
+        }
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError('Not a recognised password hash.')
+        return value
+
+    def validate(self, data):
+        validate_role_fields(data)
+        if data.get('password') and data.get('password_hash'):
+            raise serializers.ValidationError({'detail': 'Give either password or password_hash, not both.'})
+        return data
+
+    def build(self):
+        """An unsaved User for bulk_create"""
+        data = dict(self.validated_data)
+        password = data.pop('password', None)
+        password_hash = data.pop('password_hash', None)
+        user = User(**data)
+        if password_hash:
+            user.password = password_hash
+        elif password:
+            user.set_password(password)
+        else:
+            user.set_unusable_password()
+        return user
+
+
 class UserCreateSerializer(serializers.ModelSerializer):
     """Serializer for user registration with OTP verification"""
     password = serializers.CharField(
@@ -154,33 +193,18 @@ class UserCreateSerializer(serializers.ModelSerializer):
         """Validate OTP and role-specific fields"""
         email = data.get('email', '').lower()
         otp = data.get('otp')
-        role = data.get('role', 'student')
 
-        try:
-            otp_obj = OTPVerification.objects.get(
-                email=email,
-                otp=otp,
-                is_verified=True
-            )
-        except OTPVerification.DoesNotExist:
-            raise serializers.ValidationError({
-                'otp': 'Invalid or unverified OTP'
-            })
+        validate_role_fields(data)
 
-        if otp_obj.is_expired():
-            otp_obj.delete()
+        # Consumed last, so a form error above does not burn the code.
+        result = get_otp_store().consume(email, otp)
+        if result == EXPIRED:
             raise serializers.ValidationError({
                 'otp': 'OTP has expired'
             })
-
-        # Role-specific validation
-        if role == 'student' and not all([data.get('year'), data.get('branch')]):
+        if result != VALID:
             raise serializers.ValidationError({
-                'detail': 'Year and branch are required for students'
-            })
-        elif role == 'faculty' and not data.get('department'):
-            raise serializers.ValidationError({
-                'detail': 'Department is required for faculty'
+                'otp': 'Invalid or unverified OTP'
             })
 
         return data
@@ -253,3 +277,46 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair carrying the flags StatelessJWTAuthentication reads"""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that re-reads the user's flags instead of copying stale ones"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.payload.get(jwt_settings.USER_ID_CLAIM)}
+        ).first()
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        add_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,3 +1,604 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import ScryptPasswordHasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from nitrmart.throttling import MemoryBucketStore, get_bucket_store, parse_rate
+from products.models import ProductTombstone
+
+from .authentication import StatelessJWTAuthentication, add_user_claims, user_cache
+from .emails import process_queue
+from .hashers import TunedScryptPasswordHasher
+from .models import EmailJob, OTPVerification
+from .otp_email import CompiledEmailTemplate, render_otp_email
+from .otp_store import INVALID, VALID, get_otp_store
+from .views import AsyncCurrentUserView, CurrentUserView
+
+User = get_user_model()
+
+
+def make_user(index=0, **extra):
+    fields = {
+        'first_name': 'Test',
+        'last_name': f'User{index}',
+        'year': '3rd',
+        'branch': 'CSE',
+        'roll_no': f'12{index:07d}',
+        'wp_number': f'9{index:09d}',
+    }
+    fields.update(extra)
+    return User.objects.create_user(f'user{index}@nitrkl.ac.in', 'securepassword123', **fields)
+
+
+class CurrentUserConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('users:current-user')
+
+    def test_unchanged_profile_returns_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Authorization', response.headers['Vary'])
+        etag = response.headers['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Changed')
+
+
+class AsyncCurrentUserViewTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = make_user()
+
+    def tearDown(self):
+        user_cache.clear()
+
+    def get(self, view, token=None, **headers):
+        if token is not None:
+            headers['Authorization'] = f'Bearer {token}'
+        request = APIRequestFactory().get('/users/me/', headers=headers)
+        if view.view_is_async:
+            return async_to_sync(view.as_view())(request)
+        return view.as_view()(request)
+
+    def test_matches_sync_view_for_claims_and_old_tokens(self):
+        claims = str(add_user_claims(AccessToken.for_user(self.user), self.user))
+        # Without flag claims, authentication itself loads the row.
+        old = str(AccessToken.for_user(self.user))
+        expected = self.get(CurrentUserView, claims)
+        user_cache.clear()
+        for token in (claims, old):
+            response = self.get(AsyncCurrentUserView, token)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, expected.data)
+            self.assertEqual(response.headers['ETag'], expected.headers['ETag'])
+
+        # The row loaded above is reused from the cache.
+        with self.assertNumQueries(0):
+            response = self.get(AsyncCurrentUserView, claims, **{'If-None-Match': expected.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get(AsyncCurrentUserView).status_code, 401)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('mail server unavailable')
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.user = make_user()
+
+    def send_otp(self):
+        return self.client.post(reverse('users:send-otp'), {'email': self.user.email}, format='json')
+
+    def test_send_otp_enqueues_without_sending(self):
+        response = self.send_otp()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        job = EmailJob.objects.get()
+        self.assertEqual(job.status, EmailJob.STATUS_PENDING)
+        self.assertEqual(job.to, self.user.email)
+
+    def test_worker_delivers_queued_otp(self):
+        self.send_otp()
+        call_command('process_email_queue', '--once', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        otp = OTPVerification.objects.get(email=self.user.email).otp
+        self.assertIn(otp, mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        job = EmailJob.objects.get()
+        self.assertEqual(job.status, EmailJob.STATUS_SENT)
+        self.assertIsNotNone(job.sent_at)
+
+    @override_settings(
+        EMAIL_BACKEND='users.tests.FailingEmailBackend',
+        EMAIL_QUEUE_MAX_ATTEMPTS=2,
+        EMAIL_QUEUE_RETRY_BASE_SECONDS=60,
+    )
+    def test_failures_back_off_then_give_up(self):
+        self.send_otp()
+        self.assertEqual(process_queue(), (0, 1))
+        job = EmailJob.objects.get()
+        self.assertEqual(job.status, EmailJob.STATUS_PENDING)
+        self.assertIn('mail server unavailable', job.last_error)
+        self.assertGreater(job.next_attempt_at, timezone.now())
+
+        # Not due yet.
+        self.assertEqual(process_queue(), (0, 0))
+
+        EmailJob.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_queue(), (0, 1))
+        self.assertEqual(EmailJob.objects.get().status, EmailJob.STATUS_FAILED)
+
+
+class OTPEmailRenderTests(SimpleTestCase):
+    def test_compiled_output_matches_django_render(self):
+        context = {'otp': '042917', 'expiry_minutes': 15}
+        subject, text, html = render_otp_email('042917', 15)
+        self.assertEqual(subject, 'Your OTP for NITR Mart Password Reset')
+        self.assertEqual(html, render_to_string('otp_email.html', context))
+        self.assertEqual(text, render_to_string('otp_email.txt', context))
+        self.assertIn('valid for 15 minutes', text)
+
+    def test_html_values_are_escaped(self):
+        template = CompiledEmailTemplate('otp_email.html', ('otp', 'expiry_minutes'), autoescape=True)
+        html = template.render(otp='<b>$1</b>', expiry_minutes=5)
+        self.assertIn('&lt;b&gt;$1&lt;/b&gt;', html)
+        self.assertNotIn('<b>$1</b>', html)
+
+
+class OTPRegistrationMixin:
+    """Send, verify and register flow, run against each OTP store"""
+
+    def setUp(self):
+        cache.clear()
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.email = 'user0@nitrkl.ac.in'
+        self.payload = {
+            'email': self.email,
+            'password': 'securepassword123',
+            'first_name': 'New',
+            'last_name': 'Student',
+            'year': '2nd',
+            'branch': 'EE',
+            'roll_no': '122EE0001',
+            'wp_number': '9000000001',
+        }
+
+    def tearDown(self):
+        cache.clear()
+
+    def verify(self, otp):
+        return self.client.post(reverse('users:verify-otp'), {'email': self.email, 'otp': otp}, format='json')
+
+    def register(self, otp):
+        return self.client.post(reverse('users:user-list-create'), {**self.payload, 'otp': otp}, format='json')
+
+    def test_code_registers_exactly_once(self):
+        otp = get_otp_store().issue(self.email)
+        self.assertEqual(self.register(otp).status_code, 400)
+
+        self.assertEqual(self.verify('000000' if otp != '000000' else '111111').status_code, 400)
+        self.assertEqual(self.verify(otp).status_code, 200)
+        response = self.register(otp)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(User.objects.get(email=self.email).is_verified)
+
+        self.assertEqual(get_otp_store().consume(self.email, otp), INVALID)
+
+    def test_resend_replaces_previous_code(self):
+        first = get_otp_store().issue(self.email)
+        second = get_otp_store().issue(self.email)
+        if first != second:
+            self.assertEqual(self.verify(first).status_code, 400)
+        self.assertEqual(self.verify(second).status_code, 200)
+
+    def test_form_error_keeps_code(self):
+        otp = get_otp_store().issue(self.email)
+        self.verify(otp)
+        response = self.client.post(
+            reverse('users:user-list-create'),
+            {**self.payload, 'otp': otp, 'branch': ''},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.register(otp).status_code, 201)
+
+    def test_expired_code_is_rejected(self):
+        with override_settings(OTP_EXPIRY_MINUTES=-1):
+            otp = get_otp_store().issue(self.email)
+        response = self.verify(otp)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(OTP_STORE='users.otp_store.DatabaseOTPStore')
+class DatabaseOTPStoreTests(OTPRegistrationMixin, TestCase):
+    def test_verify_and_consume_are_single_statements(self):
+        store = get_otp_store()
+        otp = store.issue(self.email)
+        with self.assertNumQueries(1):
+            self.assertEqual(store.verify(self.email, otp), VALID)
+        with self.assertNumQueries(1):
+            self.assertEqual(store.consume(self.email, otp), VALID)
+        self.assertFalse(OTPVerification.objects.exists())
+
+
+@override_settings(OTP_STORE='users.otp_store.CacheOTPStore')
+class CacheOTPStoreTests(OTPRegistrationMixin, TestCase):
+    def test_codes_stay_out_of_the_database(self):
+        otp = get_otp_store().issue(self.email)
+        self.assertFalse(OTPVerification.objects.exists())
+        self.assertEqual(self.verify(otp).status_code, 200)
+        self.assertEqual(self.register(otp).status_code, 201)
+
+
+class PurgeExpiredTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        OTPVerification.objects.bulk_create([
+            OTPVerification(email=f'old{i}@nitrkl.ac.in', otp='123456', expires_at=now - timedelta(minutes=i + 1))
+            for i in range(5)
+        ] + [OTPVerification(email='live@nitrkl.ac.in', otp='123456', expires_at=now + timedelta(minutes=5))])
+        EmailJob.objects.bulk_create([
+            EmailJob(to='a@nitrkl.ac.in', subject='s', body='b', status=EmailJob.STATUS_SENT,
+                     next_attempt_at=now - timedelta(days=30)),
+            EmailJob(to='b@nitrkl.ac.in', subject='s', body='b', status=EmailJob.STATUS_PENDING,
+                     next_attempt_at=now - timedelta(days=30)),
+            EmailJob(to='c@nitrkl.ac.in', subject='s', body='b', status=EmailJob.STATUS_SENT),
+        ])
+        ProductTombstone.objects.create(product_id=1, category='Books')
+        ProductTombstone.objects.create(product_id=2, category='Books')
+        ProductTombstone.objects.filter(product_id=1).update(deleted_at=now - timedelta(days=365))
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_expired', '--pause', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_only_stale_rows_in_batches(self):
+        output = self.purge('--batch-size', '2')
+        self.assertIn('otp: deleted 5 rows in 3 batches', output)
+        self.assertIn('email_jobs: deleted 1 rows', output)
+        self.assertIn('tombstones: deleted 1 rows', output)
+        self.assertEqual(list(OTPVerification.objects.values_list('email', flat=True)), ['live@nitrkl.ac.in'])
+        self.assertEqual(
+            sorted(EmailJob.objects.values_list('to', flat=True)), ['b@nitrkl.ac.in', 'c@nitrkl.ac.in']
+        )
+        self.assertEqual(list(ProductTombstone.objects.values_list('product_id', flat=True)), [2])
+
+    def test_code_reissued_during_a_batch_survives(self):
+        def reissue(execute, sql, params, many, context):
+            if not reissued and sql.startswith('DELETE') and 'otpverification' in sql:
+                # Between selecting the batch and deleting it, old0 gets a new code.
+                reissued.append(True)
+                OTPVerification.objects.filter(email='old0@nitrkl.ac.in').update(
+                    otp='654321', expires_at=timezone.now() + timedelta(minutes=5)
+                )
+            return execute(sql, params, many, context)
+
+        reissued = []
+        with connection.execute_wrapper(reissue):
+            output = self.purge('--only', 'otp')
+        self.assertTrue(reissued)
+        self.assertIn('otp: deleted 4 rows', output)
+        self.assertEqual(
+            sorted(OTPVerification.objects.values_list('email', flat=True)),
+            ['live@nitrkl.ac.in', 'old0@nitrkl.ac.in'],
+        )
+
+    def test_dry_run_and_only(self):
+        output = self.purge('--dry-run', '--only', 'otp')
+        self.assertIn('otp: 5 rows would be deleted', output)
+        self.assertNotIn('tombstones', output)
+        self.assertEqual(OTPVerification.objects.count(), 6)
+
+        with self.assertRaises(CommandError):
+            self.purge('--only', 'sessions')
+
+
+class UserImportExportTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def path(self, name, content=None):
+        path = os.path.join(self.dir, name)
+        if content is not None:
+            with open(path, 'w') as f:
+                f.write(content)
+        return path
+
+    def run_command(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(*args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_validates_rows_and_batches_uniqueness(self):
+        make_user(0)
+        csv_text = (
+            'email,first_name,last_name,role,year,branch,department,roll_no,wp_number,password\n'
+            'New.One@nitrkl.ac.in,New,One,student,2nd,EE,,121000001,9100000001,longenough1\n'
+            'two@gmail.com,Two,Out,student,2nd,EE,,121000002,9100000002,\n'
+            'prof@nitrkl.ac.in,Prof,X,faculty,,,,,9100000003,\n'
+            'user0@nitrkl.ac.in,Taken,Email,student,1st,ME,,121000004,9100000004,\n'
+            'dup@nitrkl.ac.in,Same,Phone,faculty,,,CS,,9100000001,\n'
+            'fac@nitrkl.ac.in,Fac,Ok,faculty,,,Physics,,9100000005,\n'
+        )
+        out, err = self.run_command('import_users', self.path('users.csv', csv_text), '--batch-size', '2')
+
+        self.assertIn('2 users created, 4 rows skipped', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 3: email: Only @nitrkl.ac.in email addresses are allowed.', err)
+        self.assertIn('line 4: detail: Department is required for faculty', err)
+        self.assertIn('line 5: email: a user with this email already exists.', err)
+        # Clashes with a row in an earlier batch are caught by the database check.
+        self.assertIn('line 6: wp_number: a user with this wp_number already exists.', err)
+
+        imported = User.objects.get(email='new.one@nitrkl.ac.in')
+        self.assertTrue(imported.check_password('longenough1'))
+        faculty = User.objects.get(email='fac@nitrkl.ac.in')
+        self.assertFalse(faculty.has_usable_password())
+        self.assertIsNone(faculty.roll_no)
+
+    def test_export_round_trips_through_jsonl(self):
+        make_user(0, is_verified=True)
+        make_user(1)
+        path = self.path('users.jsonl')
+        out, _ = self.run_command('export_users', path, '--include-password-hashes', '--chunk-size', '1')
+        self.assertIn('Exported 2 rows', out)
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['email'] for row in rows], ['user0@nitrkl.ac.in', 'user1@nitrkl.ac.in'])
+        self.assertTrue(rows[0]['password_hash'].startswith('scrypt$'))
+
+        User.objects.all().delete()
+        out, err = self.run_command('import_users', path)
+        self.assertIn('2 users created, 0 rows skipped', out)
+        self.assertEqual(err, '')
+        user = User.objects.get(email='user0@nitrkl.ac.in')
+        self.assertTrue(user.is_verified)
+        self.assertTrue(user.check_password('securepassword123'))
+
+    def test_dry_run_and_unknown_format(self):
+        path = self.path('users.jsonl', '{"email": "x@nitrkl.ac.in", "first_name": "X", "last_name": "Y", '
+                                        '"role": "faculty", "department": "CS", "wp_number": "9000000009"}\nnot json\n')
+        out, err = self.run_command('import_users', path, '--dry-run')
+        self.assertIn('1 users would be created, 1 rows skipped', out)
+        self.assertIn('line 2:', err)
+        self.assertFalse(User.objects.exists())
+
+        with self.assertRaises(CommandError):
+            self.run_command('import_users', self.path('users.txt', ''))
+
+
+THROTTLE_RATES = {
+    'otp_send_ip': '3/min',
+    'otp_send_email': '2/min',
+    'token_ip': '100/min',
+    'token_email': '2/hour',
+}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': THROTTLE_RATES})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.user = make_user()
+
+    def tearDown(self):
+        get_bucket_store().clear()
+
+    def send_otp(self, email, ip='10.0.0.1'):
+        return self.client.post(reverse('users:send-otp'), {'email': email}, format='json', REMOTE_ADDR=ip)
+
+    def test_email_bucket_limits_one_address_from_many_ips(self):
+        self.assertEqual(self.send_otp(self.user.email, '10.0.0.1').status_code, 200)
+        self.assertEqual(self.send_otp('User0@nitrkl.ac.in', '10.0.0.2').status_code, 200)
+        response = self.send_otp(self.user.email, '10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        # Throttled before the serializer ran, so nothing was queued.
+        self.assertEqual(EmailJob.objects.count(), 2)
+
+    def test_ip_bucket_limits_many_addresses_from_one_ip(self):
+        for index in range(3):
+            self.send_otp(f'someone{index}@nitrkl.ac.in')
+        self.assertEqual(self.send_otp('someone9@nitrkl.ac.in').status_code, 429)
+        self.assertNotEqual(self.send_otp('someone9@nitrkl.ac.in', '10.0.0.2').status_code, 429)
+
+    def test_token_endpoint_is_throttled_per_email(self):
+        url = reverse('users:token-obtain-pair')
+        for _ in range(2):
+            response = self.client.post(url, {'email': self.user.email, 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post(url, {'email': self.user.email, 'password': 'securepassword123'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_bucket_refills_over_time(self):
+        store = MemoryBucketStore()
+        capacity, refill = parse_rate('2/s')
+        with mock.patch('nitrmart.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(store.take('k', capacity, refill), 0)
+            self.assertEqual(store.take('k', capacity, refill), 0)
+            self.assertAlmostEqual(store.take('k', capacity, refill), 0.5)
+        with mock.patch('nitrmart.throttling.time.monotonic', return_value=100.6):
+            self.assertEqual(store.take('k', capacity, refill), 0)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.user = make_user()
+
+    def login(self, password='securepassword123'):
+        return self.client.post(
+            reverse('users:token-obtain-pair'),
+            {'email': self.user.email, 'password': password},
+            format='json'
+        )
+
+    def test_password_change_verifies_current_password_once(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('users:user-retrieve-update', args=[self.user.pk])
+        with mock.patch.object(
+            TunedScryptPasswordHasher, 'verify', autospec=True, side_effect=ScryptPasswordHasher.verify
+        ) as verify:
+            response = self.client.patch(
+                url, {'current_password': 'securepassword123', 'password': 'newpassword456'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpassword456'))
+
+        response = self.client.patch(
+            url, {'current_password': 'wrong-password', 'password': 'another789'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('current_password', response.data)
+
+    def test_login_rehashes_with_preferred_hasher(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            self.user.set_password('securepassword123')
+            self.user.save()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$32768$'))
+
+        with override_settings(SCRYPT_WORK_FACTOR=2 ** 14):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$16384$'))
+
+        # A failed login leaves the stored hash alone.
+        before = self.user.password
+        self.assertEqual(self.login('wrong-password').status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, before)
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.user = make_user()
+
+    def tearDown(self):
+        user_cache.clear()
+
+    def obtain(self):
+        response = self.client.post(
+            reverse('users:token-obtain-pair'),
+            {'email': self.user.email, 'password': 'securepassword123'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return StatelessJWTAuthentication().authenticate(request)[0]
+
+    def test_claims_answer_without_a_query(self):
+        tokens = self.obtain()
+        self.assertIs(AccessToken(tokens['access'])['is_staff'], False)
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(tokens['access'])
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertFalse(user.is_staff or user.is_superuser)
+            self.assertTrue(user)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertEqual(user.first_name, 'Test')
+        # The row is reused by the next request in this process.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(tokens['access']).roll_no, self.user.roll_no)
+
+    def test_saving_a_user_evicts_the_cached_row(self):
+        access = self.obtain()['access']
+        self.authenticate(access).email
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(access).first_name, 'Renamed')
+
+    def test_views_work_with_lazy_user(self):
+        access = self.obtain()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('users:current-user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], self.user.email)
+
+        response = self.client.patch(
+            reverse('users:user-retrieve-update', args=[self.user.pk]), {'first_name': 'Lazy'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Lazy')
+
+    def test_refresh_picks_up_current_flags(self):
+        tokens = self.obtain()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.post(reverse('users:token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(AccessToken(response.data['access'])['is_staff'], True)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse('users:token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_inactive_claim_and_old_tokens(self):
+        token = AccessToken.for_user(self.user)
+        # Issued without the flag claims: falls back to loading the row.
+        user = self.authenticate(str(token))
+        self.assertIsInstance(user, User)
+
+        token['is_staff'] = token['is_superuser'] = False
+        token['is_active'] = False
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(str(token))
@@ -1,20 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
+    AsyncCurrentUserView,
     UserListCreateView,
     UserRetrieveUpdateView,
     CurrentUserView,
     OTPSendView,
     OTPVerifyView,
+    TokenObtainView,
+    TokenRefreshView,
 )
 
 app_name = 'users'
 
+current_user_view = AsyncCurrentUserView if settings.ASYNC_VIEWS else CurrentUserView
+
 urlpatterns = [
     path('', UserListCreateView.as_view(), name='user-list-create'),
-    path('me/', CurrentUserView.as_view(), name='current-user'),
+    path('me/', current_user_view.as_view(), name='current-user'),
     path('<int:pk>/', UserRetrieveUpdateView.as_view(), name='user-retrieve-update'),
-    path('token/', TokenObtainPairView.as_view(), name='token-obtain-pair'),
+    path('token/', TokenObtainView.as_view(), name='token-obtain-pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('send-otp/', OTPSendView.as_view(), name='send-otp'),
     path('verify-otp/', OTPVerifyView.as_view(), name='verify-otp'),
@@ -1,14 +1,21 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import OTPVerification
+from django.db import transaction
+from rest_framework_simplejwt import views as jwt_views
+from nitrmart.asyncviews import AsyncAPIView
+from nitrmart.conditional import add_validators, not_modified
+from nitrmart.throttling import EmailTokenBucketThrottle, IPTokenBucketThrottle
 from django.contrib.auth import get_user_model
+from .authentication import ClaimsUser
 from .serializers import (
     OTPSendSerializer,
     OTPVerifySerializer,
     UserSerializer,
     UserCreateSerializer,
     UserUpdateSerializer,
+    UserTokenObtainPairSerializer,
+    UserTokenRefreshSerializer,
 )
 
 User = get_user_model()
@@ -21,6 +28,8 @@ class OTPSendView(generics.CreateAPIView):
     """
     serializer_class = OTPSendSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPTokenBucketThrottle, EmailTokenBucketThrottle]
+    throttle_scope = 'otp_send'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -39,6 +48,8 @@ class OTPVerifyView(generics.CreateAPIView):
     """
     serializer_class = OTPVerifySerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPTokenBucketThrottle, EmailTokenBucketThrottle]
+    throttle_scope = 'otp_verify'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -53,6 +64,21 @@ class OTPVerifyView(generics.CreateAPIView):
         )
 
 
+class TokenObtainView(jwt_views.TokenObtainPairView):
+    """
+    Issue a JWT pair for email and password, throttled per IP and per email
+    to slow down password guessing
+    """
+    serializer_class = UserTokenObtainPairSerializer
+    throttle_classes = [IPTokenBucketThrottle, EmailTokenBucketThrottle]
+    throttle_scope = 'token'
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    """Issue a new access token with the user's current flags"""
+    serializer_class = UserTokenRefreshSerializer
+
+
 class UserListCreateView(generics.ListCreateAPIView):
     """
     View to:
@@ -73,37 +99,15 @@ class UserListCreateView(generics.ListCreateAPIView):
 
     def create(self, request, *args, **kwargs):
         """
-        Custom create to ensure OTP verification before user creation
+        Create the user; validation consumes the verified OTP. Both run in
+        one transaction so a failed insert does not burn a database-stored code.
         """
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-
-        email = serializer.validated_data.get('email')
-        otp = serializer.validated_data.get('otp')
-
-        try:
-            otp_obj = OTPVerification.objects.get(
-                email=email,
-                otp=otp,
-                is_verified=True
-            )
-            if otp_obj.is_expired():
-                otp_obj.delete()
-                return Response(
-                    {'detail': 'OTP has expired'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except OTPVerification.DoesNotExist:
-            return Response(
-                {'detail': 'Invalid or unverified OTP'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        self.perform_create(serializer)
+        with transaction.atomic():
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
 
-        otp_obj.delete()
-
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED,
@@ -132,26 +136,13 @@ class UserRetrieveUpdateView(generics.RetrieveUpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         """
-        Custom update to handle password changes securely
+        Update the profile. UserUpdateSerializer checks current_password once
+        and hashes the new password once; the view does not repeat either.
         """
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-
-        if 'password' in serializer.validated_data:
-            if not serializer.validated_data.get('current_password'):
-                return Response(
-                    {'current_password': 'Current password is required'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if not instance.check_password(serializer.validated_data['current_password']):
-                return Response(
-                    {'current_password': 'Incorrect password'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            instance.set_password(serializer.validated_data['password'])
-
         self.perform_update(serializer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -163,5 +154,26 @@ class CurrentUserView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return self.profile(request, request.user)
+
+    def profile(self, request, user):
+        # updated_at moves on every save, so it versions the whole profile.
+        etag = f'user-{user.pk}-{user.updated_at.timestamp()}'
+        last_modified = user.updated_at.timestamp()
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        serializer = UserSerializer(user)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return add_validators(response, etag, last_modified, private=True)
+
+
+class AsyncCurrentUserView(AsyncAPIView, CurrentUserView):
+    """CurrentUserView that loads the profile with the async ORM"""
+
+    async def get(self, request):
+        user = request.user
+        if isinstance(user, ClaimsUser):
+            user = await user.aresolve()
+        return self.profile(request, user)
@@ -0,0 +1,53 @@
+const API_BASE = "https://nitr-mart-production.up.railway.app";
+
+type SignedUpload = {
+  upload_url: string;
+  fields: Record<string, string | number>;
+  public_id: string;
+  expires_at: number;
+};
+
+// Uploads the file straight to image storage with server-signed parameters,
+// then attaches the stored image to the product.
+export async function uploadProductImage(
+  productId: number | string,
+  file: File,
+  token: string | null
+) {
+  const authHeaders = { Authorization: `Bearer ${token}` };
+
+  const signRes = await fetch(`${API_BASE}/products/uploads/`, {
+    method: "POST",
+    headers: authHeaders,
+  });
+  if (!signRes.ok) {
+    throw new Error("Could not start the image upload.");
+  }
+  const signed: SignedUpload = await signRes.json();
+
+  const body = new FormData();
+  Object.entries(signed.fields).forEach(([name, value]) =>
+    body.append(name, String(value))
+  );
+  body.append("file", file);
+  const uploadRes = await fetch(signed.upload_url, { method: "POST", body });
+  const uploaded = await uploadRes.json();
+  if (!uploadRes.ok) {
+    throw new Error(uploaded?.error?.message || "Image upload failed.");
+  }
+
+  const attachRes = await fetch(`${API_BASE}/products/${productId}/image/`, {
+    method: "POST",
+    headers: { ...authHeaders, "Content-Type": "application/json" },
+    body: JSON.stringify({
+      public_id: uploaded.public_id,
+      version: uploaded.version,
+      format: uploaded.format,
+      signature: uploaded.signature,
+    }),
+  });
+  if (!attachRes.ok) {
+    throw new Error("Could not attach the image to the product.");
+  }
+  return attachRes.json();
+}
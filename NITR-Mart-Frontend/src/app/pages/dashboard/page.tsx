@@ -23,7 +23,7 @@ import {
 } from "lucide-react";
 import Link from "next/link";
 import { useRouter } from "next/navigation";
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useState } from "react";
 import { FaWhatsapp } from "react-icons/fa";
 
 interface User {
@@ -41,6 +41,14 @@ interface Seller {
   wp_number: string;
 }
 
+interface ImageVariants {
+  width: number;
+  height: number;
+  placeholder: string;
+  src: string | null;
+  srcset: { avif?: string; webp?: string; jpeg?: string };
+}
+
 interface Product {
   id: number;
   title: string;
@@ -48,12 +56,17 @@ interface Product {
   price: number;
   negotiable: boolean;
   image?: string;
+  image_variants?: ImageVariants | null;
   category: string;
   seller: Seller;
   is_sold: boolean;
   posted_at: string;
 }
 
+// Card widths in the 1/2/3/4-column grid below.
+const CARD_IMAGE_SIZES =
+  "(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw";
+
 const formatTimeAgo = (dateString: string) => {
   const date = new Date(dateString);
   const now = new Date();
@@ -85,6 +98,7 @@ const Dashboard = () => {
   const [user, setUser] = useState<User | null>(null);
   const [userLoading, setUserLoading] = useState(true);
   const [products, setProducts] = useState<Product[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState("");
   const [selectedCategory, setSelectedCategory] = useState("all");
   const router = useRouter();
@@ -192,19 +206,22 @@ const Dashboard = () => {
     fetchUser();
   }, [router]);
 
-  const fetchProducts = async () => {
+  const fetchProducts = async (
+    url = "https://nitr-mart-production.up.railway.app/products/",
+    append = false
+  ) => {
    
     try {
       const token = localStorage.getItem("token");
-      const res = await fetch(
-        "https://nitr-mart-production.up.railway.app/products/",
-        {
-          headers: { Authorization: `Bearer ${token}` },
-        }
-      );
+      const res = await fetch(url, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
       if (res.ok) {
         const data = await res.json();
-        setProducts(data);
+        setProducts((prev) =>
+          append ? [...prev, ...data.results] : data.results
+        );
+        setNextPage(data.next ?? null);
       }
     } catch (err) {
       console.error("Failed to fetch products", err);
@@ -212,33 +229,31 @@ const Dashboard = () => {
   };
 
   useEffect(() => {
-    if (user) {
-      fetchProducts();
+    if (!user) {
+      return;
     }
-  }, [user]);
-
-  const filteredProducts = useMemo(() => {
-    let filtered = products;
-
-    // Filter out sold products - this is the key change
-    filtered = filtered.filter((product) => !product.is_sold);
-
+    // Category filtering and search both run on the server.
+    const params = new URLSearchParams();
     if (selectedCategory !== "all") {
-      filtered = filtered.filter(
-        (product) => product.category === selectedCategory
-      );
+      params.set("category", selectedCategory);
     }
-
-    if (searchTerm) {
-      filtered = filtered.filter(
-        (product) =>
-          product.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-          product.description.toLowerCase().includes(searchTerm.toLowerCase())
+    const query = searchTerm.trim();
+    if (!query) {
+      fetchProducts(
+        `https://nitr-mart-production.up.railway.app/products/?${params}`
       );
+      return;
     }
+    params.set("q", query);
+    const timer = setTimeout(() => {
+      fetchProducts(
+        `https://nitr-mart-production.up.railway.app/products/search/?${params}`
+      );
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [user, selectedCategory, searchTerm]);
 
-    return filtered;
-  }, [products, selectedCategory, searchTerm]);
+  const filteredProducts = products;
 
   const handleLogout = () => {
     localStorage.removeItem("token");
@@ -562,13 +577,6 @@ const Dashboard = () => {
               <div className="flex flex-wrap gap-2">
                 {categories.map((category) => {
                   const IconComponent = category.icon;
-                  // Update category count to only show available products
-                  const categoryCount =
-                    category.value === "all"
-                      ? products.filter((p) => !p.is_sold).length
-                      : products.filter(
-                          (p) => p.category === category.value && !p.is_sold
-                        ).length;
 
                   return (
                     <button
@@ -582,11 +590,6 @@ const Dashboard = () => {
                     >
                       <IconComponent className="w-4 h-4 mr-2" />
                       {category.label}
-                      {category.value !== "all" && (
-                        <span className="ml-2 px-2 py-0.5 bg-white/20 rounded-full text-xs">
-                          {categoryCount}
-                        </span>
-                      )}
                     </button>
                   );
                 })}
@@ -619,10 +622,33 @@ const Dashboard = () => {
                         href={`/pages/productdetails/${product.id}`}
                         className="relative h-48 bg-gray-800/50 overflow-hidden"
                       >
-                        {product.image ? (
+                        {product.image_variants ? (
+                          <picture className="block w-full h-full">
+                            {product.image_variants.srcset.avif && (
+                              <source type="image/avif" srcSet={product.image_variants.srcset.avif} sizes={CARD_IMAGE_SIZES} />
+                            )}
+                            {product.image_variants.srcset.webp && (
+                              <source type="image/webp" srcSet={product.image_variants.srcset.webp} sizes={CARD_IMAGE_SIZES} />
+                            )}
+                            <img
+                              src={product.image_variants.src ?? product.image}
+                              srcSet={product.image_variants.srcset.jpeg}
+                              sizes={CARD_IMAGE_SIZES}
+                              alt={product.title}
+                              loading="lazy"
+                              decoding="async"
+                              style={{
+                                backgroundImage: `url(${product.image_variants.placeholder})`,
+                                backgroundSize: "cover",
+                              }}
+                              className="object-cover w-full h-full transition-transform duration-300 group-hover:scale-105"
+                            />
+                          </picture>
+                        ) : product.image ? (
                           <img
                             src={product.image}
                             alt={product.title}
+                            loading="lazy"
                             className="object-cover w-full h-full transition-transform duration-300 group-hover:scale-105"
                           />
                         ) : (
@@ -740,6 +766,17 @@ const Dashboard = () => {
                   </div>
                 )}
               </div>
+
+              {nextPage && (
+                <div className="flex justify-center mt-10">
+                  <button
+                    onClick={() => fetchProducts(nextPage, true)}
+                    className="px-6 py-3 rounded-lg font-medium text-white bg-white/5 border border-white/10 hover:bg-white/10 transition-all"
+                  >
+                    Load more
+                  </button>
+                </div>
+              )}
           </div>
         </main>
       </div>
@@ -17,6 +17,7 @@ import {
 import { useRouter } from "next/navigation";
 import React, { useEffect, useState } from "react";
 import { FaRupeeSign } from "react-icons/fa";
+import { uploadProductImage } from "../../lib/uploadProductImage";
 
 const Sell = () => {
   const router = useRouter();
@@ -121,17 +122,6 @@ const Sell = () => {
   const handleAddProduct = async () => {
     setIsSubmitting(true);
 
-    const formData = new FormData();
-    formData.append("title", newProduct.title);
-    formData.append("description", newProduct.description);
-    formData.append("price", newProduct.price);
-    formData.append("negotiable", String(newProduct.negotiable));
-    formData.append("category", newProduct.category);
-    if (newProduct.image) {
-      formData.append("image", newProduct.image);
-      
-    }
-
     try {
       const token = localStorage.getItem("token");
       const response = await fetch("https://nitr-mart-production.up.railway.app/products/", {
@@ -139,10 +129,22 @@ const Sell = () => {
         credentials: "include",
         headers: {
           Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
         },
-        body: formData,
+        body: JSON.stringify({
+          title: newProduct.title,
+          description: newProduct.description,
+          price: newProduct.price,
+          negotiable: newProduct.negotiable,
+          category: newProduct.category,
+        }),
       });
 
+      if (response.ok && newProduct.image) {
+        const created = await response.json();
+        await uploadProductImage(created.id, newProduct.image, token);
+      }
+
       if (response.ok) {
         setTimeout(() => {
           router.push("/pages/dashboard");
@@ -27,6 +27,7 @@ import {
 import { useRouter, useParams } from "next/navigation";
 import { useEffect, useState } from "react";
 import { FaRupeeSign } from "react-icons/fa";
+import { uploadProductImage } from "../../../lib/uploadProductImage";
 
 interface Product {
   id: string;
@@ -267,17 +268,6 @@ const UpdateProductPage = () => {
       return;
     }
 
-    const formDataToSend = new FormData();
-    formDataToSend.append("title", formData.title);
-    formDataToSend.append("description", formData.description);
-    formDataToSend.append("price", formData.price);
-    formDataToSend.append("negotiable", String(formData.negotiable));
-    if (formData.image) {
-      formDataToSend.append("image", formData.image);
-    }
-    formDataToSend.append("category", formData.category);
-    formDataToSend.append("is_sold", String(formData.is_sold));
-
     try {
       const res = await fetch(
         `https://nitr-mart-production.up.railway.app/products/${params.id}/`,
@@ -285,11 +275,23 @@ const UpdateProductPage = () => {
           method: "PUT",
           headers: {
             Authorization: `Bearer ${token}`,
+            "Content-Type": "application/json",
           },
-          body: formDataToSend,
+          body: JSON.stringify({
+            title: formData.title,
+            description: formData.description,
+            price: formData.price,
+            negotiable: formData.negotiable,
+            category: formData.category,
+            is_sold: formData.is_sold,
+          }),
         }
       );
 
+      if (res.ok && formData.image) {
+        await uploadProductImage(id, formData.image, token);
+      }
+
       if (res.ok) {
         alert("Product updated successfully!");
         router.push("/pages/dashboard");